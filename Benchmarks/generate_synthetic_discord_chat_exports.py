@@ -0,0 +1,158 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Generates synthetic JSON files in the format of Discord Chat Exporter, for the benchmarks.
+#  The files are indented like the real exports and written one message at a time,
+#  so files of any size can be generated without holding them in memory.
+
+import json
+import os
+import random
+import sys
+import textwrap
+from datetime import datetime, timedelta, timezone
+
+# The words the message contents are made of
+_WORDS = ("the", "a", "discord", "message", "hello", "world", "lol", "python", "export", "channel",
+          "server", "bot", "data", "ok", "yes", "no", "maybe", "tomorrow", "today", "game",
+          "ünïcödé", "日本語", "🙂", "https://example.com/page", "<:pog:123456789012345678>")
+
+# The Discord epoch, the base of the snowflakes
+_DISCORD_EPOCH_MILLISECONDS = 1420070400000
+
+
+def _make_snowflake(timestamp_milliseconds: int, increment: int) -> int:
+    """
+    This function makes a Discord snowflake id
+    :param timestamp_milliseconds: The milliseconds since the Unix epoch
+    :param increment: A counter to keep the ids unique within the same millisecond
+    :return: The snowflake id
+    """
+    return ((timestamp_milliseconds - _DISCORD_EPOCH_MILLISECONDS) << 22) | (increment & 0xFFF)
+
+
+def _make_content(random_generator: random.Random, message_size: int,  # noqa: DUO102
+                  multiline_ratio: float) -> str:
+    """
+    This function makes the content of a message
+    :param random_generator: The random generator
+    :param message_size: The average number of characters of a message
+    :param multiline_ratio: The fraction of messages that span multiple lines
+    :return: The message content
+    """
+    target_size = max(1, int(random_generator.expovariate(1 / message_size)))
+    words = []
+    size = 0
+    while size < target_size:
+        word = random_generator.choice(_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    if random_generator.random() < multiline_ratio and len(words) > 1:
+        # Break the message into a few lines, sometimes with an empty line in between
+        for _ in range(random_generator.randint(1, 3)):
+            position = random_generator.randrange(1, len(words))
+            words[position] = random_generator.choice(("\n", "\n\n")) + words[position]
+    return " ".join(words)
+
+
+def generate_synthetic_discord_chat_exports(output_folder_path: str, number_of_files: int = 10,
+                                            messages_per_file: int = 1000, number_of_authors: int = 50,
+                                            multiline_ratio: float = 0.1, message_size: int = 60,
+                                            seed: int = 0) -> list:
+    """
+    This function generates synthetic JSON files in the format of Discord Chat Exporter
+    :param output_folder_path: The folder to write the JSON files to
+    :param number_of_files: The number of JSON files
+    :param messages_per_file: The number of messages in every JSON file
+    :param number_of_authors: The number of different message authors
+    :param multiline_ratio: The fraction of messages that span multiple lines
+    :param message_size: The average number of characters of a message
+    :param seed: The seed of the random generator, the same seed generates the same files
+    :return: A list of the generated JSON file paths
+    """
+    # The files only have to look random and be the same for the same seed, they are no secret,
+    # random.SystemRandom cannot be seeded
+    random_generator = random.Random(seed)  # noqa: DUO102
+    if not os.path.exists(output_folder_path):
+        os.makedirs(output_folder_path)
+    authors = [{
+        "id": str(_make_snowflake(_DISCORD_EPOCH_MILLISECONDS + author_number * 1000, author_number)),
+        "name": "user" + str(author_number),
+        "discriminator": str(author_number % 10000).zfill(4),
+        "nickname": "User " + str(author_number),
+        "color": None,
+        "isBot": author_number % 25 == 0,
+        "avatarUrl": "https://cdn.discordapp.com/embed/avatars/" + str(author_number % 5) + ".png"
+    } for author_number in range(number_of_authors)]
+    guild = {"id": "100000000000000001", "name": "Synthetic Guild", "iconUrl": None}
+    start_time = datetime(2021, 1, 1, tzinfo=timezone.utc)
+    json_file_paths = []
+    for file_number in range(number_of_files):
+        channel = {
+            "id": str(200000000000000000 + file_number),
+            "type": "GuildTextChat",
+            "categoryId": "300000000000000000",
+            "category": "Text Channels",
+            "name": "channel-" + str(file_number),
+            "topic": None
+        }
+        json_file_path = os.path.join(output_folder_path, "export-" + str(file_number).zfill(5) + ".json")
+        timestamp = start_time + timedelta(days=file_number)
+        with open(json_file_path, "w", encoding="utf-8") as f:
+            f.write("{\n")
+            f.write('  "guild": ' + textwrap.indent(json.dumps(guild, indent=2), "  ")[2:] + ",\n")
+            f.write('  "channel": ' + textwrap.indent(json.dumps(channel, indent=2), "  ")[2:] + ",\n")
+            f.write('  "dateRange": {\n    "after": null,\n    "before": null\n  },\n')
+            f.write('  "messages": [\n')
+            for message_number in range(messages_per_file):
+                timestamp += timedelta(milliseconds=random_generator.randint(1, 60000))
+                timestamp_milliseconds = int(timestamp.timestamp() * 1000)
+                author = random_generator.choice(authors)
+                message = {
+                    "id": str(_make_snowflake(timestamp_milliseconds, message_number)),
+                    "type": "Default",
+                    "timestamp": timestamp.isoformat(timespec="milliseconds"),
+                    "timestampEdited": None,
+                    "callEndedTimestamp": None,
+                    "isPinned": False,
+                    "content": _make_content(random_generator, message_size, multiline_ratio),
+                    "author": author,
+                    "attachments": [],
+                    "embeds": [],
+                    "stickers": [],
+                    "reactions": [],
+                    "mentions": []
+                }
+                if message_number > 0:
+                    f.write(",\n")
+                f.write(textwrap.indent(json.dumps(message, indent=2, ensure_ascii=False), "    "))
+            f.write('\n  ],\n  "messageCount": ' + str(messages_per_file) + "\n}")
+        json_file_paths.append(json_file_path)
+    return json_file_paths
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+
+    if len(args) < 1:
+        print("Usage: " + sys.argv[0] + " <output_folder_path> [<number_of_files> [<messages_per_file> "
+                                        "[<number_of_authors> [<multiline_ratio> [<message_size>]]]]]")
+        sys.exit(1)
+
+    generate_synthetic_discord_chat_exports(
+        args[0], *[int(arg) if position != 3 else float(arg) for position, arg in enumerate(args[1:])])
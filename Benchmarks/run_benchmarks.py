@@ -0,0 +1,301 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Times every step of the program on synthetic exports of several scales.
+#  Every step is timed on its own, best of a few repeats, and then run once more
+#  under tracemalloc for its peak memory, so the tracing does not skew the timings.
+#  The results are saved to a JSON file, and can be compared with an earlier run.
+#  Run from the root of the repository:
+#  python -m Benchmarks.run_benchmarks [--scales small,medium] [--repeats 3] [--json-backend auto]
+#  [--compare <results.json>]
+
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from functools import partial
+from typing import Callable
+
+from Benchmarks.generate_synthetic_discord_chat_exports import generate_synthetic_discord_chat_exports
+from Functions.author_table import AuthorTable
+from Functions.convert_data_to_required_format import convert_data_to_required_format
+from Functions.get_data_from_discord_chat_exports_json_files import get_data_from_discord_chat_exports_json_files
+from Functions.get_json_file_paths import get_json_file_paths
+from Functions.json_backends import DEFAULT_JSON_BACKEND, JSON_BACKENDS, get_json_backend_name
+from Functions.near_duplicate_filter import NearDuplicateFilter, iterate_records_without_near_duplicates
+from Functions.normalize_message_content import ContentNormalizer
+from Functions.write_converted_data_to_text_file import write_converted_data_to_text_file
+from main import run_program
+
+# The number of files and messages per file of every scale
+SCALES = {
+    "small": {"number_of_files": 10, "messages_per_file": 1000},
+    "medium": {"number_of_files": 50, "messages_per_file": 4000},
+    "large": {"number_of_files": 100, "messages_per_file": 20000},
+}
+DEFAULT_SCALES = ("small", "medium")
+DEFAULT_REPEATS = 3
+DEFAULT_RESULTS_FOLDER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Results")
+
+
+def _measure(function: Callable, repeats: int) -> tuple:
+    """
+    This function times a function and measures its peak memory
+    :param function: The function, called without arguments
+    :param repeats: The number of timed calls, the fastest one counts
+    :return: The result of the last call, the best time in seconds and the peak memory in bytes
+    """
+    best_time = float("inf")
+    result = None
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = function()
+        best_time = min(best_time, time.perf_counter() - start_time)
+    # Drop the last result before the traced call, so that it is not counted twice
+    result = None
+    tracemalloc.start()
+    try:
+        result = function()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, best_time, peak_memory
+
+
+def _filter_near_duplicates(data: list, author_table: AuthorTable) -> list:
+    """
+    This function drops the near duplicates of the loaded messages, with a new filter every time it is called
+    :param data: The loaded message records
+    :param author_table: The author table the records refer to
+    :return: The records that are kept
+    """
+    return list(iterate_records_without_near_duplicates(data, author_table, NearDuplicateFilter()))
+
+
+def _get_result(name: str, seconds: float, peak_memory: int, number_of_messages: int, number_of_bytes: int) -> dict:
+    """
+    This function gets the result of a step
+    :param name: The name of the step
+    :param seconds: The time taken in seconds
+    :param peak_memory: The peak memory in bytes
+    :param number_of_messages: The number of messages the step went through
+    :param number_of_bytes: The number of bytes the step read or wrote
+    :return: The result
+    """
+    return {
+        "name": name,
+        "seconds": seconds,
+        "messages_per_second": number_of_messages / seconds if seconds > 0 else None,
+        "megabytes_per_second": number_of_bytes / 1000000 / seconds if seconds > 0 else None,
+        "peak_memory_bytes": peak_memory
+    }
+
+
+def run_scale(scale_name: str, work_folder_path: str, repeats: int = DEFAULT_REPEATS,
+              json_backend: str = DEFAULT_JSON_BACKEND) -> dict:
+    """
+    This function generates the exports of a scale and times every step on them
+    :param scale_name: The name of the scale in SCALES
+    :param work_folder_path: The folder the exports and the output are written to
+    :param repeats: The number of timed calls of every step
+    :param json_backend: The backend that decodes the JSON files
+    :return: The results of the scale
+    """
+    scale = SCALES[scale_name]
+    input_folder_path = os.path.join(work_folder_path, scale_name, "JSON Files")
+    output_path = os.path.join(work_folder_path, scale_name, "Output", "output.txt")
+    print("Generating the " + scale_name + " exports: " + str(scale["number_of_files"]) + " files of " +
+          str(scale["messages_per_file"]) + " messages...")
+    json_file_paths = generate_synthetic_discord_chat_exports(input_folder_path, **scale)
+    number_of_messages = scale["number_of_files"] * scale["messages_per_file"]
+    input_size = sum(os.path.getsize(json_file_path) for json_file_path in json_file_paths)
+    results = []
+
+    # The steps get their inputs bound up front, so that they do not refer to the lists deleted further down
+    json_file_paths, seconds, peak_memory = _measure(partial(get_json_file_paths, input_folder_path, False), repeats)
+    results.append(_get_result("get_json_file_paths", seconds, peak_memory, number_of_messages, input_size))
+
+    author_table = AuthorTable()
+    data, seconds, peak_memory = _measure(
+        partial(get_data_from_discord_chat_exports_json_files, json_file_paths, False, author_table=author_table,
+                json_backend=json_backend),
+        repeats)
+    results.append(_get_result("get_data_from_discord_chat_exports_json_files", seconds, peak_memory,
+                               number_of_messages, input_size))
+
+    converted_data, seconds, peak_memory = _measure(
+        partial(convert_data_to_required_format, data, False, author_table), repeats)
+    # Every converted line is followed by an empty line in the output
+    converted_size = sum(len(line.encode("utf-8")) + 1 for line in converted_data)
+    results.append(_get_result("convert_data_to_required_format", seconds, peak_memory, number_of_messages,
+                               converted_size))
+
+    # The same conversion with every rewrite of the message contents selected
+    normalizer = ContentNormalizer()
+    normalized_data, seconds, peak_memory = _measure(
+        partial(convert_data_to_required_format, data, False, author_table, normalizer=normalizer), repeats)
+    normalized_size = sum(len(line.encode("utf-8")) + 1 for line in normalized_data)
+    results.append(_get_result("convert_data_to_required_format --normalize all", seconds, peak_memory,
+                               number_of_messages, normalized_size))
+    del normalized_data
+
+    # The near duplicate filter, with a new filter every time so that every call sees all the messages
+    _, seconds, peak_memory = _measure(partial(_filter_near_duplicates, data, author_table), repeats)
+    results.append(_get_result("iterate_records_without_near_duplicates", seconds, peak_memory, number_of_messages,
+                               sum(len(record.content.encode("utf-8")) for record in data)))
+    del data
+
+    _, seconds, peak_memory = _measure(partial(write_converted_data_to_text_file, converted_data, output_path, False),
+                                       repeats)
+    output_size = os.path.getsize(output_path)
+    results.append(_get_result("write_converted_data_to_text_file", seconds, peak_memory, number_of_messages,
+                               output_size))
+    del converted_data
+
+    _, seconds, peak_memory = _measure(
+        partial(run_program, input_folder_path, output_path, False, json_backend=json_backend), repeats)
+    results.append(_get_result("run_program", seconds, peak_memory, number_of_messages, input_size))
+
+    return {
+        "scale": scale_name,
+        "files": scale["number_of_files"],
+        "messages": number_of_messages,
+        "input_bytes": input_size,
+        "output_bytes": output_size,
+        "benchmarks": results
+    }
+
+
+def print_results(scale_results: dict, earlier_scale_results: dict = None) -> None:
+    """
+    This function prints the results of a scale
+    :param scale_results: The results of the scale
+    :param earlier_scale_results: If given, the results of the same scale in an earlier run to compare with
+    :return: None
+    """
+    earlier_seconds = {}
+    if earlier_scale_results is not None:
+        earlier_seconds = {result["name"]: result["seconds"] for result in earlier_scale_results["benchmarks"]}
+    print("----------------------------------------")
+    print("Scale: " + scale_results["scale"] + " (" + str(scale_results["messages"]) + " messages, " +
+          str(round(scale_results["input_bytes"] / 1000000, 1)) + " MB of JSON)")
+    for result in scale_results["benchmarks"]:
+        line = "{:<48}{:>10.3f} s{:>14.0f} msg/s{:>10.1f} MB/s{:>10.1f} MB peak".format(
+            result["name"], result["seconds"], result["messages_per_second"] or 0,
+            result["megabytes_per_second"] or 0, result["peak_memory_bytes"] / 1000000)
+        if result["name"] in earlier_seconds and result["seconds"] > 0:
+            line += "{:>8.2f}x".format(earlier_seconds[result["name"]] / result["seconds"])
+        print(line)
+
+
+def main(scale_names: list, repeats: int, results_folder_path: str, compare_path: str = None,
+         json_backend: str = DEFAULT_JSON_BACKEND) -> str:
+    """
+    This function runs the benchmarks and saves the results
+    :param scale_names: The names of the scales to run
+    :param repeats: The number of timed calls of every step
+    :param results_folder_path: The folder the results are saved to
+    :param compare_path: If given, the results file of an earlier run to compare with
+    :param json_backend: The backend that decodes the JSON files, "auto" picks the fastest one that is installed
+    :return: The path of the saved results file
+    """
+    # Record the backend that actually ran, not "auto"
+    json_backend = get_json_backend_name(json_backend)
+    print("JSON backend: " + json_backend)
+    earlier_results = {}
+    if compare_path is not None:
+        with open(compare_path, "r", encoding="utf-8") as f:
+            earlier_run = json.load(f)
+        earlier_results = {scale_results["scale"]: scale_results for scale_results in earlier_run["scales"]}
+        # Results from before the backends could be chosen were all decoded by the json module
+        print("Comparing with " + compare_path + " (JSON backend: " + earlier_run.get("json_backend", "json") + ")")
+    work_folder_path = tempfile.mkdtemp(prefix="benchmarks-")
+    try:
+        all_scale_results = []
+        for scale_name in scale_names:
+            scale_results = run_scale(scale_name, work_folder_path, repeats, json_backend)
+            print_results(scale_results, earlier_results.get(scale_name))
+            all_scale_results.append(scale_results)
+            # The exports of a scale are not needed anymore
+            shutil.rmtree(os.path.join(work_folder_path, scale_name))
+    finally:
+        shutil.rmtree(work_folder_path, ignore_errors=True)
+    results = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeats": repeats,
+        "json_backend": json_backend,
+        "scales": all_scale_results
+    }
+    os.makedirs(results_folder_path, exist_ok=True)
+    results_path = os.path.join(results_folder_path, "benchmark-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print("----------------------------------------")
+    print("Results saved to " + results_path)
+    return results_path
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    selected_scale_names = list(DEFAULT_SCALES)
+    number_of_repeats = DEFAULT_REPEATS
+    results_folder = DEFAULT_RESULTS_FOLDER_PATH
+    earlier_results_path = None
+    selected_json_backend = DEFAULT_JSON_BACKEND
+
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in ("-h", "--help"):
+            print("Usage: python -m Benchmarks.run_benchmarks [--scales <" + ",".join(SCALES) + ">] "
+                  "[--repeats <number>] [--results <results_folder_path>] [--compare <results_file_path>] "
+                  "[--json-backend <" + ",".join(JSON_BACKENDS) + ">]")
+            sys.exit(0)
+        if i + 1 >= len(args):
+            print("ERROR: Missing value for " + arg)
+            sys.exit(1)
+        value = args[i + 1]
+        if arg == "--scales":
+            selected_scale_names = value.split(",")
+            for name in selected_scale_names:
+                if name not in SCALES:
+                    print("ERROR: Unknown scale: " + name + ", expected one of " + ", ".join(SCALES))
+                    sys.exit(1)
+        elif arg == "--repeats":
+            number_of_repeats = int(value)
+        elif arg == "--results":
+            results_folder = value
+        elif arg == "--compare":
+            earlier_results_path = value
+        elif arg == "--json-backend":
+            selected_json_backend = value
+        else:
+            print("ERROR: Unknown argument: " + arg)
+            sys.exit(1)
+        i += 2
+
+    main(selected_scale_names, number_of_repeats, results_folder, earlier_results_path, selected_json_backend)
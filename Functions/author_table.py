@@ -0,0 +1,94 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Interns the message authors, so that the records only carry a small int per message
+#  instead of their own copy of the author name, discriminator and label.
+#  An author is keyed by its id, name and discriminator: an author who changed their name
+#  between exports gets a second entry, so the output keeps the name of every message.
+#  The MessageAuthorName___MessageAuthorDiscriminator label is only formatted once per author,
+#  when it is first asked for.
+#  The table also keeps the name of every user id seen as an author or in the mentions of a message,
+#  so that the mentions in the message contents can be resolved to names.
+
+
+class AuthorTable:
+    """
+    The message authors of a run, numbered from 0 in the order they were first seen
+    """
+
+    def __init__(self):
+        self._indices = {}
+        self.author_ids = []
+        self.names = []
+        self.discriminators = []
+        self._labels = []
+        # The latest name of every user, by user id string like in the JSON files
+        self.user_names = {}
+
+    def __len__(self) -> int:
+        return len(self.author_ids)
+
+    def add(self, author_id: int, name: str, discriminator: str) -> int:
+        """
+        This function gets the index of an author, adding the author if it is new
+        :param author_id: The message author id
+        :param name: The message author name
+        :param discriminator: The message author discriminator
+        :return: The index of the author
+        """
+        key = (author_id, name, discriminator)
+        index = self._indices.get(key)
+        if index is None:
+            index = len(self.author_ids)
+            self._indices[key] = index
+            self.author_ids.append(author_id)
+            self.names.append(name)
+            self.discriminators.append(discriminator)
+            self.user_names[str(author_id)] = name
+        return index
+
+    def add_mentions(self, mentions: list) -> None:
+        """
+        This function adds the names of the users mentioned in a message
+        :param mentions: The "mentions" of the message, with the "id" and the "name" of every user
+        :return: None
+        """
+        user_names = self.user_names
+        for mention in mentions:
+            user_names[mention["id"]] = mention["name"]
+
+    def get_label(self, index: int) -> str:
+        """
+        This function gets the label of an author, as it appears in the output
+        :param index: The index of the author
+        :return: MessageAuthorName___MessageAuthorDiscriminator
+        """
+        labels = self._labels
+        if index >= len(labels):
+            labels.extend(self.names[i] + "___" + self.discriminators[i] for i in range(len(labels), index + 1))
+        return labels[index]
+
+    def merge(self, other: "AuthorTable") -> list:
+        """
+        This function adds the authors of another table, e.g. the one of a worker process
+        :param other: The other author table
+        :return: A list mapping every index of the other table to the index in this table
+        """
+        self.user_names.update(other.user_names)
+        return [self.add(author_id, name, discriminator)
+                for author_id, name, discriminator in zip(other.author_ids, other.names, other.discriminators)]
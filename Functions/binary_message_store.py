@@ -0,0 +1,320 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  A compact binary store of the parsed messages, so that the JSON files only have to be parsed once.
+#  The store is a folder with one file per column, each a flat array of native 64 bit signed ints,
+#  plus a blob with the UTF-8 encoded content of every message:
+#  author.bin          The message authors, as indices into the authors in metadata.json
+#  channel_id.bin      The channel ids
+#  timestamp.bin       The message timestamps in milliseconds since the Unix epoch
+#  message_id.bin      The message ids
+#  reference_id.bin    The ids of the messages the messages reply to, 0 for the messages that are not replies
+#  content_offset.bin  The offsets of the message contents in content.bin, plus the end of the last one
+#  content.bin         The message contents
+#  metadata.json       The number of messages, the byte order and the [id, name, discriminator] of every author
+#  The columns are read back through memory maps without copying them.
+
+import json
+import mmap
+import os
+import shutil
+import sys
+from array import array
+from typing import Iterable, Iterator
+
+from Functions.author_table import AuthorTable
+from Functions.message_id_index import MessageIdIndex
+from Functions.message_record import MessageRecord
+from Functions.pipeline_statistics import PipelineStatistics
+
+STORE_VERSION = 3
+METADATA_FILE_NAME = "metadata.json"
+CONTENT_FILE_NAME = "content.bin"
+
+# The columns with one value per message
+_COLUMNS = ("author", "channel_id", "timestamp", "message_id", "reference_id")
+# The number of messages buffered before they are written out
+_FLUSH_SIZE = 65536
+
+
+class BinaryMessageStoreWriter:
+    """
+    Writes message records to a binary message store
+    """
+
+    def __init__(self, store_path: str, author_table: AuthorTable):
+        """
+        :param store_path: The store folder path, it is replaced when the writer is closed
+        :param author_table: The author table the records refer to
+        """
+        self.store_path = store_path
+        self.author_table = author_table
+        # The store is written next to its final place and swapped in when it is complete
+        self.temporary_path = store_path.rstrip("/\\") + ".tmp"
+        if os.path.exists(self.temporary_path):
+            shutil.rmtree(self.temporary_path)
+        os.makedirs(self.temporary_path)
+        self.column_files = {column: open(os.path.join(self.temporary_path, column + ".bin"), "wb")
+                             for column in _COLUMNS + ("content_offset",)}
+        self.content_file = open(os.path.join(self.temporary_path, CONTENT_FILE_NAME), "wb")
+        self.columns = {column: array("q") for column in _COLUMNS}
+        # The first message starts at offset 0
+        self.content_offsets = array("q", [0])
+        self.contents = []
+        self.content_size = 0
+        self.number_of_messages = 0
+
+    def append(self, record: MessageRecord) -> None:
+        """
+        This function adds a message record to the store
+        :param record: The message record
+        :return: None
+        """
+        encoded_content = record.content.encode("utf-8")
+        self.columns["author"].append(record.author_index)
+        self.columns["channel_id"].append(record.channel_id)
+        self.columns["timestamp"].append(record.timestamp)
+        self.columns["message_id"].append(record.message_id)
+        self.columns["reference_id"].append(record.reference_id)
+        self.content_size += len(encoded_content)
+        self.content_offsets.append(self.content_size)
+        self.contents.append(encoded_content)
+        self.number_of_messages += 1
+        if len(self.contents) >= _FLUSH_SIZE:
+            self._flush()
+
+    def _flush(self) -> None:
+        """
+        This function writes the buffered messages to the column files
+        :return: None
+        """
+        for column in _COLUMNS:
+            self.columns[column].tofile(self.column_files[column])
+            self.columns[column] = array("q")
+        self.content_offsets.tofile(self.column_files["content_offset"])
+        self.content_offsets = array("q")
+        self.content_file.write(b"".join(self.contents))
+        self.contents = []
+
+    def _close_files(self) -> None:
+        """
+        This function closes all the files of the store
+        :return: None
+        """
+        for column_file in self.column_files.values():
+            column_file.close()
+        self.content_file.close()
+
+    def close(self) -> None:
+        """
+        This function writes the rest of the messages and the metadata, and moves the store into place
+        :return: None
+        """
+        self._flush()
+        self._close_files()
+        metadata = {
+            "version": STORE_VERSION,
+            "byteorder": sys.byteorder,
+            "messages": self.number_of_messages,
+            "content_bytes": self.content_size,
+            "authors": [[author_id, name, discriminator] for author_id, name, discriminator in zip(
+                self.author_table.author_ids, self.author_table.names, self.author_table.discriminators)]
+        }
+        with open(os.path.join(self.temporary_path, METADATA_FILE_NAME), "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False)
+        if os.path.exists(self.store_path):
+            shutil.rmtree(self.store_path)
+        os.replace(self.temporary_path, self.store_path)
+
+    def abort(self) -> None:
+        """
+        This function throws away the store that was being written
+        :return: None
+        """
+        self._close_files()
+        shutil.rmtree(self.temporary_path, ignore_errors=True)
+
+
+class BinaryMessageStore:
+    """
+    Reads a binary message store through memory maps
+    """
+
+    def __init__(self, store_path: str):
+        """
+        :param store_path: The store folder path
+        """
+        with open(os.path.join(store_path, METADATA_FILE_NAME), "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        if metadata["version"] != STORE_VERSION:
+            raise ValueError("Unsupported binary message store version: " + str(metadata["version"]))
+        if metadata["byteorder"] != sys.byteorder:
+            raise ValueError("The binary message store was written on a machine with a different byte order")
+        self.number_of_messages = metadata["messages"]
+        self.authors = metadata["authors"]
+        self._memory_maps = []
+        self.columns = {column: self._map(os.path.join(store_path, column + ".bin")).cast("q")
+                        for column in _COLUMNS + ("content_offset",)}
+        self.content = self._map(os.path.join(store_path, CONTENT_FILE_NAME))
+
+    def _map(self, file_path: str) -> memoryview:
+        """
+        This function maps a file into memory
+        :param file_path: The file path
+        :return: A memoryview over the file
+        """
+        with open(file_path, "rb") as f:
+            # Empty files cannot be mapped
+            if os.fstat(f.fileno()).st_size == 0:
+                return memoryview(b"")
+            memory_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._memory_maps.append(memory_map)
+        return memoryview(memory_map)
+
+    def __len__(self) -> int:
+        return self.number_of_messages
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def get_content(self, index: int) -> str:
+        """
+        This function gets the content of a message
+        :param index: The index of the message
+        :return: The message content
+        """
+        content_offsets = self.columns["content_offset"]
+        return str(self.content[content_offsets[index]:content_offsets[index + 1]], "utf-8")
+
+    def iterate_records(self, author_table: AuthorTable) -> Iterator[MessageRecord]:
+        """
+        This function yields every message of the store in order
+        :param author_table: The authors of the store are added to it, and the records refer to them by index
+        :return: An iterator over message records
+        """
+        author_indices = [author_table.add(author_id, name, discriminator)
+                          for author_id, name, discriminator in self.authors]
+        author_ids = author_table.author_ids
+        content = self.content
+        content_offsets = self.columns["content_offset"]
+        for author_index, channel_id, timestamp, message_id, reference_id, start, end in zip(
+                self.columns["author"], self.columns["channel_id"], self.columns["timestamp"],
+                self.columns["message_id"], self.columns["reference_id"], content_offsets, content_offsets[1:]):
+            author_index = author_indices[author_index]
+            yield MessageRecord(author_index, str(content[start:end], "utf-8"), message_id, author_ids[author_index],
+                                channel_id, timestamp, reference_id)
+
+    def close(self) -> None:
+        """
+        This function releases the memory maps
+        :return: None
+        """
+        for column in self.columns.values():
+            column.release()
+        self.content.release()
+        for memory_map in self._memory_maps:
+            memory_map.close()
+        self._memory_maps = []
+
+
+def iterate_and_write_binary_message_store(records: Iterable, store_path: str,
+                                           author_table: AuthorTable) -> Iterator[MessageRecord]:
+    """
+    This function writes the message records to a binary message store while passing them on
+    :param records: An iterable of message records
+    :param store_path: The store folder path
+    :param author_table: The author table the records refer to
+    :return: An iterator over the same message records
+    """
+    store_writer = BinaryMessageStoreWriter(store_path, author_table)
+    try:
+        for record in records:
+            store_writer.append(record)
+            yield record
+    except BaseException:
+        store_writer.abort()
+        raise
+    store_writer.close()
+
+
+def write_binary_message_store(records: Iterable, store_path: str, author_table: AuthorTable) -> None:
+    """
+    This function writes the message records to a binary message store
+    :param records: An iterable of message records
+    :param store_path: The store folder path
+    :param author_table: The author table the records refer to
+    :return: None
+    """
+    for _ in iterate_and_write_binary_message_store(records, store_path, author_table):
+        pass
+
+
+def iterate_data_from_binary_message_store(store_path: str, author_table: AuthorTable,
+                                           statistics: PipelineStatistics = None,
+                                           message_id_index: MessageIdIndex = None) -> Iterator[MessageRecord]:
+    """
+    This function yields the message records of a binary message store, without parsing any JSON
+    :param store_path: The store folder path
+    :param author_table: The authors of the store are added to it, and the records refer to them by index
+    :param statistics: If given, the messages are counted in it
+    :param message_id_index: If given, the messages whose ids are already in it are dropped
+    :return: An iterator over message records
+    """
+    with BinaryMessageStore(store_path) as store:
+        records = store.iterate_records(author_table)
+        try:
+            for record in records:
+                # Drop the messages that were already seen, the store keeps them as they were loaded
+                if message_id_index is not None and not message_id_index.add(record.message_id):
+                    if statistics is not None:
+                        statistics.record_duplicate()
+                    continue
+                if statistics is not None:
+                    statistics.record_message(author_table.get_label(record.author_index))
+                yield record
+        finally:
+            # The views into the memory maps have to be gone before the maps are closed
+            records.close()
+
+
+def main(store_path: str) -> None:
+    """
+    This function prints the message records of a binary message store
+    :param store_path: The store folder path
+    :return: None
+    """
+
+    author_table = AuthorTable()
+    for record in iterate_data_from_binary_message_store(store_path, author_table):
+        print(author_table.get_label(record.author_index), record)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+
+    if len(args) != 1:
+        print("Usage: " + sys.argv[0] + " <store_folder_path>")
+        sys.exit(1)
+    if not os.path.isdir(args[0]):
+        print("ERROR: The store folder path is invalid: " + args[0])
+        sys.exit(1)
+
+    main(args[0])
@@ -0,0 +1,260 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Builds context/response pairs for dialogue training out of the message records, in a single pass.
+#  The messages of every channel are grouped into turns: the messages an author sends one after another
+#  are one turn, until another author writes or the author replies to a message.
+#  A turn is also complete once it has as many messages as the maximum turn size, so that an author who
+#  never stops talking does not make it grow without bounds, the next messages start a new turn.
+#  When a turn is complete, it is emitted as the response of a window whose context is:
+#  - the chain of turns it replies to, followed through their own replies, if the replied message is still known
+#  - otherwise the turns before it in the channel
+#  Every channel only keeps a ring buffer of its last turns, and the turns of its last messages for the replies,
+#  so the memory used does not grow with the length of the channels.
+#  Format of a window, written as one JSON object per line:
+#  {
+#    "channel_id": "ChannelId",
+#    "message_id": "FirstMessageIdOfTheResponse",
+#    "is_reply": IsTheContextAReplyChain,
+#    "context": ["MessageAuthorName___MessageAuthorDiscriminator: Turn", ...],
+#    "response": "MessageAuthorName___MessageAuthorDiscriminator: Turn"
+#  }
+#  The lines of a turn are joined with "\n", the empty lines are dropped like in the converted lines.
+
+import sys
+from collections import deque
+from typing import Iterable, Iterator
+
+from Functions.author_table import AuthorTable
+from Functions.binary_message_store import iterate_data_from_binary_message_store
+from Functions.json_backends import DEFAULT_JSON_BACKEND, dumps_json
+from Functions.message_record import MessageRecord
+from Functions.normalize_message_content import ContentNormalizer
+from Functions.pipeline_statistics import PipelineStatistics
+
+# The number of turns before the response in a window
+DEFAULT_CONTEXT_SIZE = 4
+# The number of messages of every channel that replies can be followed to
+DEFAULT_REPLY_LOOKBACK = 10000
+# The number of messages after which a turn is complete
+DEFAULT_MAXIMUM_TURN_SIZE = 50
+
+
+class _Turn:
+    """
+    The messages an author sent one after another in a channel
+    """
+    __slots__ = ("author_index", "lines", "message_ids", "reference_id")
+
+    def __init__(self, record: MessageRecord, lines: list):
+        """
+        :param record: The first message of the turn
+        :param lines: The non empty lines of the message
+        """
+        self.author_index = record.author_index
+        self.lines = lines
+        self.message_ids = [record.message_id]
+        self.reference_id = record.reference_id
+
+
+class _Channel:
+    """
+    The recent turns of a channel
+    """
+    __slots__ = ("turns", "pending_turn", "replied_turns", "replied_message_ids")
+
+    def __init__(self, context_size: int):
+        """
+        :param context_size: The number of turns kept for the context
+        """
+        # The texts of the last complete turns, oldest first
+        self.turns = deque(maxlen=context_size)
+        # The turn that is not complete yet
+        self.pending_turn = None
+        # The (text, reference id) of the turn of every recent message, by message id
+        self.replied_turns = {}
+        # The ids in replied_turns, oldest first, to forget the oldest ones
+        self.replied_message_ids = deque()
+
+
+class ConversationWindowBuilder:
+    """
+    Groups the message records into turns and builds the windows, one record at a time
+    """
+
+    def __init__(self, author_table: AuthorTable, context_size: int = DEFAULT_CONTEXT_SIZE,
+                 reply_lookback: int = DEFAULT_REPLY_LOOKBACK, statistics: PipelineStatistics = None,
+                 normalizer: ContentNormalizer = None, maximum_turn_size: int = DEFAULT_MAXIMUM_TURN_SIZE):
+        """
+        :param author_table: The author table the records refer to
+        :param context_size: The number of turns before the response in a window
+        :param reply_lookback: The number of messages of every channel that replies can be followed to
+        :param statistics: If given, the kept and dropped lines of the messages are counted in it
+        :param normalizer: If given, the message contents are normalized before they are split into lines
+        :param maximum_turn_size: The number of messages after which a turn is complete
+        """
+        if context_size < 1:
+            raise ValueError("The context of the conversation windows needs at least one turn")
+        if maximum_turn_size < 1:
+            raise ValueError("A turn of the conversation windows needs at least one message")
+        self.author_table = author_table
+        self.context_size = context_size
+        self.reply_lookback = reply_lookback
+        self.maximum_turn_size = maximum_turn_size
+        self.statistics = statistics
+        self._normalize = None if normalizer is None else normalizer.get_normalize_function(author_table)
+        self._channels = {}
+
+    def add(self, record: MessageRecord) -> dict:
+        """
+        This function adds the next message record
+        :param record: The message record
+        :return: The window of the turn the message completed, or None
+        """
+        content = record.content if self._normalize is None else self._normalize(record.content)
+        message_content_list = content.split("\n")
+        lines = [line for line in message_content_list if line != ""]
+        if self.statistics is not None:
+            self.statistics.record_conversion(len(lines), len(message_content_list) - len(lines))
+        # Empty messages are not turns
+        if len(lines) == 0:
+            return None
+        channel = self._channels.get(record.channel_id)
+        if channel is None:
+            channel = self._channels[record.channel_id] = _Channel(self.context_size)
+        pending_turn = channel.pending_turn
+        if pending_turn is not None and pending_turn.author_index == record.author_index and \
+                record.reference_id == 0 and len(pending_turn.message_ids) < self.maximum_turn_size:
+            # The author keeps talking
+            pending_turn.lines.extend(lines)
+            pending_turn.message_ids.append(record.message_id)
+            return None
+        window = None if pending_turn is None else self._complete_turn(record.channel_id, channel)
+        channel.pending_turn = _Turn(record, lines)
+        return window
+
+    def finish(self) -> Iterator[dict]:
+        """
+        This function completes the last turn of every channel, once there are no more records
+        :return: An iterator over the windows of the last turns
+        """
+        for channel_id, channel in self._channels.items():
+            if channel.pending_turn is not None:
+                window = self._complete_turn(channel_id, channel)
+                if window is not None:
+                    yield window
+
+    def _complete_turn(self, channel_id: int, channel: _Channel) -> dict:
+        """
+        This function makes the window of the pending turn of a channel, and moves the turn to the context
+        :param channel_id: The channel id
+        :param channel: The channel
+        :return: The window, or None if the turn has no context
+        """
+        turn = channel.pending_turn
+        channel.pending_turn = None
+        text = self.author_table.get_label(turn.author_index) + ": " + "\n".join(turn.lines)
+        # Follow the replies back, as long as the replied messages are still known
+        context = []
+        reference_id = turn.reference_id
+        while reference_id != 0 and len(context) < self.context_size:
+            replied_turn = channel.replied_turns.get(reference_id)
+            if replied_turn is None:
+                break
+            context.append(replied_turn[0])
+            reference_id = replied_turn[1]
+        is_reply = len(context) > 0
+        if is_reply:
+            context.reverse()
+        else:
+            context = list(channel.turns)
+        channel.turns.append(text)
+        # Remember the turn of every message of the turn, for the replies to come
+        replied_turn = (text, turn.reference_id)
+        for message_id in turn.message_ids:
+            channel.replied_turns[message_id] = replied_turn
+            channel.replied_message_ids.append(message_id)
+        while len(channel.replied_message_ids) > self.reply_lookback:
+            del channel.replied_turns[channel.replied_message_ids.popleft()]
+        if len(context) == 0:
+            return None
+        return {
+            "channel_id": str(channel_id),
+            "message_id": str(turn.message_ids[0]),
+            "is_reply": is_reply,
+            "context": context,
+            "response": text
+        }
+
+
+def iterate_conversation_windows(records: Iterable, author_table: AuthorTable,
+                                 context_size: int = DEFAULT_CONTEXT_SIZE,
+                                 reply_lookback: int = DEFAULT_REPLY_LOOKBACK, statistics: PipelineStatistics = None,
+                                 normalizer: ContentNormalizer = None,
+                                 maximum_turn_size: int = DEFAULT_MAXIMUM_TURN_SIZE) -> Iterator[dict]:
+    """
+    This function builds the conversation windows while the message records stream through
+    :param records: An iterable of message records
+    :param author_table: The author table the records refer to
+    :param context_size: The number of turns before the response in a window
+    :param reply_lookback: The number of messages of every channel that replies can be followed to
+    :param statistics: If given, the kept and dropped lines of the messages are counted in it
+    :param normalizer: If given, the message contents are normalized before they are split into lines
+    :param maximum_turn_size: The number of messages after which a turn is complete
+    :return: An iterator over the windows, as dicts in the format of the description
+    """
+    builder = ConversationWindowBuilder(author_table, context_size, reply_lookback, statistics, normalizer,
+                                        maximum_turn_size)
+    for record in records:
+        window = builder.add(record)
+        if window is not None:
+            yield window
+    yield from builder.finish()
+
+
+def format_conversation_window(window: dict, json_backend: str = DEFAULT_JSON_BACKEND) -> str:
+    """
+    This function formats a window as a line of the output file
+    :param window: The window
+    :param json_backend: The backend that encodes the window, "auto" picks the fastest one that is installed
+    :return: The window as a JSON object, without a line break
+    """
+    return dumps_json(window, json_backend)
+
+
+def main(store_path: str, context_size: int = DEFAULT_CONTEXT_SIZE) -> None:
+    """
+    This function prints the conversation windows of a binary message store
+    :param store_path: The store folder path
+    :param context_size: The number of turns before the response in a window
+    :return: None
+    """
+    author_table = AuthorTable()
+    for window in iterate_conversation_windows(iterate_data_from_binary_message_store(store_path, author_table),
+                                               author_table, context_size):
+        print(format_conversation_window(window))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+
+    if len(args) < 1:
+        print("Usage: " + sys.argv[0] + " <store_folder_path> [<context_size>]")
+        sys.exit(1)
+
+    main(args[0], int(args[1]) if len(args) > 1 else DEFAULT_CONTEXT_SIZE)
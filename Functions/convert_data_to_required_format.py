@@ -17,63 +17,165 @@
 #
 #  Description:
 #  This script is used to convert the JSON data into the required format.
+#  The message contents can be normalized on the way, see normalize_message_content.
+#  The messages can also be converted to JSON records, written one per line, instead of "author: line" rows:
+#  {
+#    "author": "MessageAuthorName___MessageAuthorDiscriminator",
+#    "channel": "ChannelId",
+#    "timestamp": MillisecondsSinceTheUnixEpoch,
+#    "content": "NonEmptyLinesOfTheMessageContentJoinedWithLineBreaks"
+#  }
 
 import sys
-import time
+from typing import Iterable, Iterator
 
+from Functions.author_table import AuthorTable
+from Functions.json_backends import DEFAULT_JSON_BACKEND, dumps_json
+from Functions.normalize_message_content import ContentNormalizer
+from Functions.pipeline_instrumentation import StageTimer, format_average
+from Functions.pipeline_statistics import PipelineStatistics
 
-def convert_data_to_required_format(data_list: list, verbose: bool) -> list:
+
+def _extend_author_prefixes(author_prefixes: list, author_table: AuthorTable) -> None:
+    """
+    This function adds the output prefixes of the authors that were added to the author table since the last call
+    :param author_prefixes: The list of "MessageAuthorName___MessageAuthorDiscriminator: " prefixes by author index
+    :param author_table: The author table of the run
+    :return: None
+    """
+    for author_index in range(len(author_prefixes), len(author_table)):
+        author_prefixes.append(author_table.get_label(author_index) + ": ")
+
+
+def iterate_converted_data_with_records(data_iterable: Iterable, author_table: AuthorTable,
+                                        statistics: PipelineStatistics = None,
+                                        normalizer: ContentNormalizer = None) -> Iterator[tuple]:
+    """
+    This function converts the data to the required format one message at a time,
+    keeping every converted line together with the record it came from
+    :param data_iterable: An iterable of message records
+    :param author_table: The author table the records refer to
+    :param statistics: If given, the converted and dropped lines are counted in it
+    :param normalizer: If given, the message contents are normalized before they are split into lines
+    :return: An iterator over (message record, converted data) pairs
+    """
+    # The loader keeps adding authors while the records stream through
+    author_prefixes = []
+    normalize = None if normalizer is None else normalizer.get_normalize_function(author_table)
+    # Loop through the records
+    for data in data_iterable:
+        # Get the message author prefix
+        if data[0] >= len(author_prefixes):
+            _extend_author_prefixes(author_prefixes, author_table)
+        message_author_prefix = author_prefixes[data[0]]
+        # Get the message content
+        message_content_list = (data[1] if normalize is None else normalize(data[1])).split("\n")
+        number_of_lines = 0
+        # Loop through the lines of the message content
+        for message in message_content_list:
+            # Only yield the message if it is not empty
+            if message != "":
+                number_of_lines += 1
+                yield data, message_author_prefix + message + "\n"
+        if statistics is not None:
+            statistics.record_conversion(number_of_lines, len(message_content_list) - number_of_lines)
+
+
+def iterate_converted_data_in_required_format(data_iterable: Iterable, author_table: AuthorTable,
+                                              statistics: PipelineStatistics = None,
+                                              normalizer: ContentNormalizer = None) -> Iterator[str]:
+    """
+    This function converts the data to the required format one message at a time
+    :param data_iterable: An iterable of message records
+    :param author_table: The author table the records refer to
+    :param statistics: If given, the converted and dropped lines are counted in it
+    :param normalizer: If given, the message contents are normalized before they are split into lines
+    :return: An iterator over the converted data
+    """
+    return (line for _, line in iterate_converted_data_with_records(data_iterable, author_table, statistics,
+                                                                     normalizer))
+
+
+def iterate_converted_data_as_json_records(data_iterable: Iterable, author_table: AuthorTable,
+                                           statistics: PipelineStatistics = None,
+                                           normalizer: ContentNormalizer = None,
+                                           json_backend: str = DEFAULT_JSON_BACKEND) -> Iterator[tuple]:
+    """
+    This function converts the data to JSON records one message at a time,
+    keeping every JSON record together with the record it came from
+    :param data_iterable: An iterable of message records
+    :param author_table: The author table the records refer to
+    :param statistics: If given, the converted and dropped lines are counted in it
+    :param normalizer: If given, the message contents are normalized before they are split into lines
+    :param json_backend: The backend that encodes the JSON records, "auto" picks the fastest one that is installed
+    :return: An iterator over (message record, JSON record without a line break) pairs,
+             the messages without any non empty line are dropped
+    """
+    author_labels = []
+    normalize = None if normalizer is None else normalizer.get_normalize_function(author_table)
+    for data in data_iterable:
+        if data.author_index >= len(author_labels):
+            author_labels.extend(author_table.get_label(author_index)
+                                 for author_index in range(len(author_labels), len(author_table)))
+        message_content_list = (data.content if normalize is None else normalize(data.content)).split("\n")
+        lines = [message for message in message_content_list if message != ""]
+        if statistics is not None:
+            statistics.record_conversion(len(lines), len(message_content_list) - len(lines))
+        if len(lines) == 0:
+            continue
+        yield data, dumps_json({
+            "author": author_labels[data.author_index],
+            # The ids are bigger than the integers JavaScript can hold
+            "channel": str(data.channel_id),
+            "timestamp": data.timestamp,
+            "content": "\n".join(lines)
+        }, json_backend)
+
+
+def convert_data_to_required_format(data_list: Iterable, verbose: bool, author_table: AuthorTable = None,
+                                    statistics: PipelineStatistics = None,
+                                    normalizer: ContentNormalizer = None) -> list:
     """
     This function converts the data to the required format
     by removing the new line characters and
     replacing the double quotes with single quotes
-    :param data_list: A list of JSON data
+    :param data_list: The message records, or [message author, message content] lists without an author table
     :param verbose: If True, then show progress
+    :param author_table: The author table the records refer to, if None the message authors of the lists
+                         are added to a new one
+    :param statistics: If given, the converted and dropped lines are counted in it, otherwise a new one is used
+    :param normalizer: If given, the message contents are normalized before they are split into lines
     :return: A list of converted data
     """
-    # Start the timer
-    start_time = time.time()
-    # Create an empty list to store the converted data
-    converted_data_list = []
-    # Get the total number of JSON files
-    total_number_of_json_files = len(data_list)
+    if author_table is None:
+        author_table = AuthorTable()
+        records = []
+        for author, content in data_list:
+            name, _, discriminator = author.rpartition("___")
+            records.append((author_table.add(0, name, discriminator), content))
+        data_list = records
+    # Count the dropped lines while converting, for the report
+    if statistics is None and verbose:
+        statistics = PipelineStatistics()
+        for data in data_list:
+            statistics.record_message(author_table.get_label(data[0]))
     # Print the message
     if verbose:
         print("----------------------------------------")
         print("Converting the data to the required format...")
-    # Loop through the list of JSON files
-    for data in data_list:
-        # Get the message author name
-        message_author_name = data[0]
-        # Get the message content
-        message_content = data[1]
-        message_content_list = message_content.split("\n")
-        # Loop through the message content list
-        for message in message_content_list:
-            # Only add the message if it is not empty
-            if message != "":
-                # Append the message author name and message content to the converted data list
-                converted_data_list.append(
-                    message_author_name + ": " + message + "\n")
-    # Stop the timer
-    end_time = time.time()
-    # Calculate the total time taken
-    total_time_taken = end_time - start_time
+    # Convert every record and collect the converted data
+    with StageTimer("conversion", statistics) as stage_timer:
+        converted_data_list = list(iterate_converted_data_in_required_format(data_list, author_table, statistics,
+                                                                             normalizer))
     # Print the message
     if verbose:
         print("----------------------------------------")
         print("Total data converted: " + str(len(converted_data_list)))
         print("Total time taken to convert the data: {} seconds".format(
-            total_time_taken))
-        print("Average time taken to convert a JSON file: {} seconds".format(
-            round((total_time_taken / total_number_of_json_files), 2)))
+            stage_timer.seconds))
+        print("Average time taken to convert a message: " + format_average(stage_timer.seconds, len(data_list)))
         print("----------------------------------------")
-        # Print the number of lines removed
-        print("Number of lines removed: " +
-              str(len(data_list) - len(converted_data_list)))
-        # Print the number of lines removed per author
-        print("Number of lines removed per author: " + str(
-            (len(data_list) - len(converted_data_list)) / len(set([data[0] for data in data_list]))))
+        statistics.print_conversion_report()
     # Return the converted data list
     return converted_data_list
 
@@ -81,13 +183,13 @@ def convert_data_to_required_format(data_list: list, verbose: bool) -> list:
 def main(data_list: list, verbose: bool = False) -> None:
     """
     This function converts the JSON data into the required format
-    :param data_list: list of raw data
+    :param data_list: list of "MessageAuthorName___MessageAuthorDiscriminator:MessageContent" items
     :param verbose: if True, then show progress
     :return: None
     """
     # TODO: Check if other docstrings use rtype instead of return
 
-    converted_data = convert_data_to_required_format(data_list, verbose)
+    converted_data = convert_data_to_required_format([item.partition(":")[::2] for item in data_list], verbose)
     print(converted_data)
 
 
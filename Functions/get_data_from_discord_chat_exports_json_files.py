@@ -59,105 +59,713 @@
 #        "embeds": [EmbedsData],
 #        "stickers": [StickersData],
 #        "reactions": [ReactionsData],
-#        "mentions": [MentionsData]
+#        "mentions": [MentionsData],
+#        "reference": {
+#          "messageId": "RepliedMessageId",
+#          "channelId": "RepliedMessageChannelId",
+#          "guildId": "RepliedMessageGuildId"
+#        }
 #      }
 #    ],
 #    [...]
 #    "messageCount": MessageCount
 #  }
 
-import json
+import asyncio
+import multiprocessing
 import os
+import queue
 import sys
-import time
+import threading
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import AsyncIterator, Callable, Iterable, Iterator
 
+from Functions.author_table import AuthorTable
+from Functions.json_backends import DEFAULT_JSON_BACKEND, get_json_backend_name, load_json_file, loads_json
+from Functions.message_filter import MessageFilter
+from Functions.message_id_index import MessageIdIndex
+from Functions.message_record import MessageColumns, MessageRecord
+from Functions.parse_discord_timestamp import parse_discord_timestamp
+from Functions.pipeline_instrumentation import StageTimer, format_average
+from Functions.pipeline_statistics import PipelineStatistics
+from Functions.split_discord_chat_export_json_file import decode_message_range, find_message_ranges
+from Functions.stream_messages_from_discord_chat_export_json_file import DEFAULT_READ_SIZE, \
+    read_discord_chat_export_header, stream_messages_from_discord_chat_export_json_file
 
-def get_data_from_discord_chat_exports_json_files(json_files_list: list, verbose: bool) -> list:
+# The number of JSON files read at the same time in asynchronous mode
+DEFAULT_MAXIMUM_READS = 8
+
+
+def _iterate_messages_from_json_file(json_file: str, streaming: bool, read_size: int, header: dict,
+                                     accept_header: Callable = None,
+                                     json_backend: str = DEFAULT_JSON_BACKEND) -> Iterator[dict]:
+    """
+    This function gets the message objects from a JSON file
+    :param json_file: The JSON file path
+    :param streaming: If True, then the messages are parsed one at a time instead of loading the whole file
+    :param read_size: The number of characters read at a time when streaming
+    :param header: Filled with the other top level values (guild, channel, ...) before the first message
+    :param accept_header: If given and it returns False for the header, then no message is read
+    :param json_backend: The backend that decodes whole JSON files, streaming always uses the json module
+    :return: An iterator over the message objects
+    """
+    if streaming:
+        return stream_messages_from_discord_chat_export_json_file(json_file, header, read_size, accept_header)
+    if accept_header is not None:
+        # Only read the start of the JSON file to tell if it has to be loaded at all
+        header.update(read_discord_chat_export_header(json_file, read_size))
+        if not accept_header(header):
+            return iter(())
+    # Load the JSON file
+    data = load_json_file(json_file, json_backend)
+    # Get the messages from the JSON file
+    messages = data.pop("messages", [])
+    header.update(data)
+    return iter(messages)
+
+
+def _iterate_records_from_messages(messages: Iterable, header: dict, author_table: AuthorTable,
+                                   message_filter: MessageFilter = None, details: bool = True) -> Iterator[tuple]:
+    """
+    This function makes the records out of the message objects of a JSON file
+    :param messages: An iterable of message objects
+    :param header: The other top level values of the JSON file, filled by the time the first message comes
+    :param author_table: The message authors are added to it, and the records refer to them by index
+    :param message_filter: If given, only the messages that match it are yielded
+    :param details: If True, then message records are yielded, otherwise (author index, content, message id)
+                    tuples, without parsing the timestamps and the other ids
+    :return: An iterator over message records, or tuples without details
+    """
+    has_message_conditions, has_date_range = False, False
+    if message_filter is not None:
+        has_message_conditions = message_filter.has_message_conditions
+        has_date_range = message_filter.has_date_range
+    channel_id = None
+    # The author index of every author id string seen in this file, so that most messages
+    # only cost a dict lookup and two string comparisons instead of building the author label
+    author_indices = {}
+    author_ids, names, discriminators = author_table.author_ids, author_table.names, author_table.discriminators
+    # Loop through the messages
+    for message in messages:
+        # Drop the message before anything is made out of it
+        if has_message_conditions and not message_filter.matches_message(message):
+            continue
+        # Get the message timestamp, only when something needs it
+        if details or has_date_range:
+            timestamp = parse_discord_timestamp(message["timestamp"])
+            if has_date_range and not message_filter.matches_timestamp(timestamp):
+                continue
+        # Get the message author
+        author = message["author"]
+        # Get the message author name
+        message_author_name = author["name"]
+        # Get the message author discriminator
+        message_author_discriminator = author["discriminator"]
+        # Look the message author up in the author table
+        author_index = author_indices.get(author["id"])
+        if author_index is None or names[author_index] != message_author_name or \
+                discriminators[author_index] != message_author_discriminator:
+            author_index = author_table.add(int(author["id"]), message_author_name, message_author_discriminator)
+            author_indices[author["id"]] = author_index
+        # Keep the names of the mentioned users, to resolve the mentions in the message content
+        mentions = message.get("mentions")
+        if mentions:
+            author_table.add_mentions(mentions)
+        if not details:
+            yield author_index, message["content"], int(message["id"])
+            continue
+        # The channel comes before the messages in the file, so it is known by now
+        if channel_id is None:
+            channel_id = int(header["channel"]["id"]) if "channel" in header else 0
+        # Get the message the message replies to, only replies have a reference
+        reference = message.get("reference")
+        reference_id = int(reference["messageId"]) if reference and reference.get("messageId") else 0
+        # Get the message content
+        message_content = message["content"]
+        yield MessageRecord(author_index, message_content, int(message["id"]), author_ids[author_index], channel_id,
+                            timestamp, reference_id)
+
+
+def _iterate_data_from_json_file(json_file: str, streaming: bool, read_size: int, author_table: AuthorTable,
+                                 message_filter: MessageFilter = None, json_backend: str = DEFAULT_JSON_BACKEND,
+                                 details: bool = True) -> Iterator[tuple]:
+    """
+    This function yields the raw data from a single JSON file one message at a time
+    :param json_file: The JSON file path
+    :param streaming: If True, then the messages are parsed one at a time instead of loading the whole file
+    :param read_size: The number of characters read at a time when streaming
+    :param author_table: The message authors are added to it, and the records refer to them by index
+    :param message_filter: If given, only the messages that match it are yielded
+    :param json_backend: The backend that decodes whole JSON files
+    :param details: If False, then (author index, content, message id) tuples are yielded instead of records
+    :return: An iterator over message records
+    """
+    accept_header = None
+    if message_filter is not None and message_filter.has_header_conditions:
+        accept_header = message_filter.matches_header
+    header = {}
+    return _iterate_records_from_messages(
+        _iterate_messages_from_json_file(json_file, streaming, read_size, header, accept_header, json_backend), header,
+        author_table, message_filter, details)
+
+
+def _get_data_from_json_files_chunk(json_files_chunk: list, streaming: bool, read_size: int,
+                                    message_filter: MessageFilter, json_backend: str, details: bool = True) -> tuple:
+    """
+    This function gets the raw data from a chunk of JSON files inside a worker process
+    :param json_files_chunk: A list of JSON file paths
+    :param streaming: If True, then the messages are parsed one at a time instead of loading whole files
+    :param read_size: The number of characters read at a time when streaming
+    :param message_filter: If given, only the messages that match it are sent back
+    :param json_backend: The backend that decodes whole JSON files
+    :param details: If False, then (author index, content, message id) tuples are sent back instead of records
+    :return: The author table of the chunk, and a list of (JSON file path, list of records) pairs
+             in the same order as the chunk, with the author indices of the author table of the chunk
+    """
+    author_table = AuthorTable()
+    return author_table, [(json_file, list(_iterate_data_from_json_file(json_file, streaming, read_size,
+                                                                         author_table, message_filter,
+                                                                         json_backend, details)))
+                          for json_file in json_files_chunk]
+
+
+def _get_data_from_json_file_range(json_file: str, start: int, stop: int, header: dict,
+                                   message_filter: MessageFilter, json_backend: str, is_last_range: bool,
+                                   details: bool = True) -> tuple:
+    """
+    This function gets the raw data from a byte range of the messages of a JSON file inside a worker process
+    :param json_file: The JSON file path
+    :param start: The offset of the first message of the range
+    :param stop: The offset after the last message of the range
+    :param header: The other top level values of the JSON file, read before the file was split
+    :param message_filter: If given, only the messages that match it are sent back
+    :param json_backend: The backend that decodes the range
+    :param is_last_range: If True, then the JSON file is done once this range is
+    :param details: If False, then (author index, content, message id) tuples are sent back instead of records
+    :return: The author table of the range, and a list with a single (JSON file path, list of records) pair,
+             the JSON file path is None unless it is the last range of the file
+    """
+    author_table = AuthorTable()
+    records = list(_iterate_records_from_messages(decode_message_range(json_file, start, stop, json_backend),
+                                                  header, author_table, message_filter, details))
+    return author_table, [(json_file if is_last_range else None, records)]
+
+
+def _iterate_json_files_chunks(json_files_list: list, chunksize: int) -> Iterator[list]:
+    """
+    This function splits the JSON file paths into chunks
+    :param json_files_list: A list (or any iterable) of JSON file paths
+    :param chunksize: The number of JSON files in a chunk
+    :return: An iterator over lists of JSON file paths
+    """
+    chunk = []
+    for json_file in json_files_list:
+        chunk.append(json_file)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def _iterate_parallel_tasks(json_files_list: list, chunksize: int, streaming: bool, read_size: int,
+                            message_filter: MessageFilter, json_backend: str, split_size: int,
+                            details: bool = True) -> Iterator[tuple]:
+    """
+    This function makes the tasks of the worker processes: the chunks of JSON files,
+    and the byte ranges of the JSON files that are at least split_size bytes big
+    :param json_files_list: A list (or any iterable) of JSON file paths
+    :param chunksize: The number of JSON files in a chunk
+    :param streaming: If True, then the messages of the chunks are parsed one at a time instead of loading whole files
+    :param read_size: The number of characters read at a time when streaming or reading the headers
+    :param message_filter: If given, only the messages that match it are sent back
+    :param json_backend: The backend that decodes whole JSON files and the ranges
+    :param split_size: If given, the number of bytes of messages in a range of a split JSON file
+    :param details: If False, then the workers send (author index, content, message id) tuples back
+    :return: An iterator over (function, arguments) pairs, in the order of the JSON files
+    """
+    if split_size is None:
+        for chunk in _iterate_json_files_chunks(json_files_list, chunksize):
+            yield _get_data_from_json_files_chunk, (chunk, streaming, read_size, message_filter, json_backend, details)
+        return
+    chunk = []
+    for json_file in json_files_list:
+        ranges = None
+        if os.path.getsize(json_file) >= split_size:
+            header = read_discord_chat_export_header(json_file, read_size)
+            # The JSON files that are skipped by the filter are left to the chunks, they do not read the messages
+            if message_filter is None or not message_filter.has_header_conditions or \
+                    message_filter.matches_header(header):
+                ranges = find_message_ranges(json_file, split_size)
+        if ranges is None:
+            chunk.append(json_file)
+            if len(chunk) == chunksize:
+                yield _get_data_from_json_files_chunk, (chunk, streaming, read_size, message_filter, json_backend,
+                                                        details)
+                chunk = []
+            continue
+        # The JSON files before this one come first
+        if len(chunk) > 0:
+            yield _get_data_from_json_files_chunk, (chunk, streaming, read_size, message_filter, json_backend, details)
+            chunk = []
+        for range_index, (start, stop) in enumerate(ranges):
+            yield _get_data_from_json_file_range, (json_file, start, stop, header, message_filter, json_backend,
+                                                   range_index == len(ranges) - 1, details)
+    if len(chunk) > 0:
+        yield _get_data_from_json_files_chunk, (chunk, streaming, read_size, message_filter, json_backend, details)
+
+
+def _iterate_remapped_records(records: list, author_indices: list, author_ids: list,
+                              details: bool = True) -> Iterator[tuple]:
+    """
+    This function moves the records of a worker over to the author table of the run
+    :param records: The records, with the author indices of the author table of the worker
+    :param author_indices: The index in the author table of the run of every index in the table of the worker
+    :param author_ids: The author ids of the author table of the run
+    :param details: If False, then the records are (author index, content, message id) tuples
+    :return: An iterator over message records
+    """
+    if not details:
+        for author_index, content, message_id in records:
+            yield author_indices[author_index], content, message_id
+        return
+    for author_index, content, message_id, _, channel_id, timestamp, reference_id in records:
+        author_index = author_indices[author_index]
+        yield MessageRecord(author_index, content, message_id, author_ids[author_index], channel_id, timestamp,
+                            reference_id)
+
+
+def _iterate_data_from_json_files_in_parallel(json_files_list: list, verbose: bool, streaming: bool, read_size: int,
+                                              workers: int, chunksize: int, statistics: PipelineStatistics,
+                                              author_table: AuthorTable, message_filter: MessageFilter,
+                                              json_backend: str, split_size: int = None,
+                                              details: bool = True) -> Iterator[tuple]:
+    """
+    This function parses the JSON files in a pool of worker processes
+    and yields the raw data in the same order as the JSON file paths,
+    the big JSON files are split into byte ranges of messages that are parsed by several workers
+    :param json_files_list: A list of JSON file paths
+    :param verbose: If True, then show progress
+    :param streaming: If True, then the messages are parsed one at a time instead of loading whole files
+    :param read_size: The number of characters read at a time when streaming
+    :param workers: The number of worker processes
+    :param chunksize: The number of JSON files handed to a worker at a time
+    :param statistics: If given, the files are counted in it
+    :param author_table: The message authors are added to it, and the records refer to them by index
+    :param message_filter: If given, only the messages that match it are yielded
+    :param json_backend: The backend that decodes whole JSON files
+    :param split_size: If given, the JSON files at least this many bytes big are split into ranges of about this size
+    :param details: If False, then (author index, content, message id) tuples are yielded instead of records
+    :return: An iterator over message records
+    """
+
+    def _iterate_chunk_data(chunk_data: tuple) -> Iterator[tuple]:
+        chunk_author_table, files_data = chunk_data
+        # Every worker numbers the authors of its chunk on its own, so move them over to the table of the run
+        author_indices = author_table.merge(chunk_author_table)
+        for json_file, records in files_data:
+            # The ranges of a split JSON file only name it once the last one is done
+            if json_file is not None:
+                if verbose:
+                    print("Loaded JSON file: " + json_file)
+                if statistics is not None:
+                    statistics.record_file(os.path.getsize(json_file))
+            yield from _iterate_remapped_records(records, author_indices, author_table.author_ids, details)
+
+    # Only keep a couple of chunks per worker in flight,
+    # so that a slow consumer does not make the parsed data pile up in memory
+    maximum_pending_chunks = workers * 2
+    pending_chunks = deque()
+    with multiprocessing.Pool(workers) as pool:
+        for function, arguments in _iterate_parallel_tasks(json_files_list, chunksize, streaming, read_size,
+                                                           message_filter, json_backend, split_size, details):
+            pending_chunks.append(pool.apply_async(function, arguments))
+            if len(pending_chunks) < maximum_pending_chunks:
+                continue
+            # Results are merged back strictly in submission order
+            yield from _iterate_chunk_data(pending_chunks.popleft().get())
+        while len(pending_chunks) > 0:
+            yield from _iterate_chunk_data(pending_chunks.popleft().get())
+
+
+def _iterate_data_from_json_files_serially(json_files_list: list, verbose: bool, streaming: bool, read_size: int,
+                                           statistics: PipelineStatistics, author_table: AuthorTable,
+                                           message_filter: MessageFilter, json_backend: str,
+                                           details: bool = True) -> Iterator[tuple]:
+    """
+    This function parses the JSON files one after another in this process
+    :param json_files_list: A list of JSON file paths
+    :param verbose: If True, then show progress
+    :param streaming: If True, then the messages are parsed one at a time instead of loading whole files
+    :param read_size: The number of characters read at a time when streaming
+    :param statistics: If given, the files are counted in it
+    :param author_table: The message authors are added to it, and the records refer to them by index
+    :param message_filter: If given, only the messages that match it are yielded
+    :param json_backend: The backend that decodes whole JSON files
+    :param details: If False, then (author index, content, message id) tuples are yielded instead of records
+    :return: An iterator over message records
+    """
+    # Loop through the list of JSON files
+    for json_file in json_files_list:
+        if verbose:
+            print("Loading JSON file: " + json_file)
+        if statistics is not None:
+            statistics.record_file(os.path.getsize(json_file))
+        yield from _iterate_data_from_json_file(json_file, streaming, read_size, author_table, message_filter,
+                                                json_backend, details)
+
+
+def _read_json_file(json_file: str, read_size: int, message_filter: MessageFilter) -> bytes:
+    """
+    This function reads a whole JSON file, in a thread of the asynchronous mode
+    :param json_file: The JSON file path
+    :param read_size: The number of characters read at a time when reading the header
+    :param message_filter: If given, the JSON files whose header cannot match it are not read
+    :return: The content of the JSON file, or None if it was skipped
+    """
+    if message_filter is not None and message_filter.has_header_conditions and \
+            not message_filter.matches_header(read_discord_chat_export_header(json_file, read_size)):
+        return None
+    with open(json_file, "rb") as f:
+        return f.read()
+
+
+def _decode_json_file(json_file_content: bytes, message_filter: MessageFilter, json_backend: str,
+                      details: bool = True) -> tuple:
+    """
+    This function decodes the content of a JSON file, in the executor of the asynchronous mode
+    :param json_file_content: The content of the JSON file, or None if it was skipped
+    :param message_filter: If given, only the messages that match it are kept
+    :param json_backend: The backend that decodes the JSON file
+    :param details: If False, then the records are (author index, content, message id) tuples
+    :return: The author table of the JSON file, and the list of its records
+    """
+    author_table = AuthorTable()
+    if json_file_content is None:
+        return author_table, []
+    data = loads_json(json_file_content, json_backend)
+    messages = data.pop("messages", [])
+    return author_table, list(_iterate_records_from_messages(messages, data, author_table, message_filter, details))
+
+
+async def _aiterate_decoded_json_files(json_files_list: Iterable, read_size: int, maximum_reads: int,
+                                       executor: Executor, message_filter: MessageFilter, json_backend: str,
+                                       details: bool = True) -> AsyncIterator[tuple]:
+    """
+    This function reads and decodes the JSON files, with a bounded number of reads in flight,
+    and yields them in the same order as the JSON file paths
+    :param json_files_list: A list (or any iterable) of JSON file paths
+    :param read_size: The number of characters read at a time when reading the headers
+    :param maximum_reads: The number of JSON files read at the same time
+    :param executor: The executor the JSON files are decoded in, None for the default thread pool of the loop
+    :param message_filter: If given, only the messages that match it are kept
+    :param json_backend: The backend that decodes the JSON files
+    :param details: If False, then the records are (author index, content, message id) tuples
+    :return: An asynchronous iterator over (JSON file path, author table, list of records) tuples
+    """
+    loop = asyncio.get_running_loop()
+    reads = asyncio.Semaphore(maximum_reads)
+
+    async def _load(json_file: str) -> tuple:
+        # The file is read in a thread while the loop goes on with the other files
+        async with reads:
+            json_file_content = await loop.run_in_executor(None, _read_json_file, json_file, read_size,
+                                                           message_filter)
+        author_table, records = await loop.run_in_executor(executor, _decode_json_file, json_file_content,
+                                                           message_filter, json_backend, details)
+        return json_file, author_table, records
+
+    # Reading ahead is bounded too, so that a slow consumer does not make the decoded files pile up in memory
+    maximum_pending_files = maximum_reads * 2
+    pending_files = deque()
+    try:
+        for json_file in json_files_list:
+            pending_files.append(loop.create_task(_load(json_file)))
+            if len(pending_files) >= maximum_pending_files:
+                yield await pending_files.popleft()
+        while len(pending_files) > 0:
+            yield await pending_files.popleft()
+    finally:
+        for pending_file in pending_files:
+            pending_file.cancel()
+
+
+def _is_new_record(record: tuple, statistics: PipelineStatistics, message_id_index: MessageIdIndex,
+                   author_table: AuthorTable) -> bool:
+    """
+    This function drops the duplicate messages and counts the others
+    :param record: The message record, or the (author index, content, message id) tuple
+    :param statistics: If given, the message is counted in it
+    :param message_id_index: If given, the message is dropped if its id is already in it
+    :param author_table: The author table the record refers to
+    :return: True if the message is kept
+    """
+    # Drop the messages that were already seen in another export
+    if message_id_index is not None and not message_id_index.add(record[2]):
+        if statistics is not None:
+            statistics.record_duplicate()
+        return False
+    if statistics is not None:
+        statistics.record_message(author_table.get_label(record[0]))
+    return True
+
+
+async def aiterate_data_from_discord_chat_exports_json_files(json_files_list: Iterable, verbose: bool = False,
+                                                             read_size: int = DEFAULT_READ_SIZE,
+                                                             maximum_reads: int = DEFAULT_MAXIMUM_READS,
+                                                             executor: Executor = None,
+                                                             statistics: PipelineStatistics = None,
+                                                             message_id_index: MessageIdIndex = None,
+                                                             author_table: AuthorTable = None,
+                                                             message_filter: MessageFilter = None,
+                                                             json_backend: str = DEFAULT_JSON_BACKEND,
+                                                             details: bool = True) -> AsyncIterator[tuple]:
+    """
+    This function yields the raw data from the JSON files one message at a time, for asyncio code.
+    The JSON files are read in threads and decoded in the executor, so the loop is never blocked
+    :param json_files_list: A list (or any iterable) of JSON file paths
+    :param verbose: If True, then show progress
+    :param read_size: The number of characters read at a time when reading the headers
+    :param maximum_reads: The number of JSON files read at the same time
+    :param executor: The executor the JSON files are decoded in, e.g. a ProcessPoolExecutor,
+                     None for the default thread pool of the loop
+    :param statistics: If given, the files and messages are counted in it as they stream through
+    :param message_id_index: If given, the messages whose id is already in it are dropped as duplicates
+    :param author_table: The message authors are added to it, and the records refer to them by index,
+                         pass the same one to the converter
+    :param message_filter: If given, only the messages that match it are yielded
+    :param json_backend: The backend that decodes the JSON files, "auto" picks the fastest one that is installed
+    :param details: If False, then (author index, content, message id) tuples are yielded instead of records,
+                    for the steps that do not need the channels, the timestamps or the replies
+    :return: An asynchronous iterator over message records
+    """
+    if author_table is None:
+        author_table = AuthorTable()
+    decoded_json_files = _aiterate_decoded_json_files(json_files_list, read_size, maximum_reads, executor,
+                                                      message_filter, json_backend, details)
+    try:
+        async for json_file, file_author_table, records in decoded_json_files:
+            if verbose:
+                print("Loaded JSON file: " + json_file)
+            if statistics is not None:
+                statistics.record_file(os.path.getsize(json_file))
+            for record in _iterate_remapped_records(records, author_table.merge(file_author_table),
+                                                    author_table.author_ids, details):
+                if _is_new_record(record, statistics, message_id_index, author_table):
+                    yield record
+    finally:
+        await decoded_json_files.aclose()
+
+
+def _iterate_data_from_json_files_asynchronously(json_files_list: Iterable, verbose: bool, read_size: int,
+                                                 workers: int, maximum_reads: int, statistics: PipelineStatistics,
+                                                 author_table: AuthorTable, message_filter: MessageFilter,
+                                                 json_backend: str, details: bool = True) -> Iterator[tuple]:
+    """
+    This function reads and decodes the JSON files in an event loop on its own thread,
+    and yields the raw data in this thread, so the reads overlap with the conversion and the writing
+    :param json_files_list: A list (or any iterable) of JSON file paths
+    :param verbose: If True, then show progress
+    :param read_size: The number of characters read at a time when reading the headers
+    :param workers: The number of worker processes decoding the JSON files, 1 decodes them in threads
+    :param maximum_reads: The number of JSON files read at the same time
+    :param statistics: If given, the files are counted in it
+    :param author_table: The message authors are added to it, and the records refer to them by index
+    :param message_filter: If given, only the messages that match it are yielded
+    :param json_backend: The backend that decodes the JSON files
+    :param details: If False, then (author index, content, message id) tuples are yielded instead of records
+    :return: An iterator over message records
+    """
+    # The decoded JSON files waiting for this thread, then None once they are all done
+    decoded_json_files = queue.Queue(maxsize=maximum_reads)
+    is_stopped = threading.Event()
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+
+    async def _produce() -> None:
+        decoded_json_file_iterator = _aiterate_decoded_json_files(json_files_list, read_size, maximum_reads,
+                                                                  executor, message_filter, json_backend, details)
+        loop = asyncio.get_running_loop()
+        try:
+            async for decoded_json_file in decoded_json_file_iterator:
+                # Waits in a thread while the queue is full, so the loop keeps running the reads in flight
+                await loop.run_in_executor(None, decoded_json_files.put, decoded_json_file)
+                if is_stopped.is_set():
+                    break
+        finally:
+            await decoded_json_file_iterator.aclose()
+
+    def _run() -> None:
+        try:
+            asyncio.run(_produce())
+        except BaseException as error:
+            decoded_json_files.put(error)
+        finally:
+            decoded_json_files.put(None)
+
+    reader_thread = threading.Thread(target=_run, daemon=True)
+    reader_thread.start()
+    try:
+        for decoded_json_file in iter(decoded_json_files.get, None):
+            if isinstance(decoded_json_file, BaseException):
+                raise decoded_json_file
+            json_file, file_author_table, records = decoded_json_file
+            if verbose:
+                print("Loaded JSON file: " + json_file)
+            if statistics is not None:
+                statistics.record_file(os.path.getsize(json_file))
+            # The author table is only ever changed in this thread, the converter reads it here too
+            yield from _iterate_remapped_records(records, author_table.merge(file_author_table),
+                                                 author_table.author_ids, details)
+    finally:
+        is_stopped.set()
+        # Keep taking the decoded files, so that the reader thread never blocks on a full queue
+        while reader_thread.is_alive():
+            try:
+                decoded_json_files.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def iterate_data_from_discord_chat_exports_json_files(json_files_list: list, verbose: bool = False,
+                                                      streaming: bool = False, read_size: int = DEFAULT_READ_SIZE,
+                                                      workers: int = 1, chunksize: int = 1,
+                                                      statistics: PipelineStatistics = None,
+                                                      message_id_index: MessageIdIndex = None,
+                                                      author_table: AuthorTable = None,
+                                                      message_filter: MessageFilter = None,
+                                                      asynchronous: bool = False,
+                                                      maximum_reads: int = DEFAULT_MAXIMUM_READS,
+                                                      json_backend: str = DEFAULT_JSON_BACKEND,
+                                                      split_size: int = None,
+                                                      details: bool = True) -> Iterator[tuple]:
+    """
+    This function yields the raw data from the JSON files one message at a time
+    :param json_files_list: A list of JSON file paths
+    :param verbose: If True, then show progress
+    :param streaming: If True, then the messages are parsed one at a time instead of loading whole files
+    :param read_size: The number of characters read at a time when streaming
+    :param workers: The number of worker processes, 1 parses in this process and 0 uses one per CPU
+    :param chunksize: The number of JSON files handed to a worker at a time
+    :param statistics: If given, the files and messages are counted in it as they stream through
+    :param message_id_index: If given, the messages whose id is already in it are dropped as duplicates
+    :param author_table: The message authors are added to it, and the records refer to them by index,
+                         pass the same one to the converter
+    :param message_filter: If given, only the messages that match it are yielded,
+                           the JSON files whose header cannot match are skipped without reading their messages
+    :param asynchronous: If True, then the JSON files are read by an event loop with several reads in flight,
+                         and decoded in threads, or in the worker processes if there are more than 1,
+                         while the records are consumed, whole files are read so streaming does not apply
+    :param maximum_reads: The number of JSON files read at the same time in asynchronous mode
+    :param json_backend: The backend that decodes whole JSON files, "auto" picks the fastest one that is installed
+    :param split_size: If given and there are more than 1 worker processes, then the JSON files at least
+                       this many bytes big are split into byte ranges of messages of about this size,
+                       which are parsed by several workers, not asynchronously
+    :param details: If False, then (author index, content, message id) tuples are yielded instead of records,
+                    for the steps that do not need the channels, the timestamps or the replies
+    :return: An iterator over message records
+    """
+    # Fail before the first JSON file if the backend is not installed
+    json_backend = get_json_backend_name(json_backend)
+    if author_table is None:
+        author_table = AuthorTable()
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if asynchronous:
+        records = _iterate_data_from_json_files_asynchronously(
+            json_files_list, verbose, read_size, workers, maximum_reads, statistics, author_table, message_filter,
+            json_backend, details)
+    elif workers > 1:
+        records = _iterate_data_from_json_files_in_parallel(
+            json_files_list, verbose, streaming, read_size, workers, max(chunksize, 1), statistics, author_table,
+            message_filter, json_backend, split_size, details)
+    else:
+        records = _iterate_data_from_json_files_serially(json_files_list, verbose, streaming, read_size, statistics,
+                                                         author_table, message_filter, json_backend, details)
+    if statistics is None and message_id_index is None:
+        yield from records
+        return
+    for record in records:
+        if _is_new_record(record, statistics, message_id_index, author_table):
+            yield record
+
+
+def get_data_from_discord_chat_exports_json_files(json_files_list: list, verbose: bool, streaming: bool = False,
+                                                  read_size: int = DEFAULT_READ_SIZE, workers: int = 1,
+                                                  chunksize: int = 1, statistics: PipelineStatistics = None,
+                                                  message_id_index: MessageIdIndex = None,
+                                                  author_table: AuthorTable = None,
+                                                  message_filter: MessageFilter = None, asynchronous: bool = False,
+                                                  maximum_reads: int = DEFAULT_MAXIMUM_READS,
+                                                  json_backend: str = DEFAULT_JSON_BACKEND,
+                                                  split_size: int = None,
+                                                  details: bool = True) -> MessageColumns:
     """
     This function gets the raw data from the JSON files
     :param json_files_list: A list of JSON file paths
     :param verbose: If True, then show progress
-    :return: A list of JSON data
+    :param streaming: If True, then the messages are parsed one at a time instead of loading whole files
+    :param read_size: The number of characters read at a time when streaming
+    :param workers: The number of worker processes, 1 parses in this process and 0 uses one per CPU
+    :param chunksize: The number of JSON files handed to a worker at a time
+    :param statistics: If given, the files and messages are counted in it, otherwise a new one is used for the report
+    :param message_id_index: If given, the messages whose id is already in it are dropped as duplicates
+    :param author_table: The message authors are added to it, and the records refer to them by index,
+                         pass the same one to the converter
+    :param message_filter: If given, only the messages that match it are loaded
+    :param asynchronous: If True, then the JSON files are read by an event loop with several reads in flight
+    :param maximum_reads: The number of JSON files read at the same time in asynchronous mode
+    :param json_backend: The backend that decodes whole JSON files, "auto" picks the fastest one that is installed
+    :param split_size: If given and there are more than 1 worker processes, then the JSON files at least
+                       this many bytes big are split into byte ranges of messages parsed by several workers
+    :param details: If False, then (author index, content, message id) tuples are loaded instead of records
+    :return: The message records, in columns
     """
-    # Start the timer
-    start_time = time.time()
-    # Create an empty list to store the data
-    raw_data_list = []
     # Get the total number of JSON files
     total_number_of_json_files = len(json_files_list)
+    # Count the messages per author while loading, for the report
+    if statistics is None and verbose:
+        statistics = PipelineStatistics()
     # Print the message
     if verbose:
         print("----------------------------------------")
         print("Getting the data from the JSON files...")
-    # Loop through the list of JSON files
-    for json_file in json_files_list:
-        if verbose:
-            print("Loading JSON file: " + json_file)
-        # Open the JSON file
-        with open(json_file, "r", encoding="utf-8") as f:
-            # Load the JSON file
-            data = json.load(f)
-            # Get the messages from the JSON file
-            messages = data["messages"]
-            # Loop through the messages
-            for message in messages:
-                # Get the message author name
-                message_author_name = message["author"]["name"]
-                # Get the message author discriminator
-                message_author_discriminator = message["author"]["discriminator"]
-                # Combine the message author name and discriminator
-                message_author = message_author_name + "___" + message_author_discriminator
-                # Get the message content
-                message_content = message["content"]
-                # Append the message author name and message content to the data list
-                raw_data_list.append([message_author, message_content])
-    # Stop the timer
-    end_time = time.time()
-    # Calculate the total time taken
-    total_time_taken = end_time - start_time
+        if not streaming or asynchronous:
+            print("JSON backend: " + get_json_backend_name(json_backend))
+    # Collect the message author name and message content of every message
+    with StageTimer("loading", statistics) as stage_timer:
+        raw_data_list = MessageColumns(details)
+        raw_data_list.extend(iterate_data_from_discord_chat_exports_json_files(
+            json_files_list, verbose, streaming, read_size, workers, chunksize, statistics, message_id_index,
+            author_table, message_filter, asynchronous, maximum_reads, json_backend, split_size, details))
     # Print the message
     if verbose:
         print("----------------------------------------")
         print("Total data loaded: " + str(len(raw_data_list)))
-        print("Total time taken to load the data: {} seconds".format(total_time_taken))
-        print("Average time taken to load a JSON file: {} seconds".format(
-            round((total_time_taken / total_number_of_json_files), 2)))
-        print("----------------------------------------")
-        # print the number of authors
-        print("Number of authors: " +
-              str(len(set([data[0] for data in raw_data_list]))))
-        # print the number of messages
-        print("Number of messages: " + str(len(raw_data_list)))
-        # Find all the authors
-        authors_list = set([data[0] for data in raw_data_list])
-        authors_list = [*authors_list]
-        authors_list.sort()
-        # print the authors
-        print("Authors: " + str(authors_list))
-        print("----------------------------------------")
-        # print the number of messages per author
-        for author in authors_list:
-            print("Number of messages from " + author + ": " + str(len(
-                [data[1] for data in raw_data_list if data[0] == author])))
+        print("Total time taken to load the data: {} seconds".format(stage_timer.seconds))
+        print("Average time taken to load a JSON file: " +
+              format_average(stage_timer.seconds, total_number_of_json_files))
         print("----------------------------------------")
-        print("Average number of messages per author: " + str(len(
-            raw_data_list) / len(set([data[0] for data in raw_data_list]))))
+        statistics.print_loading_report()
     # Return the data list
     return raw_data_list
 
 
-def main(json_files_list: list, verbose: bool) -> None:
+def main(json_files_list: list, verbose: bool, streaming: bool = False) -> None:
     # Generate the docstring
     """
     This function gets the raw data from the JSON files
     :param json_files_list: A list of JSON file paths
     :param verbose: If True, then show progress
+    :param streaming: If True, then the messages are parsed one at a time
     :returns: None
     """
 
     data = get_data_from_discord_chat_exports_json_files(
-        json_files_list, verbose)
-    print(data)
+        json_files_list, verbose, streaming)
+    print(list(data))
 
 
 if __name__ == '__main__':
@@ -166,11 +774,14 @@ if __name__ == '__main__':
     number_of_args = len(args)
     json_files_path_list = []
     is_verbose = False
+    is_streaming = False
 
     for i in range(1, number_of_args):
         arg = args[i]
         if arg == "-v" or arg == "--verbose":
             is_verbose = True
+        elif arg == "-s" or arg == "--streaming":
+            is_streaming = True
         elif arg == "-i" or arg == "--input":
             json_file_path = args[i + 1]
             if os.path.isfile(json_file_path):
@@ -192,4 +803,4 @@ if __name__ == '__main__':
         print("ERROR: No JSON file paths were given")
         sys.exit(1)
 
-    main(json_files_path_list, is_verbose)
+    main(json_files_path_list, is_verbose, is_streaming)
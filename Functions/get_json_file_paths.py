@@ -16,52 +16,169 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 #  Description:
-#  Gets the paths of all JSON files in a directory.
+#  Gets the paths of all JSON files in one or more directories.
+#  The directories are walked with os.scandir, optionally recursively for export trees laid out
+#  as guild/channel/date folders, and the paths are yielded while the walk goes on,
+#  so the JSON files can already be parsed before the walk is over.
 
-import glob
+import fnmatch
 import os
 import sys
-import time
+from typing import Iterable, Iterator, Union
 
+from Functions.pipeline_instrumentation import StageTimer, format_average
+from Functions.pipeline_statistics import PipelineStatistics
 
-def get_json_file_paths(from_folder_full_path: str, is_verbose: bool) -> list:
+# The ways the JSON file paths can be sorted
+SORT_BY = ("name", "size")
+DEFAULT_INCLUDE_PATTERNS = ("*.json",)
+
+
+def _matches_any(relative_path: str, name: str, patterns: Iterable) -> bool:
+    """
+    This function checks if a path matches any of the patterns
+    :param relative_path: The path relative to the input folder, with "/" separators
+    :param name: The file or folder name
+    :param patterns: The fnmatch patterns, matched against the name and against the relative path
+    :return: True if any of the patterns matches
+    """
+    for pattern in patterns:
+        if fnmatch.fnmatchcase(name, pattern) or fnmatch.fnmatchcase(relative_path, pattern):
+            return True
+    return False
+
+
+def _walk_json_file_entries(input_folder_path: str, include_patterns: Iterable, exclude_patterns: Iterable,
+                            recursive: bool) -> Iterator[os.DirEntry]:
+    """
+    This function walks an input folder and yields the entries of the matching files
+    :param input_folder_path: The input folder path
+    :param include_patterns: The patterns of the files to yield
+    :param exclude_patterns: The patterns of the files and folders to skip
+    :param recursive: If True, then the sub folders are walked as well
+    :return: An iterator over the directory entries, in the order the folders list them
+    """
+    # A stack of (folder path, folder path relative to the input folder) instead of recursion,
+    # so that deep trees cannot hit the recursion limit
+    folders = [(input_folder_path, "")]
+    # The (device, inode) of every folder walked, so that a symbolic link back to a parent folder
+    # does not make the walk go round forever, the folders linked to are still walked once
+    input_folder_stat = os.stat(input_folder_path)
+    walked_folders = {(input_folder_stat.st_dev, input_folder_stat.st_ino)}
+    while len(folders) > 0:
+        folder_path, relative_folder_path = folders.pop()
+        sub_folders = []
+        with os.scandir(folder_path) as entries:
+            for entry in entries:
+                # Skip the hidden files and folders, like a glob of *.json does
+                if entry.name.startswith("."):
+                    continue
+                relative_path = relative_folder_path + entry.name
+                if _matches_any(relative_path, entry.name, exclude_patterns):
+                    continue
+                if entry.is_dir():
+                    if recursive:
+                        # DirEntry.stat() has no inode on Windows
+                        folder_stat = os.stat(entry.path)
+                        folder_key = (folder_stat.st_dev, folder_stat.st_ino)
+                        if folder_key not in walked_folders:
+                            walked_folders.add(folder_key)
+                            sub_folders.append((entry.path, relative_path + "/"))
+                elif _matches_any(relative_path, entry.name, include_patterns):
+                    yield entry
+        # Walk the sub folders in the order they were listed
+        folders.extend(reversed(sub_folders))
+
+
+def iterate_json_file_paths(input_paths: Union[str, Iterable], recursive: bool = False,
+                            include_patterns: Iterable = DEFAULT_INCLUDE_PATTERNS, exclude_patterns: Iterable = (),
+                            sort_by: str = None) -> Iterator[str]:
+    """
+    This function yields the paths to the JSON files in the input folders
+    :param input_paths: An input folder path, or a list of them, JSON file paths are passed through as they are
+    :param recursive: If True, then the sub folders are searched as well
+    :param include_patterns: The fnmatch patterns of the files to take, matched against the file name
+                             and against the path relative to the input folder
+    :param exclude_patterns: The fnmatch patterns of the files and folders to skip
+    :param sort_by: None to yield the paths while walking, in the order the folders list them,
+                    "name" to sort them by path, or "size" to sort them largest first,
+                    so that the big files do not end up last on a single worker
+    :return: An iterator over JSON file paths
+    """
+    if sort_by is not None and sort_by not in SORT_BY:
+        raise ValueError("Unknown sort key: " + sort_by + ", expected one of " + ", ".join(SORT_BY))
+    if isinstance(input_paths, str):
+        input_paths = [input_paths]
+    else:
+        input_paths = list(input_paths)
+
+    def _iterate_entries() -> Iterator:
+        # Overlapping input folders would yield the same JSON files twice
+        seen_paths = set() if len(input_paths) > 1 else None
+        for input_path in input_paths:
+            if os.path.isfile(input_path):
+                entries = (input_path,)
+            else:
+                entries = _walk_json_file_entries(input_path, include_patterns, exclude_patterns, recursive)
+            for entry in entries:
+                if seen_paths is not None:
+                    absolute_path = os.path.abspath(entry if isinstance(entry, str) else entry.path)
+                    if absolute_path in seen_paths:
+                        continue
+                    seen_paths.add(absolute_path)
+                yield entry
+
+    number_of_json_files = 0
+    if sort_by is None:
+        for entry in _iterate_entries():
+            number_of_json_files += 1
+            yield entry if isinstance(entry, str) else entry.path
+    else:
+        # Sorting needs the whole walk, sorted() is stable so equal sizes keep the walk order
+        if sort_by == "name":
+            json_file_paths = sorted(entry if isinstance(entry, str) else entry.path for entry in _iterate_entries())
+        else:
+            json_file_paths = [path for _, path in sorted(
+                ((os.path.getsize(entry) if isinstance(entry, str) else entry.stat().st_size,
+                  entry if isinstance(entry, str) else entry.path) for entry in _iterate_entries()),
+                key=lambda size_and_path: size_and_path[0], reverse=True)]
+        number_of_json_files = len(json_file_paths)
+        yield from json_file_paths
+    if number_of_json_files == 0:
+        raise FileNotFoundError("No JSON files found in " + ", ".join(input_paths))
+
+
+def get_json_file_paths(from_folder_full_path: Union[str, Iterable], is_verbose: bool, recursive: bool = False,
+                        include_patterns: Iterable = DEFAULT_INCLUDE_PATTERNS, exclude_patterns: Iterable = (),
+                        sort_by: str = None, statistics: PipelineStatistics = None) -> list:
     """
     This function gets the full paths to all the JSON files in the folder
-    :param from_folder_full_path: The full path to the folder with the JSON files
+    :param from_folder_full_path: The full path to the folder with the JSON files, or a list of them
     :param is_verbose: If True, then show progress
+    :param recursive: If True, then the sub folders are searched as well
+    :param include_patterns: The fnmatch patterns of the files to take
+    :param exclude_patterns: The fnmatch patterns of the files and folders to skip
+    :param sort_by: None to keep the order the folders list the files in, "name" or "size"
+    :param statistics: If given, the time taken is added to it
     :return: A list of JSON file paths
     """
-    # Start the timer
-    start_time = time.time()
-    # Get the path to the folder with the JSON files
-    path_to_json_files = from_folder_full_path
-    # Get the list of JSON files
-    json_files_list = glob.glob(path_to_json_files + "/*.json")
+    # Get the list of JSON files, raises FileNotFoundError if there are none
+    with StageTimer("discovery", statistics) as stage_timer:
+        json_files_list = list(iterate_json_file_paths(from_folder_full_path, recursive, include_patterns,
+                                                       exclude_patterns, sort_by))
     if is_verbose:
-        print("Loading JSON files from " + from_folder_full_path)
+        print("Loading JSON files from " + str(from_folder_full_path))
         print("Total JSON files found: " + str(len(json_files_list)))
         print("JSON files: " + str(json_files_list))
     # Get the total number of JSON files
     total_number_of_json_files = len(json_files_list)
-    if total_number_of_json_files == 0:
-        print("No JSON files found in " + from_folder_full_path)
-        exit()
-    # Print the message
-    if is_verbose:
-        print("----------------------------------------")
-        print("Loading the JSON files...")
-    # Stop the timer
-    end_time = time.time()
-    # Calculate the total time taken
-    total_time_taken = end_time - start_time
     # Print the message
     if is_verbose:
         print("----------------------------------------")
-        print("Total JSON files loaded: " + str(total_number_of_json_files))
-        print("Total time taken to load the JSON files: {} seconds".format(
-            total_time_taken))
-        print("Average time taken to load a JSON file: {} seconds".format(round(
-            (total_time_taken / total_number_of_json_files), 2)))
+        print("Total time taken to find the JSON files: {} seconds".format(
+            stage_timer.seconds))
+        print("Average time taken to find a JSON file: " +
+              format_average(stage_timer.seconds, total_number_of_json_files))
     # Return the list of JSON files
     return json_files_list
 
@@ -0,0 +1,465 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  An inverted index of the text output file, from the terms and the authors of the lines to their byte offsets,
+#  built while the output file is written, so that the lines of an author containing a term are found
+#  by seeking straight to them instead of reading the whole output file.
+#  The terms are the lowercased words of the line content, without the author prefix. The author of a line
+#  is indexed under "@MessageAuthorName___MessageAuthorDiscriminator", which no term can start with.
+#  The index is written next to the output file, e.g. output.index.bin for output.txt:
+#  - the magic, the size of the output file it was built for, the number of keys,
+#    the offset of the keys and the offset of the entries
+#  - the posting lists, the byte offsets of the lines of every key in ascending order,
+#    stored as the differences between them, every one a little endian unsigned int of the same width,
+#    the fewest bytes (1, 2, 4 or 8) that hold the biggest difference of the key
+#  - the keys, UTF-8 encoded one after another, sorted by their bytes
+#  - an entry of fixed size per key, in the order of the keys, with where its key is from the start of the keys,
+#    its number of postings, the offset of its first line, where its differences are and their width
+#  A query only maps the index, binary searches the entries of its keys and decodes their postings
+#  with array and itertools.accumulate, so it takes milliseconds whatever the size of the output file.
+#  The posting lists take a couple of bytes per term of a line. Once they take up the memory budget,
+#  they are sorted by key and spilled to a run file, and the runs are merged key by key into the index
+#  at the end, the same way as the runs of order_message_records. The keys and their entries stay in memory.
+
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+from array import array
+from itertools import accumulate, groupby
+from operator import itemgetter
+from typing import Iterable, Iterator
+
+from Functions.author_table import AuthorTable
+from Functions.open_atomic_output_file import DEFAULT_BUFFER_SIZE, open_atomic_output_file
+from Functions.order_message_records import DEFAULT_MEMORY_BUDGET, iterate_merged_runs, iterate_run, write_run
+
+# The terms longer than this are not indexed, they are hardly ever searched for
+MAXIMUM_TERM_LENGTH = 64
+
+# The start of every index file
+_MAGIC = b"DMINDEX2"
+# The size of the output file, the number of keys, the offset of the keys and the offset of the entries
+_HEADER = struct.Struct("<QQQQ")
+# The offset of the key from the start of the keys and its length, the number of postings,
+# the offset of the first line, the offset of the differences and their width in bytes
+_ENTRY = struct.Struct("<QIIQQB")
+# The array typecode of the unsigned ints of every width, the widest typecodes first so the narrowest win
+_TYPECODES = {array(typecode).itemsize: typecode for typecode in "QLIHB"}
+_WIDTHS = (1, 2, 4, 8)
+# About the memory of a new key and of a posting, for the memory budget
+_KEY_SIZE = 256
+_POSTING_SIZE = 2
+# The authors are keys too, and the terms are made of word characters only
+_AUTHOR_KEY_PREFIX = "@"
+_TERM_PATTERN = re.compile(r"\w+")
+# The output file is written in text mode, which writes os.linesep for every line break
+_EXTRA_LINE_BREAK_SIZE = len(os.linesep.encode("utf-8")) - 1
+
+
+def get_index_path(output_path: str) -> str:
+    """
+    This function gets the path of the index of an output file, e.g. output.index.bin for output.txt
+    :param output_path: The output file path
+    :return: The index file path
+    """
+    # Only the last extension is replaced, so that output.v1.txt and output.v2.txt do not share a file
+    return os.path.splitext(output_path)[0] + ".index.bin"
+
+
+def get_terms(text: str) -> set:
+    """
+    This function gets the terms of a text, the same way for the lines and the queries
+    :param text: The text
+    :return: The set of lowercased words
+    """
+    terms = set(_TERM_PATTERN.findall(text.lower()))
+    # Most lines are too short to hold a term that is too long
+    if len(text) > MAXIMUM_TERM_LENGTH:
+        terms = {term for term in terms if len(term) <= MAXIMUM_TERM_LENGTH}
+    return terms
+
+
+def _get_width(difference: int) -> int:
+    """
+    This function gets the number of bytes an unsigned int needs
+    :param difference: The difference between two offsets
+    :return: 1, 2, 4 or 8
+    """
+    for width in _WIDTHS:
+        if difference < 1 << (8 * width):
+            return width
+    raise OverflowError("The difference does not fit in 8 bytes: " + str(difference))
+
+
+def _widen(differences: array, width: int) -> array:
+    """
+    This function copies the differences of a posting list to wider ints
+    :param differences: The differences
+    :param width: The new width in bytes, at least the one of the differences
+    :return: The differences, in an array of the new width
+    """
+    if width == differences.itemsize:
+        return differences
+    return array(_TYPECODES[width], differences)
+
+
+def _iterate_combined_postings(sorted_postings: Iterable) -> Iterator[tuple]:
+    """
+    This function joins the parts of the posting lists of the same key, which come one after another in line order
+    :param sorted_postings: An iterable of (encoded key, offset of the first line, offset of the last line,
+                            width, encoded differences) tuples, sorted by key
+    :return: An iterator over (encoded key, offset of the first line, differences) tuples, one per key
+    """
+    for encoded_key, parts in groupby(sorted_postings, itemgetter(0)):
+        _, first_offset, last_offset, width, encoded_differences = next(parts)
+        differences = array(_TYPECODES[width], encoded_differences)
+        for _, part_first_offset, part_last_offset, part_width, part_encoded_differences in parts:
+            gap = part_first_offset - last_offset
+            differences = _widen(differences, max(differences.itemsize, part_width, _get_width(gap)))
+            differences.append(gap)
+            differences.extend(_widen(array(_TYPECODES[part_width], part_encoded_differences),
+                                      differences.itemsize))
+            last_offset = part_last_offset
+        yield encoded_key, first_offset, differences
+
+
+def get_author_key(label: str) -> str:
+    """
+    This function gets the key an author is indexed under
+    :param label: MessageAuthorName___MessageAuthorDiscriminator
+    :return: The key
+    """
+    return _AUTHOR_KEY_PREFIX + label
+
+
+class InvertedIndexBuilder:
+    """
+    Collects the posting lists of the lines while they are written, and writes them to an index file at the end
+    """
+
+    def __init__(self, author_table: AuthorTable, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 spill_folder_path: str = None):
+        """
+        :param author_table: The author table the records of the lines refer to
+        :param memory_budget: The number of bytes of posting lists collected in memory before they are spilled
+        :param spill_folder_path: The folder the temporary folder of the spilled posting lists is created in,
+                                  the default temporary folder if None
+        """
+        if memory_budget < 1:
+            raise ValueError("The memory budget must be at least 1 byte")
+        self.author_table = author_table
+        self.memory_budget = memory_budget
+        self.spill_folder_path = spill_folder_path
+        # The size of the output file so far, which is the offset of the next line
+        self.size = 0
+        self.number_of_lines = 0
+        # [offset of the first line, offset of the last line, differences between the offsets] by key
+        self._postings = {}
+        self._postings_size = 0
+        # The temporary folder of the runs, only created once the posting lists are spilled
+        self._run_folder = None
+        self._run_paths = []
+        # The author key and the length of the author prefix of the lines, by author index
+        self._authors = []
+
+    def add(self, author_index: int, line: str) -> None:
+        """
+        This function indexes the next line of the output file
+        :param author_index: The index of the author of the line
+        :param line: The converted line, as it is handed to the writer, which adds a line break after it
+        :return: None
+        """
+        offset = self.size
+        encoded_size = len(line.encode("utf-8")) + 1
+        if _EXTRA_LINE_BREAK_SIZE:
+            encoded_size += (line.count("\n") + 1) * _EXTRA_LINE_BREAK_SIZE
+        self.size += encoded_size
+        self.number_of_lines += 1
+        authors = self._authors
+        while author_index >= len(authors):
+            label = self.author_table.get_label(len(authors))
+            authors.append((get_author_key(label), len(label) + 2))
+        author_key, prefix_length = authors[author_index]
+        keys = get_terms(line[prefix_length:])
+        keys.add(author_key)
+        postings = self._postings
+        postings_size = self._postings_size + len(keys) * _POSTING_SIZE
+        for key in keys:
+            posting_list = postings.get(key)
+            if posting_list is None:
+                postings[key] = [offset, offset, array("B")]
+                postings_size += _KEY_SIZE + len(key)
+                continue
+            difference = offset - posting_list[1]
+            posting_list[1] = offset
+            try:
+                posting_list[2].append(difference)
+            except OverflowError:
+                # The differences are kept in the fewest bytes that hold the biggest of them
+                posting_list[2] = _widen(posting_list[2], _get_width(difference))
+                posting_list[2].append(difference)
+        self._postings_size = postings_size
+        if postings_size >= self.memory_budget:
+            self._spill()
+
+    def _iterate_sorted_postings(self) -> Iterator[tuple]:
+        """
+        This function empties the posting lists in memory, in the order of the keys
+        :return: An iterator over (encoded key, offset of the first line, offset of the last line, width,
+                 encoded differences) tuples
+        """
+        postings = self._postings
+        self._postings = {}
+        self._postings_size = 0
+        for encoded_key, key in sorted((key.encode("utf-8"), key) for key in postings):
+            first_offset, last_offset, differences = postings.pop(key)
+            yield encoded_key, first_offset, last_offset, differences.itemsize, differences.tobytes()
+
+    def _spill(self) -> None:
+        """
+        This function writes the posting lists in memory to a run file, sorted by key
+        :return: None
+        """
+        if self._run_folder is None:
+            if self.spill_folder_path is not None:
+                os.makedirs(self.spill_folder_path, exist_ok=True)
+            self._run_folder = tempfile.TemporaryDirectory(prefix="index-", dir=self.spill_folder_path)
+        run_path = os.path.join(self._run_folder.name, str(len(self._run_paths)) + ".run")
+        write_run(self._iterate_sorted_postings(), run_path)
+        self._run_paths.append(run_path)
+
+    def close(self) -> None:
+        """
+        This function removes the spilled posting lists, once the index was written or when it is not wanted
+        :return: None
+        """
+        if self._run_folder is not None:
+            self._run_folder.cleanup()
+            self._run_folder = None
+        self._run_paths = []
+        self._postings = {}
+        self._postings_size = 0
+
+    def write(self, index_path: str, buffer_size: int = DEFAULT_BUFFER_SIZE) -> int:
+        """
+        This function writes the index file, once every line of the output file was added
+        :param index_path: The index file path
+        :param buffer_size: The size of the write buffer in bytes
+        :return: The number of keys
+        """
+        sorted_postings = self._iterate_sorted_postings()
+        if len(self._run_paths) > 0:
+            # The runs are in line order, and the posting lists of the same key come out in the order of the runs
+            sorted_postings = iterate_merged_runs(
+                [iterate_run(run_path, True) for run_path in self._run_paths] + [sorted_postings], itemgetter(0),
+                self._run_folder.name)
+        encoded_keys = bytearray()
+        entries = bytearray()
+        try:
+            with open_atomic_output_file(index_path, "none", buffer_size, text=False) as f:
+                f.write(_MAGIC)
+                # The header is written again once the offsets of the keys and of the entries are known
+                f.write(_HEADER.pack(0, 0, 0, 0))
+                postings_offset = len(_MAGIC) + _HEADER.size
+                for encoded_key, first_offset, differences in _iterate_combined_postings(sorted_postings):
+                    if sys.byteorder == "big":
+                        differences.byteswap()
+                    f.write(differences)
+                    entries += _ENTRY.pack(len(encoded_keys), len(encoded_key), len(differences) + 1, first_offset,
+                                           postings_offset, differences.itemsize)
+                    encoded_keys += encoded_key
+                    postings_offset += len(differences) * differences.itemsize
+                f.write(encoded_keys)
+                f.write(entries)
+                number_of_keys = len(entries) // _ENTRY.size
+                f.seek(len(_MAGIC))
+                f.write(_HEADER.pack(self.size, number_of_keys, postings_offset, postings_offset + len(encoded_keys)))
+        finally:
+            self.close()
+        return number_of_keys
+
+
+def iterate_lines_and_build_index(records_with_lines: Iterable, builder: InvertedIndexBuilder) -> Iterator[str]:
+    """
+    This function indexes the converted lines on their way to the writer
+    :param records_with_lines: An iterable of (message record, converted line) pairs
+    :param builder: The index builder, written once the lines are written
+    :return: An iterator over the converted lines
+    """
+    add = builder.add
+    for record, line in records_with_lines:
+        add(record[0], line)
+        yield line
+
+
+class InvertedIndex:
+    """
+    An index file opened for queries, used as a context manager
+    """
+
+    def __init__(self, index_path: str):
+        """
+        :param index_path: The index file path
+        """
+        self._file = open(index_path, "rb")
+        try:
+            self._mapped_file = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError("The index file is empty: " + index_path)
+        if self._mapped_file[:len(_MAGIC)] != _MAGIC:
+            self.close()
+            raise ValueError("Not an index file: " + index_path)
+        self.output_size, self.number_of_keys, self._keys_offset, self._entries_offset = \
+            _HEADER.unpack_from(self._mapped_file, len(_MAGIC))
+
+    def close(self) -> None:
+        self._mapped_file.close()
+        self._file.close()
+
+    def __enter__(self) -> "InvertedIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _find_entry(self, key: str) -> tuple:
+        """
+        This function binary searches the entry of a key
+        :param key: The key
+        :return: The entry, or None if the key is not in the index
+        """
+        encoded_key = key.encode("utf-8")
+        mapped_file = self._mapped_file
+        low, high = 0, self.number_of_keys
+        while low < high:
+            middle = (low + high) // 2
+            entry = _ENTRY.unpack_from(mapped_file, self._entries_offset + middle * _ENTRY.size)
+            key_offset = self._keys_offset + entry[0]
+            middle_key = mapped_file[key_offset:key_offset + entry[1]]
+            if middle_key < encoded_key:
+                low = middle + 1
+            elif middle_key > encoded_key:
+                high = middle
+            else:
+                return entry
+        return None
+
+    def get_offsets(self, key: str) -> list:
+        """
+        This function gets the posting list of a key
+        :param key: A term, or an author key from get_author_key
+        :return: The byte offsets of the lines, in ascending order
+        """
+        entry = self._find_entry(key)
+        if entry is None:
+            return []
+        _, _, number_of_postings, first_offset, postings_offset, width = entry
+        differences = array(_TYPECODES[width],
+                            self._mapped_file[postings_offset:postings_offset + (number_of_postings - 1) * width])
+        if sys.byteorder == "big":
+            differences.byteswap()
+        return list(accumulate(differences, initial=first_offset))
+
+    def search(self, terms: Iterable = (), author: str = None) -> list:
+        """
+        This function finds the lines that contain every term, and are by the author if one is given
+        :param terms: The words to look for, a text with several words looks for all of them
+        :param author: If given, MessageAuthorName___MessageAuthorDiscriminator of the lines
+        :return: The byte offsets of the matching lines, in ascending order
+        """
+        keys = set()
+        for text in terms:
+            keys.update(get_terms(text))
+        if author is not None:
+            keys.add(get_author_key(author))
+        if len(keys) == 0:
+            raise ValueError("A query needs at least one term or an author")
+        # Start from the rarest key, so that the other lists only have to be checked against a few offsets
+        entries = []
+        for key in keys:
+            entry = self._find_entry(key)
+            if entry is None:
+                return []
+            entries.append((entry[2], key))
+        entries.sort()
+        offsets = self.get_offsets(entries[0][1])
+        for _, key in entries[1:]:
+            if len(offsets) == 0:
+                break
+            other_offsets = set(self.get_offsets(key))
+            offsets = [offset for offset in offsets if offset in other_offsets]
+        return offsets
+
+
+def iterate_matching_lines(output_path: str, terms: Iterable = (), author: str = None,
+                           limit: int = None) -> Iterator[str]:
+    """
+    This function reads the lines of an output file that match a query from its index
+    :param output_path: The output file path, its index is next to it
+    :param terms: The words the lines must contain
+    :param author: If given, MessageAuthorName___MessageAuthorDiscriminator of the lines
+    :param limit: If given, at most this many lines are read
+    :return: An iterator over the matching lines, without the line breaks
+    """
+    with InvertedIndex(get_index_path(output_path)) as index:
+        # An output file written again without an index has another size
+        if index.output_size != os.path.getsize(output_path):
+            raise ValueError("The index was not built for this output file, write it again with an index")
+        offsets = index.search(terms, author)
+    with open(output_path, "rb") as f:
+        for offset in offsets[:limit]:
+            f.seek(offset)
+            yield f.readline().decode("utf-8").rstrip("\r\n")
+
+
+def main(output_path: str, terms: list, author: str = None, limit: int = None) -> None:
+    """
+    This function prints the lines of an output file that match a query
+    :param output_path: The output file path
+    :param terms: The words the lines must contain
+    :param author: If given, MessageAuthorName___MessageAuthorDiscriminator of the lines
+    :param limit: If given, at most this many lines are printed
+    :return: None
+    """
+    for line in iterate_matching_lines(output_path, terms, author, limit):
+        print(line)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    query_author = None
+    query_limit = None
+
+    if "--author" in args:
+        index = args.index("--author")
+        query_author = args[index + 1]
+        del args[index:index + 2]
+    if "--limit" in args:
+        index = args.index("--limit")
+        query_limit = int(args[index + 1])
+        del args[index:index + 2]
+    if len(args) < 1 or (len(args) < 2 and query_author is None):
+        print("Usage: " + sys.argv[0] + " <output_file_path> [--author <author_label>] [--limit <number>] "
+              "[<term> ...]")
+        sys.exit(1)
+
+    main(args[0], args[1:], query_author, query_limit)
@@ -0,0 +1,295 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Converts the JSON files incrementally.
+#  The converted lines of every JSON file are cached in a folder next to a manifest
+#  that records the path, size, modification time and content hash of every JSON file.
+#  On the next run, the JSON files that did not change are served from the cache
+#  and only the new or modified JSON files are parsed and converted again.
+#  Format of the manifest:
+#  {
+#    "version": ManifestVersion,
+#    "filter": MessageFilterConditions,
+#    "normalizations": [Normalization],
+#    "files": {
+#      "AbsoluteJsonFilePath": {
+#        "size": JsonFileSize,
+#        "mtime_ns": JsonFileModificationTime,
+#        "sha256": JsonFileContentHash,
+#        "cache_file": CacheFileName,
+#        "counts": MessageAndLineCounters
+#      }
+#    }
+#  }
+
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Iterator
+
+from Functions.author_table import AuthorTable
+from Functions.convert_data_to_required_format import iterate_converted_data_in_required_format
+from Functions.get_data_from_discord_chat_exports_json_files import iterate_data_from_discord_chat_exports_json_files
+from Functions.json_backends import DEFAULT_JSON_BACKEND
+from Functions.message_filter import MessageFilter
+from Functions.normalize_message_content import ContentNormalizer
+from Functions.pipeline_statistics import PipelineStatistics
+from Functions.stream_messages_from_discord_chat_export_json_file import DEFAULT_READ_SIZE
+
+MANIFEST_FILE_NAME = "manifest.json"
+# Bump this whenever the format of the converted lines changes, so that old caches are thrown away
+MANIFEST_VERSION = 3
+
+# The number of bytes hashed at a time
+_HASH_READ_SIZE = 1024 * 1024
+
+
+def _hash_file(file_path: str) -> str:
+    """
+    This function hashes the content of a file
+    :param file_path: The file path
+    :return: The SHA-256 hex digest of the file content
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_READ_SIZE), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def _load_manifest(cache_folder_path: str, filter_conditions: dict, normalizations: list) -> dict:
+    """
+    This function loads the manifest from the cache folder
+    :param cache_folder_path: The cache folder path
+    :param filter_conditions: The conditions of the message filter of this run, or None
+    :param normalizations: The rewrites of the message contents of this run, or None
+    :return: The manifest, or an empty manifest if there is no usable one
+    """
+    manifest_path = os.path.join(cache_folder_path, MANIFEST_FILE_NAME)
+    empty_manifest = {"version": MANIFEST_VERSION, "filter": filter_conditions, "normalizations": normalizations,
+                      "files": {}}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return empty_manifest
+    # The cached lines only hold the messages the filter of their run let through, rewritten like in their run
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("filter") != filter_conditions or \
+            manifest.get("normalizations") != normalizations:
+        return empty_manifest
+    return manifest
+
+
+def _save_manifest(cache_folder_path: str, manifest: dict) -> None:
+    """
+    This function saves the manifest to the cache folder, replacing the old one at once
+    :param cache_folder_path: The cache folder path
+    :param manifest: The manifest
+    :return: None
+    """
+    manifest_path = os.path.join(cache_folder_path, MANIFEST_FILE_NAME)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def _is_entry_unchanged(entry: dict, json_file: str, stat: os.stat_result, cache_file_path: str) -> bool:
+    """
+    This function checks if a JSON file still matches its manifest entry
+    :param entry: The manifest entry, or None
+    :param json_file: The JSON file path
+    :param stat: The result of os.stat on the JSON file
+    :param cache_file_path: The path to the cached converted lines
+    :return: True if the cached converted lines can be used
+    """
+    if entry is None or entry["size"] != stat.st_size or not os.path.isfile(cache_file_path):
+        return False
+    if entry["mtime_ns"] == stat.st_mtime_ns:
+        return True
+    # The file was touched, so only the content hash can tell if it really changed
+    return entry["sha256"] == _hash_file(json_file)
+
+
+def _iterate_cached_lines(cache_file_path: str) -> Iterator[str]:
+    """
+    This function reads the cached converted lines of a JSON file
+    :param cache_file_path: The path to the cached converted lines
+    :return: An iterator over the converted data
+    """
+    # Only split on "\n", the message content may contain other line breaks
+    with open(cache_file_path, "r", encoding="utf-8", newline="\n") as f:
+        yield from f
+
+
+def _iterate_and_cache_converted_lines(json_file: str, cache_file_path: str, streaming: bool, read_size: int,
+                                       statistics: PipelineStatistics, author_table: AuthorTable,
+                                       message_filter: MessageFilter, json_backend: str,
+                                       normalizer: ContentNormalizer) -> Iterator[str]:
+    """
+    This function converts a JSON file and caches the converted lines while yielding them
+    :param json_file: The JSON file path
+    :param cache_file_path: The path to the cached converted lines
+    :param streaming: If True, then the messages are parsed one at a time
+    :param read_size: The number of characters read at a time when streaming
+    :param statistics: If given, the file, messages and lines are counted in it once the file is converted
+    :param author_table: The author table of the run
+    :param message_filter: If given, only the messages that match it are converted
+    :param json_backend: The backend that decodes whole JSON files
+    :param normalizer: If given, the message contents are normalized
+    :return: An iterator over the converted data, which returns the counters of the messages and lines of the file
+    """
+    # The counters of the file alone, kept in the manifest for the runs that serve the file from the cache
+    file_statistics = PipelineStatistics()
+    # The cache file is only renamed into place once the whole JSON file was converted
+    with open(cache_file_path + ".tmp", "w", encoding="utf-8", newline="\n") as f:
+        for converted_data in iterate_converted_data_in_required_format(
+                iterate_data_from_discord_chat_exports_json_files([json_file], streaming=streaming,
+                                                                  read_size=read_size, statistics=file_statistics,
+                                                                  author_table=author_table,
+                                                                  message_filter=message_filter,
+                                                                  json_backend=json_backend),
+                author_table, file_statistics, normalizer):
+            f.write(converted_data)
+            yield converted_data
+    os.replace(cache_file_path + ".tmp", cache_file_path)
+    message_counts = file_statistics.get_message_counts()
+    if statistics is not None:
+        statistics.record_file(file_statistics.bytes_in)
+        statistics.add_message_counts(message_counts)
+    return message_counts
+
+
+def iterate_converted_data_with_manifest_cache(json_files_list: list, cache_folder_path: str, verbose: bool = False,
+                                               streaming: bool = False,
+                                               read_size: int = DEFAULT_READ_SIZE,
+                                               statistics: PipelineStatistics = None,
+                                               message_filter: MessageFilter = None,
+                                               json_backend: str = DEFAULT_JSON_BACKEND,
+                                               normalizer: ContentNormalizer = None) -> Iterator[str]:
+    """
+    This function yields the converted data of the JSON files,
+    serving the JSON files that did not change since the last run from the cache
+    :param json_files_list: A list of JSON file paths
+    :param cache_folder_path: The cache folder path
+    :param verbose: If True, then show progress
+    :param streaming: If True, then the messages are parsed one at a time
+    :param read_size: The number of characters read at a time when streaming
+    :param statistics: If given, the files, messages and lines are counted in it,
+                       the ones of the cached files from the counters in the manifest
+    :param message_filter: If given, only the messages that match it are converted,
+                           the cache is thrown away when the filter is not the same as in the last run
+    :param json_backend: The backend that decodes whole JSON files, "auto" picks the fastest one that is installed
+    :param normalizer: If given, the message contents are normalized,
+                       the cache is thrown away when the rewrites are not the same as in the last run
+    :return: An iterator over the converted data
+    """
+    # Start the timer
+    start_time = time.perf_counter()
+    if not os.path.exists(cache_folder_path):
+        os.makedirs(cache_folder_path)
+    # The authors are shared by all the converted JSON files
+    author_table = AuthorTable()
+    # Load the manifest of the last run
+    manifest = _load_manifest(cache_folder_path, None if message_filter is None else message_filter.to_dict(),
+                              None if normalizer is None else normalizer.to_list())
+    old_entries = manifest["files"]
+    new_entries = {}
+    number_of_cached_files, number_of_converted_files = 0, 0
+    # Loop through the list of JSON files
+    for json_file in json_files_list:
+        absolute_path = os.path.abspath(json_file)
+        stat = os.stat(json_file)
+        entry = old_entries.get(absolute_path)
+        # Every JSON file gets its own cache file, named after its path
+        cache_file_name = hashlib.sha256(absolute_path.encode("utf-8")).hexdigest()[:32] + ".txt"
+        cache_file_path = os.path.join(cache_folder_path, cache_file_name)
+        if _is_entry_unchanged(entry, json_file, stat, cache_file_path):
+            if verbose:
+                print("Using cached JSON file: " + json_file)
+            number_of_cached_files += 1
+            if statistics is not None:
+                statistics.record_file(stat.st_size, is_cached=True)
+                statistics.add_message_counts(entry["counts"])
+            content_hash = entry["sha256"]
+            message_counts = entry["counts"]
+            yield from _iterate_cached_lines(cache_file_path)
+        else:
+            if verbose:
+                print("Converting JSON file: " + json_file)
+            number_of_converted_files += 1
+            content_hash = _hash_file(json_file)
+            message_counts = yield from _iterate_and_cache_converted_lines(
+                json_file, cache_file_path, streaming, read_size, statistics, author_table, message_filter,
+                json_backend, normalizer)
+        new_entries[absolute_path] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": content_hash,
+            "cache_file": cache_file_name,
+            "counts": message_counts
+        }
+    # Remove the cache files of the JSON files that are gone
+    used_cache_files = set(new_entry["cache_file"] for new_entry in new_entries.values())
+    for old_entry in old_entries.values():
+        if old_entry["cache_file"] not in used_cache_files:
+            try:
+                os.remove(os.path.join(cache_folder_path, old_entry["cache_file"]))
+            except OSError:
+                pass
+    # Save the manifest for the next run
+    manifest["files"] = new_entries
+    _save_manifest(cache_folder_path, manifest)
+    # Stop the timer
+    end_time = time.perf_counter()
+    # Calculate the total time taken
+    total_time_taken = end_time - start_time
+    # Print the message
+    if verbose:
+        print("----------------------------------------")
+        print("JSON files served from the cache: " + str(number_of_cached_files))
+        print("JSON files converted: " + str(number_of_converted_files))
+        print("Total time taken to get the converted data: {} seconds".format(total_time_taken))
+
+
+def main(json_files_list: list, cache_folder_path: str, verbose: bool = False) -> None:
+    """
+    This function prints the converted data of the JSON files, using the cache
+    :param json_files_list: A list of JSON file paths
+    :param cache_folder_path: The cache folder path
+    :param verbose: If True, then show progress
+    :return: None
+    """
+
+    for converted_data in iterate_converted_data_with_manifest_cache(json_files_list, cache_folder_path, verbose):
+        print(converted_data, end="")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    is_verbose = False
+
+    if '-v' in args or '--verbose' in args:
+        is_verbose = True
+        args = [arg for arg in args if arg not in ('-v', '--verbose')]
+    if len(args) < 2:
+        print("Usage: " + sys.argv[0] + " [-v] <cache_folder_path> <json_file_path> [<json_file_path> ...]")
+        sys.exit(1)
+
+    main(args[1:], args[0], is_verbose)
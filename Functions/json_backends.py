@@ -0,0 +1,119 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Decodes whole JSON files with the fastest JSON library that is installed.
+#  orjson and simdjson are optional, the json module of the standard library is always there to fall back to.
+#  The JSON files are memory mapped and handed to the decoder as bytes, instead of being read through
+#  a text file that decodes the UTF-8 into a string first: orjson parses the mapped pages in place.
+#  The backends are chosen by name, so that the choice can be handed to the worker processes.
+#  The JSON lines of the outputs are encoded with the same backend, always without spaces between the tokens,
+#  so that every backend writes the same bytes.
+
+import json
+import mmap
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+# The backends that can be chosen, "auto" picks the fastest one that is installed
+JSON_BACKENDS = ("auto", "orjson", "simdjson", "json")
+DEFAULT_JSON_BACKEND = "auto"
+
+# The installed backends, fastest first
+_INSTALLED_JSON_BACKENDS = tuple(name for name, module in (("orjson", orjson), ("simdjson", simdjson), ("json", json))
+                                 if module is not None)
+
+
+def get_json_backend_name(json_backend: str = DEFAULT_JSON_BACKEND) -> str:
+    """
+    This function gets the backend that decodes the JSON files
+    :param json_backend: "auto", "orjson", "simdjson" or "json"
+    :return: The name of an installed backend, "auto" is resolved to the fastest one
+    """
+    if json_backend not in JSON_BACKENDS:
+        raise ValueError("Unknown JSON backend: " + json_backend + ", expected one of " + ", ".join(JSON_BACKENDS))
+    if json_backend == "auto":
+        return _INSTALLED_JSON_BACKENDS[0]
+    if json_backend not in _INSTALLED_JSON_BACKENDS:
+        raise ValueError("The JSON backend " + json_backend + " is not installed, installed: " +
+                         ", ".join(_INSTALLED_JSON_BACKENDS))
+    return json_backend
+
+
+def loads_json(content, json_backend: str = DEFAULT_JSON_BACKEND):
+    """
+    This function decodes a JSON document
+    :param content: The UTF-8 encoded JSON document, as bytes or any buffer like a memory map
+    :param json_backend: "auto", "orjson", "simdjson" or "json"
+    :return: The decoded value
+    """
+    json_backend = get_json_backend_name(json_backend)
+    if json_backend == "orjson":
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # orjson refuses lone surrogates like "\ud83d", which the json module lets through,
+            # so only give up if the json module cannot decode the document either
+            return json.loads(bytes(content))
+    if json_backend == "simdjson":
+        return simdjson.loads(bytes(content))
+    # The json module only takes bytes, it tells the encoding from the first bytes
+    return json.loads(content if isinstance(content, bytes) else bytes(content))
+
+
+def dumps_json(value, json_backend: str = DEFAULT_JSON_BACKEND) -> str:
+    """
+    This function encodes a value as a JSON document on a single line
+    :param value: The value, made of dicts, lists, strings, numbers, booleans and None
+    :param json_backend: "auto", "orjson", "simdjson" or "json", simdjson only decodes so it encodes with json
+    :return: The JSON document, with the characters outside ASCII left as they are
+    """
+    if get_json_backend_name(json_backend) == "orjson":
+        try:
+            return orjson.dumps(value).decode("utf-8")
+        except TypeError:
+            # orjson refuses lone surrogates, which the json module escapes
+            pass
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def load_json_file(json_file_path: str, json_backend: str = DEFAULT_JSON_BACKEND):
+    """
+    This function decodes a whole JSON file from a memory map of the file
+    :param json_file_path: The JSON file path
+    :param json_backend: "auto", "orjson", "simdjson" or "json"
+    :return: The decoded value
+    """
+    json_backend = get_json_backend_name(json_backend)
+    with open(json_file_path, "rb") as f:
+        # Empty files cannot be mapped, let the decoder raise its own error
+        if os.fstat(f.fileno()).st_size == 0 or json_backend != "orjson":
+            # The other backends copy the content to bytes anyway, reading it is just as fast
+            return loads_json(f.read(), json_backend)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            # The view has to be released before the map is closed
+            with memoryview(mapped_file) as view:
+                return loads_json(view, json_backend)
@@ -0,0 +1,160 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  The conditions a message has to meet to be kept, checked by the loader as early as it can:
+#  the channel, the guild and the date range of an export are checked against its header,
+#  before any of its messages are decoded, so a JSON file that cannot match is skipped as a whole.
+#  The other conditions are checked on the decoded message, before a record is made out of it.
+#  Conditions of different kinds must all be met, a condition with several values needs one of them.
+
+from typing import Iterable
+
+from Functions.parse_discord_timestamp import parse_discord_timestamp
+
+
+def _to_string_set(values: Iterable) -> frozenset:
+    """
+    This function makes a set of strings, ids are compared as the strings they are in the JSON files
+    :param values: The values, or None
+    :return: The set, or None if no values were given
+    """
+    return None if values is None else frozenset(str(value) for value in values)
+
+
+class MessageFilter:
+    """
+    The conditions on the messages to keep, None means no condition
+    """
+
+    def __init__(self, channel_ids: Iterable = None, channel_names: Iterable = None, guild_ids: Iterable = None,
+                 guild_names: Iterable = None, after: int = None, before: int = None, author_ids: Iterable = None,
+                 is_bot: bool = None, message_types: Iterable = None, minimum_length: int = 0):
+        """
+        :param channel_ids: The ids of the channels to keep
+        :param channel_names: The names of the channels to keep
+        :param guild_ids: The ids of the guilds to keep
+        :param guild_names: The names of the guilds to keep
+        :param after: Keep the messages sent at or after this time, in milliseconds since the Unix epoch
+        :param before: Keep the messages sent before this time, in milliseconds since the Unix epoch
+        :param author_ids: The ids of the message authors to keep
+        :param is_bot: True to only keep the messages of bots, False to drop them
+        :param message_types: The message types to keep, e.g. "Default" or "Reply"
+        :param minimum_length: The minimum number of characters of the message content
+        """
+        self.channel_ids = _to_string_set(channel_ids)
+        self.channel_names = _to_string_set(channel_names)
+        self.guild_ids = _to_string_set(guild_ids)
+        self.guild_names = _to_string_set(guild_names)
+        self.after = after
+        self.before = before
+        self.author_ids = _to_string_set(author_ids)
+        self.is_bot = is_bot
+        self.message_types = _to_string_set(message_types)
+        self.minimum_length = minimum_length
+
+    @property
+    def has_header_conditions(self) -> bool:
+        """
+        :return: True if whole JSON files can be skipped by their header
+        """
+        return self.channel_ids is not None or self.channel_names is not None or self.guild_ids is not None or \
+            self.guild_names is not None or self.after is not None or self.before is not None
+
+    @property
+    def has_message_conditions(self) -> bool:
+        """
+        :return: True if single messages can be dropped, not counting the date range
+        """
+        return self.author_ids is not None or self.is_bot is not None or self.message_types is not None or \
+            self.minimum_length > 0
+
+    @property
+    def has_date_range(self) -> bool:
+        """
+        :return: True if the messages are filtered by their timestamp
+        """
+        return self.after is not None or self.before is not None
+
+    def matches_header(self, header: dict) -> bool:
+        """
+        This function checks if any message of a JSON file can match, from its top level values
+        :param header: The top level values of the JSON file other than the messages (guild, channel, dateRange, ...)
+        :return: False if the JSON file can be skipped
+        """
+        channel = header.get("channel") or {}
+        if self.channel_ids is not None and channel.get("id") not in self.channel_ids:
+            return False
+        if self.channel_names is not None and channel.get("name") not in self.channel_names:
+            return False
+        guild = header.get("guild") or {}
+        if self.guild_ids is not None and guild.get("id") not in self.guild_ids:
+            return False
+        if self.guild_names is not None and guild.get("name") not in self.guild_names:
+            return False
+        # The export only holds the messages between its own after and before
+        date_range = header.get("dateRange") or {}
+        if self.before is not None and date_range.get("after") is not None and \
+                parse_discord_timestamp(date_range["after"]) >= self.before:
+            return False
+        if self.after is not None and date_range.get("before") is not None and \
+                parse_discord_timestamp(date_range["before"]) <= self.after:
+            return False
+        return True
+
+    def matches_message(self, message: dict) -> bool:
+        """
+        This function checks a decoded message against the conditions, except for the date range
+        :param message: The message object
+        :return: True if the message is kept
+        """
+        if self.message_types is not None and message.get("type") not in self.message_types:
+            return False
+        author = message["author"]
+        if self.is_bot is not None and author.get("isBot", False) != self.is_bot:
+            return False
+        if self.author_ids is not None and author["id"] not in self.author_ids:
+            return False
+        if len(message["content"]) < self.minimum_length:
+            return False
+        return True
+
+    def matches_timestamp(self, timestamp: int) -> bool:
+        """
+        This function checks the time of a message against the date range
+        :param timestamp: The message timestamp in milliseconds since the Unix epoch
+        :return: True if the message is kept
+        """
+        return (self.after is None or timestamp >= self.after) and (self.before is None or timestamp < self.before)
+
+    def to_dict(self) -> dict:
+        """
+        This function gets the conditions as JSON serializable values
+        :return: The conditions
+        """
+        return {
+            "channel_ids": None if self.channel_ids is None else sorted(self.channel_ids),
+            "channel_names": None if self.channel_names is None else sorted(self.channel_names),
+            "guild_ids": None if self.guild_ids is None else sorted(self.guild_ids),
+            "guild_names": None if self.guild_names is None else sorted(self.guild_names),
+            "after": self.after,
+            "before": self.before,
+            "author_ids": None if self.author_ids is None else sorted(self.author_ids),
+            "is_bot": self.is_bot,
+            "message_types": None if self.message_types is None else sorted(self.message_types),
+            "minimum_length": self.minimum_length
+        }
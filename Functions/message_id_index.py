@@ -0,0 +1,178 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  A compact set of message ids, used to drop the messages that show up in more than one export.
+#  Discord message ids are 64 bit snowflakes, so they are kept unboxed in an open addressing
+#  hash table backed by array("Q") with linear probing. That costs 8 bytes per slot,
+#  between about 11 and 23 bytes per id depending on the load, instead of the ~70 bytes
+#  per id of a Python set of ints, so hundreds of millions of ids fit in a few GB.
+
+from array import array
+
+# Fibonacci hashing spreads the snowflakes, whose low bits are mostly a small counter
+_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK_64_BITS = (1 << 64) - 1
+
+
+class MessageIdIndex:
+    """
+    A set of 64 bit message ids
+    """
+
+    def __init__(self, initial_capacity: int = 1 << 16, maximum_load_factor: float = 0.7):
+        """
+        :param initial_capacity: The number of slots to start with, rounded up to a power of two
+        :param maximum_load_factor: The fraction of used slots at which the table doubles in size
+        """
+        self._bits = max(initial_capacity - 1, 1).bit_length()
+        self._slots = array("Q", [0]) * (1 << self._bits)
+        self._maximum_load_factor = maximum_load_factor
+        self._maximum_size = int((1 << self._bits) * maximum_load_factor)
+        self._size = 0
+        # 0 marks an empty slot, so it is tracked on its own
+        self._contains_zero = False
+        # The ids added since start_journal, so that they can be taken out again, None when not recording
+        self._journal = None
+
+    def __len__(self) -> int:
+        return self._size + self._contains_zero
+
+    def __contains__(self, message_id: int) -> bool:
+        if message_id == 0:
+            return self._contains_zero
+        mask = (1 << self._bits) - 1
+        slot = ((message_id * _MULTIPLIER) & _MASK_64_BITS) >> (64 - self._bits)
+        slots = self._slots
+        while True:
+            value = slots[slot]
+            if value == message_id:
+                return True
+            if value == 0:
+                return False
+            slot = (slot + 1) & mask
+
+    def add(self, message_id: int) -> bool:
+        """
+        This function adds a message id to the index
+        :param message_id: The message id
+        :return: True if the message id was not in the index yet, False if it is a duplicate
+        """
+        if message_id == 0:
+            is_new = not self._contains_zero
+            self._contains_zero = True
+            if is_new and self._journal is not None:
+                self._journal.append(0)
+            return is_new
+        mask = (1 << self._bits) - 1
+        slot = ((message_id * _MULTIPLIER) & _MASK_64_BITS) >> (64 - self._bits)
+        slots = self._slots
+        while True:
+            value = slots[slot]
+            if value == message_id:
+                return False
+            if value == 0:
+                break
+            slot = (slot + 1) & mask
+        slots[slot] = message_id
+        self._size += 1
+        if self._journal is not None:
+            self._journal.append(message_id)
+        if self._size > self._maximum_size:
+            self._grow()
+        return True
+
+    def discard(self, message_id: int) -> None:
+        """
+        This function removes a message id from the index, if it is in it
+        :param message_id: The message id
+        :return: None
+        """
+        if message_id == 0:
+            self._contains_zero = False
+            return
+        mask = (1 << self._bits) - 1
+        shift = 64 - self._bits
+        slot = ((message_id * _MULTIPLIER) & _MASK_64_BITS) >> shift
+        slots = self._slots
+        while True:
+            value = slots[slot]
+            if value == 0:
+                return
+            if value == message_id:
+                break
+            slot = (slot + 1) & mask
+        # An empty slot would cut the probe sequences that run through it, so the ids after it are moved back
+        # into it, unless their own slot lies after it
+        empty_slot = slot
+        slot = (slot + 1) & mask
+        while True:
+            value = slots[slot]
+            if value == 0:
+                break
+            home_slot = ((value * _MULTIPLIER) & _MASK_64_BITS) >> shift
+            if (slot - home_slot) & mask >= (slot - empty_slot) & mask:
+                slots[empty_slot] = value
+                empty_slot = slot
+            slot = (slot + 1) & mask
+        slots[empty_slot] = 0
+        self._size -= 1
+
+    def start_journal(self) -> None:
+        """
+        This function starts recording the ids that are added, so that they can be taken out again
+        :return: None
+        """
+        self._journal = array("Q")
+
+    def stop_journal(self, is_rolling_back: bool = False) -> None:
+        """
+        This function stops recording the ids that are added
+        :param is_rolling_back: If True, then the ids added since start_journal are removed again
+        :return: None
+        """
+        journal, self._journal = self._journal, None
+        if is_rolling_back and journal is not None:
+            for message_id in journal:
+                self.discard(message_id)
+
+    @property
+    def memory_usage(self) -> int:
+        """
+        :return: The number of bytes used by the slots
+        """
+        return self._slots.itemsize * len(self._slots)
+
+    def _grow(self) -> None:
+        """
+        This function doubles the number of slots and inserts every id again
+        :return: None
+        """
+        old_slots = self._slots
+        self._bits += 1
+        self._slots = array("Q", [0]) * (1 << self._bits)
+        self._maximum_size = int((1 << self._bits) * self._maximum_load_factor)
+        mask = (1 << self._bits) - 1
+        shift = 64 - self._bits
+        slots = self._slots
+        for message_id in old_slots:
+            if message_id == 0:
+                continue
+            slot = ((message_id * _MULTIPLIER) & _MASK_64_BITS) >> shift
+            while slots[slot] != 0:
+                slot = (slot + 1) & mask
+            slots[slot] = message_id
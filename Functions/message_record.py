@@ -0,0 +1,113 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  The record the loader yields for every message.
+#  It is a named tuple, so record[1] is still the message content like in the
+#  [message author, message content] lists before, but record[0] is the index of the
+#  message author in the AuthorTable of the run instead of a copy of the author label.
+#  The ids are ints and the timestamp is in milliseconds since the Unix epoch.
+#  reference_id is the id of the message a reply answers, or 0 if the message is not a reply.
+#  When none of the steps of a run need the channels, the timestamps or the replies, the loader yields
+#  plain (author_index, content, message_id) tuples instead, which skip parsing them,
+#  so the code that takes either of them goes by index for these three fields.
+#  The records that are all loaded at once are kept in MessageColumns instead of a list,
+#  an array of ints per field plus a list of the contents, so a message costs a few machine words
+#  instead of a tuple and its int objects. The records are made again while the columns are iterated.
+
+from array import array
+from collections import namedtuple
+from typing import Callable, Iterable, Iterator
+
+MessageRecord = namedtuple("MessageRecord", ["author_index", "content", "message_id", "author_id", "channel_id",
+                                             "timestamp", "reference_id"])
+
+
+class MessageColumns:
+    """
+    The records of a run kept in columns, which takes a lot less memory than a list of them
+    """
+
+    def __init__(self, details: bool = True):
+        """
+        :param details: If True, then the columns hold message records, otherwise
+                        (author_index, content, message_id) tuples
+        """
+        self.details = details
+        self.contents = []
+        # The ids fit in 64 bit signed ints, like in the binary message store
+        self.int_columns = tuple(array("q") for _ in range(6 if details else 2))
+
+    def __len__(self) -> int:
+        return len(self.contents)
+
+    def __iter__(self) -> Iterator[tuple]:
+        author_indices, message_ids, *details = self.int_columns
+        if not self.details:
+            return zip(author_indices, self.contents, message_ids)
+        return map(MessageRecord._make, zip(author_indices, self.contents, message_ids, *details))
+
+    def __getitem__(self, index: int) -> tuple:
+        author_indices, message_ids, *details = self.int_columns
+        record = (author_indices[index], self.contents[index], message_ids[index])
+        if not self.details:
+            return record
+        return MessageRecord(*record, *(column[index] for column in details))
+
+    def append(self, record: tuple) -> None:
+        """
+        This function adds a record to the end of the columns
+        :param record: The message record, or the (author_index, content, message_id) tuple without details
+        :return: None
+        """
+        self.contents.append(record[1])
+        int_columns = self.int_columns
+        int_columns[0].append(record[0])
+        int_columns[1].append(record[2])
+        if self.details:
+            for column, value in zip(int_columns[2:], record[3:]):
+                column.append(value)
+
+    def extend(self, records: Iterable) -> None:
+        """
+        This function adds records to the end of the columns
+        :param records: An iterable of message records, or of tuples without details
+        :return: None
+        """
+        if self.details:
+            append = self.append
+            for record in records:
+                append(record)
+            return
+        # The records without details are the common case, they are unpacked without going through append
+        append_content = self.contents.append
+        append_author_index = self.int_columns[0].append
+        append_message_id = self.int_columns[1].append
+        for author_index, content, message_id in records:
+            append_content(content)
+            append_author_index(author_index)
+            append_message_id(message_id)
+
+    def sort(self, key: Callable) -> None:
+        """
+        This function sorts the records in place, keeping the records with the same key in order
+        :param key: A function that gets the sort key of a record
+        :return: None
+        """
+        order = sorted(range(len(self)), key=lambda index: key(self[index]))
+        self.contents = [self.contents[index] for index in order]
+        self.int_columns = tuple(array("q", (column[index] for index in order)) for column in self.int_columns)
@@ -0,0 +1,307 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Drops the messages that are nearly the same as a recent message, like bot spam, copypasta and repeated pings,
+#  between the loading and the conversion. The exact duplicates of a message id are dropped by MessageIdIndex,
+#  this catches the messages with a different id and (almost) the same content.
+#  The content of every message is lowercased, its runs of whitespace become one space, and it is cut into
+#  its shingles: all the overlapping substrings of a few bytes. Two messages are near duplicates when the
+#  Jaccard similarity of their sets of shingles is at least the threshold.
+#  The similarity is estimated with a MinHash signature made by one permutation hashing: every shingle is hashed
+#  once, the top bits of the hash pick one of the bins of the signature, and every bin keeps the smallest hash
+#  that falls into it. This needs a single hash per shingle instead of one per bin and shingle, and all of it
+#  runs in C: the shingles are the tuples zip makes out of the shifted bytes of the message, they are hashed
+#  with map and hash, and the bins are built with sorted and dict, so there is no Python loop over the shingles.
+#  The hash of a tuple of ints, unlike the hash of a str or bytes, is the same in every run.
+#  The signatures are computed for a batch of records at a time.
+#  The near duplicates are found with LSH banding: the bins are split into bands, and the messages whose signatures
+#  have the same values in a band land in the same bucket. Only the message already in the bucket is compared,
+#  so every message costs a few dict lookups no matter how many messages were seen. The bands whose bins are all
+#  empty, which happens for short messages, are skipped, otherwise every short message would share their bucket.
+#  Only the last messages are kept in the buckets, so the memory used does not grow with the number of messages.
+#  The messages shorter than the minimum length are never dropped, "ok" or "thanks" are not spam.
+#  Format of a line of the report of the dropped messages:
+#  {
+#    "message_id": "MessageId",
+#    "author": "MessageAuthorName___MessageAuthorDiscriminator",
+#    "channel": "ChannelId",
+#    "duplicate_of": "MessageIdOfTheKeptMessage",
+#    "similarity": EstimatedJaccardSimilarity,
+#    "content": "MessageContent"
+#  }
+
+import sys
+from array import array
+from collections import deque
+from itertools import compress, islice, repeat
+from operator import eq, rshift
+from typing import Iterable, Iterator
+
+from Functions.author_table import AuthorTable
+from Functions.json_backends import dumps_json
+from Functions.message_record import MessageRecord
+from Functions.open_atomic_output_file import open_atomic_output_file
+from Functions.pipeline_statistics import PipelineStatistics
+
+# The estimated similarity at which a message is dropped
+DEFAULT_THRESHOLD = 0.8
+# The bands of the signatures, and the bins in every band, the number of bins must be a power of two
+DEFAULT_NUMBER_OF_BANDS = 8
+DEFAULT_ROWS_PER_BAND = 4
+# The number of bytes of a shingle
+DEFAULT_SHINGLE_SIZE = 5
+# The number of characters a message needs to be dropped
+DEFAULT_MINIMUM_LENGTH = 16
+# The number of recent messages the near duplicates are looked for in
+DEFAULT_LOOKBACK = 200000
+# The number of records the signatures are computed for at a time
+DEFAULT_BATCH_SIZE = 1024
+
+# The value of the empty bins, hash never returns -1
+_EMPTY_BIN = -1
+
+
+class NearDuplicateFilter:
+    """
+    The settings and the buckets of the near duplicate search, kept between the runs of a pipeline
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, number_of_bands: int = DEFAULT_NUMBER_OF_BANDS,
+                 rows_per_band: int = DEFAULT_ROWS_PER_BAND, shingle_size: int = DEFAULT_SHINGLE_SIZE,
+                 minimum_length: int = DEFAULT_MINIMUM_LENGTH, lookback: int = DEFAULT_LOOKBACK):
+        """
+        :param threshold: The estimated Jaccard similarity at which a message is dropped, between 0 and 1
+        :param number_of_bands: The number of bands of the signatures, more bands find more candidates
+        :param rows_per_band: The number of bins in a band, more rows find fewer but closer candidates
+        :param shingle_size: The number of bytes of a shingle
+        :param minimum_length: The number of characters a message needs to be dropped
+        :param lookback: The number of recent messages kept in the buckets
+        """
+        number_of_bins = number_of_bands * rows_per_band
+        if number_of_bins & (number_of_bins - 1) != 0 or not 2 <= number_of_bins <= 1 << 16:
+            raise ValueError("The number of bands times the rows per band must be a power of two from 2 to 65536")
+        if not 0 < threshold <= 1:
+            raise ValueError("The similarity threshold must be above 0 and at most 1")
+        if shingle_size < 1 or lookback < 1:
+            raise ValueError("The shingle size and the lookback must be at least 1")
+        self.threshold = threshold
+        self.number_of_bands = number_of_bands
+        self.rows_per_band = rows_per_band
+        self.shingle_size = shingle_size
+        self.minimum_length = minimum_length
+        self.lookback = lookback
+        # The top bits of a hash pick the bin, the hashes are signed so the bins go from -n/2 to n/2 - 1
+        self._shift = sys.hash_info.width - (number_of_bins.bit_length() - 1)
+        # Every bin empty, in the order of the bins, copied for every signature
+        self._empty_bins = dict.fromkeys(range(-number_of_bins // 2, number_of_bins // 2), _EMPTY_BIN)
+        band_size = rows_per_band * array("q").itemsize
+        self._band_slices = [slice(band_index * band_size, (band_index + 1) * band_size)
+                             for band_index in range(number_of_bands)]
+        self._empty_band = array("q", [_EMPTY_BIN] * rows_per_band).tobytes()
+        # The (signature, message id) in every bucket of every band, by the bytes of the band
+        self._buckets = [{} for _ in range(number_of_bands)]
+        # The buckets of the messages in the buckets, oldest first
+        self._entries = deque()
+
+    def compute_signature(self, content: str) -> bytes:
+        """
+        This function computes the MinHash signature of a message content
+        :param content: The message content
+        :return: The smallest hash of every bin as an array of int64, -1 for the empty bins,
+                 or None if the message is shorter than the minimum length
+        """
+        text = " ".join(content.lower().split())
+        if len(text) < self.minimum_length:
+            return None
+        data = text.encode("utf-8")
+        if len(data) <= self.shingle_size:
+            hashes = [hash(tuple(data))]
+        else:
+            # From the biggest hash to the smallest one, so that the smallest hash of every bin is the one that stays,
+            # the shingles that show up more than once are only sorted once
+            hashes = sorted(set(map(hash, zip(*[data[start:] for start in range(self.shingle_size)]))), reverse=True)
+        # The bins keep their order when they are updated, so their values are the signature
+        bins = self._empty_bins.copy()
+        bins.update(zip(map(rshift, hashes, repeat(self._shift)), hashes))
+        return array("q", bins.values()).tobytes()
+
+    def compute_signatures(self, contents: Iterable) -> list:
+        """
+        This function computes the MinHash signatures of a batch of message contents
+        :param contents: The message contents
+        :return: The list of signatures, see compute_signature
+        """
+        compute_signature = self.compute_signature
+        return [compute_signature(content) for content in contents]
+
+    def add(self, signature: bytes, message_id: int) -> tuple:
+        """
+        This function looks a message up in the buckets, and adds it if it is not a near duplicate
+        :param signature: The signature of the message, see compute_signature
+        :param message_id: The message id
+        :return: The (message id, estimated similarity) of the message it is a near duplicate of, or None
+        """
+        # The buckets the message is added to, with the band of the message they are keyed by
+        band_keys = []
+        compared_entries = []
+        # The bins of the message as a list, made at the first comparison and kept for the others
+        bins = None
+        empty_band = self._empty_band
+        for band_buckets, band_key in zip(self._buckets, map(signature.__getitem__, self._band_slices)):
+            if band_key == empty_band:
+                continue
+            entry = band_buckets.get(band_key)
+            if entry is None:
+                band_keys.append((band_buckets, band_key))
+                continue
+            # A message often shares several bands with the same message, it only needs to be compared once
+            if entry in compared_entries:
+                continue
+            compared_entries.append(entry)
+            if bins is None:
+                bins = array("q", signature).tolist()
+            similarity = _estimate_similarity_of_bins(bins, array("q", entry[0]).tolist())
+            if similarity >= self.threshold:
+                return entry[1], similarity
+        entry = (signature, message_id)
+        for band_buckets, band_key in band_keys:
+            band_buckets[band_key] = entry
+        self._entries.append(band_keys)
+        # Forget the oldest message, a bucket is only ever taken by a single message
+        if len(self._entries) > self.lookback:
+            for band_buckets, band_key in self._entries.popleft():
+                del band_buckets[band_key]
+        return None
+
+
+def estimate_similarity(signature: bytes, other_signature: bytes) -> float:
+    """
+    This function estimates the Jaccard similarity of the shingles of two messages from their signatures
+    :param signature: The signature of a message
+    :param other_signature: The signature of the other message
+    :return: The share of the bins that are not empty in both signatures which hold the same hash
+    """
+    # Lists of ints instead of the arrays, which would make a new int for every bin every time they are read
+    return _estimate_similarity_of_bins(array("q", signature).tolist(), array("q", other_signature).tolist())
+
+
+def _estimate_similarity_of_bins(bins: list, other_bins: list) -> float:
+    """
+    This function estimates the Jaccard similarity of the shingles of two messages, see estimate_similarity
+    :param bins: The bins of the signature of a message, as a list
+    :param other_bins: The bins of the signature of the other message, as a list
+    :return: The estimated similarity
+    """
+    # The bins that hold the same hash in both signatures, picked out in a single pass with compress,
+    # the bins that are empty in both signatures are among them and do not count
+    same_bins = list(compress(bins, map(eq, bins, other_bins)))
+    number_of_empty_bins = same_bins.count(_EMPTY_BIN)
+    number_of_bins = len(bins) - number_of_empty_bins
+    number_of_same_bins = len(same_bins) - number_of_empty_bins
+    return number_of_same_bins / number_of_bins if number_of_bins > 0 else 1.0
+
+
+def _iterate_records_without_near_duplicates(records: Iterable, author_table: AuthorTable,
+                                             near_duplicate_filter: NearDuplicateFilter,
+                                             statistics: PipelineStatistics, report_file,
+                                             batch_size: int) -> Iterator[MessageRecord]:
+    """
+    This function drops the near duplicates, see iterate_records_without_near_duplicates
+    :param records: An iterable of message records
+    :param author_table: The author table the records refer to
+    :param near_duplicate_filter: The settings and the buckets of the near duplicate search
+    :param statistics: If given, the dropped messages are counted in it
+    :param report_file: If given, the text file the dropped messages are written to
+    :param batch_size: The number of records the signatures are computed for at a time
+    :return: An iterator over the message records that are kept
+    """
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if len(batch) == 0:
+            return
+        signatures = near_duplicate_filter.compute_signatures([record[1] for record in batch])
+        for record, signature in zip(batch, signatures):
+            if signature is None:
+                yield record
+                continue
+            near_duplicate = near_duplicate_filter.add(signature, record[2])
+            if near_duplicate is None:
+                yield record
+                continue
+            if statistics is not None:
+                statistics.record_near_duplicate()
+            if report_file is not None:
+                report_file.write(dumps_json({
+                    "message_id": str(record.message_id),
+                    "author": author_table.get_label(record.author_index),
+                    "channel": str(record.channel_id),
+                    "duplicate_of": str(near_duplicate[0]),
+                    "similarity": round(near_duplicate[1], 3),
+                    "content": record.content
+                }) + "\n")
+
+
+def iterate_records_without_near_duplicates(records: Iterable, author_table: AuthorTable,
+                                            near_duplicate_filter: NearDuplicateFilter,
+                                            statistics: PipelineStatistics = None, report_path: str = None,
+                                            batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[MessageRecord]:
+    """
+    This function drops the messages that are nearly the same as a recent message, while the records stream through
+    :param records: An iterable of message records
+    :param author_table: The author table the records refer to
+    :param near_duplicate_filter: The settings and the buckets of the near duplicate search
+    :param statistics: If given, the dropped messages are counted in it
+    :param report_path: If given, the dropped messages are written to this file, one JSON object per line
+    :param batch_size: The number of records the signatures are computed for at a time
+    :return: An iterator over the message records that are kept
+    """
+    if report_path is None:
+        yield from _iterate_records_without_near_duplicates(records, author_table, near_duplicate_filter,
+                                                            statistics, None, batch_size)
+        return
+    with open_atomic_output_file(report_path) as report_file:
+        yield from _iterate_records_without_near_duplicates(records, author_table, near_duplicate_filter,
+                                                            statistics, report_file, batch_size)
+
+
+def main(contents: list, threshold: float = DEFAULT_THRESHOLD) -> None:
+    """
+    This function prints which of the given message contents are near duplicates of an earlier one
+    :param contents: The message contents
+    :param threshold: The estimated similarity at which a message is dropped
+    :return: None
+    """
+    near_duplicate_filter = NearDuplicateFilter(threshold)
+    for index, (content, signature) in enumerate(zip(contents, near_duplicate_filter.compute_signatures(contents))):
+        near_duplicate = None if signature is None else near_duplicate_filter.add(signature, index)
+        if near_duplicate is None:
+            print(str(index) + ": kept: " + content)
+        else:
+            print(str(index) + ": near duplicate of " + str(near_duplicate[0]) + " (" +
+                  str(round(near_duplicate[1], 3)) + "): " + content)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+
+    if len(args) < 1:
+        print("Usage: " + sys.argv[0] + " <message_content> [<message_content> ...]")
+        sys.exit(1)
+
+    main(args)
@@ -0,0 +1,132 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Cleans up the message contents while they are converted, instead of in a second pass over the output file.
+#  The selected rewrites are compiled into a single regular expression of alternatives, so every message
+#  is scanned once with re.sub no matter how many rewrites are selected. The expression starts with a lookahead
+#  on the first characters of the alternatives, which lets the regex engine skip to the places where one can match.
+#  The scan runs in C, Python code only runs for every match. The rewrites of single characters are alternatives
+#  of the same expression too: str.translate looks every character up in a dict, which made it slower than
+#  the whole scan on the contents with characters outside ASCII.
+#  The rewrites:
+#  - newlines: "\r\n" and "\r" become "\n", so that no line of the output ends with "\r"
+#  - mentions: <@UserId> and <@!UserId> become @UserName, <@&RoleId> becomes @role and <#ChannelId> becomes #channel
+#  - emoji: <:EmojiName:EmojiId> and <a:EmojiName:EmojiId> become :EmojiName:
+#  - urls: http and https links are removed, with the spaces after them
+#  - code: the ``` fences of code blocks are removed, with their language, the code is kept
+#  - whitespace: tabs and no-break spaces become spaces, zero width characters are removed,
+#    runs of spaces become one space and the spaces at the start and end of every line are removed
+#  The user names come from the "mentions" of the messages and from the message authors, see AuthorTable.
+
+import functools
+import re
+from typing import Callable, Iterable
+
+from Functions.author_table import AuthorTable
+
+# The rewrites that can be selected, in the order they are listed in the help
+NORMALIZATIONS = ("newlines", "mentions", "emoji", "urls", "code", "whitespace")
+
+# The alternatives of the regular expression of every rewrite, the name of the outer group tells which one matched
+_PATTERNS = {
+    "newlines": r"(?P<newline>\r\n?|[\u2028\u2029])",
+    "mentions": r"(?P<mention><(?P<mention_kind>@[!&]?|#)(?P<mention_id>\d+)>)",
+    "emoji": r"(?P<emoji><a?:(?P<emoji_name>\w+):\d+>)",
+    "urls": r"(?P<url>https?://[^\s<>]+[ \t]*)",
+    "code": r"(?P<code>```(?:[\w+#-]*\n)?)",
+    "whitespace": r"(?P<edge_space>^[ \t\u00a0\u200b-\u200d\ufeff]+|[ \t\u00a0\u200b-\u200d\ufeff]+(?=\r?$))|"
+                  r"(?P<space>[ \t\u00a0]{2,}|[\t\u00a0])|"
+                  r"(?P<zero_width>[\u200b-\u200d\ufeff])",
+}
+
+# The characters every alternative can start with
+_FIRST_CHARACTERS = {
+    "newlines": "\r\u2028\u2029",
+    "mentions": "<",
+    "emoji": "<",
+    "urls": "h",
+    "code": "`",
+    "whitespace": " \t\u00a0\u200b\u200c\u200d\ufeff",
+}
+
+# The name of the users whose id is not known
+UNKNOWN_USER_NAME = "unknown-user"
+
+
+class ContentNormalizer:
+    """
+    The rewrites of the message contents, compiled once for the run
+    """
+
+    def __init__(self, normalizations: Iterable = NORMALIZATIONS):
+        """
+        :param normalizations: The names of the rewrites to do, see NORMALIZATIONS
+        """
+        normalizations = set(normalizations)
+        unknown_normalizations = normalizations.difference(NORMALIZATIONS)
+        if len(unknown_normalizations) > 0:
+            raise ValueError("Unknown normalization: " + ", ".join(sorted(unknown_normalizations)) +
+                             ", expected one of " + ", ".join(NORMALIZATIONS))
+        # Kept in the order of NORMALIZATIONS, so that the same rewrites always compile to the same pattern
+        self.normalizations = tuple(name for name in NORMALIZATIONS if name in normalizations)
+        self._pattern = None
+        if len(self.normalizations) > 0:
+            first_characters = "".join(sorted(set("".join(_FIRST_CHARACTERS[name] for name in self.normalizations))))
+            self._pattern = re.compile("(?=[" + re.escape(first_characters) + "])(?:" +
+                                       "|".join(_PATTERNS[name] for name in self.normalizations) + ")", re.MULTILINE)
+
+    def to_list(self) -> list:
+        """
+        This function gets the rewrites, e.g. for the manifest of the cache
+        :return: The names of the rewrites
+        """
+        return list(self.normalizations)
+
+    def get_normalize_function(self, author_table: AuthorTable) -> Callable[[str], str]:
+        """
+        This function gets the function that normalizes the message contents of a run
+        :param author_table: The author table of the run, the user mentions are resolved with its user names,
+                             which keep growing while the messages are loaded
+        :return: A function that takes a message content and returns the normalized message content
+        """
+        pattern = self._pattern
+        user_names = author_table.user_names
+
+        def _replace(match: re.Match) -> str:
+            kind = match.lastgroup
+            if kind == "newline":
+                return "\n"
+            if kind == "mention":
+                mention_kind = match.group("mention_kind")
+                if mention_kind == "#":
+                    return "#channel"
+                if mention_kind == "@&":
+                    return "@role"
+                return "@" + user_names.get(match.group("mention_id"), UNKNOWN_USER_NAME)
+            if kind == "emoji":
+                return ":" + match.group("emoji_name") + ":"
+            if kind == "space":
+                return " "
+            # url, code, edge_space and zero_width are removed
+            return ""
+
+        def _keep(content: str) -> str:
+            return content
+
+        # A partial of the bound method is called without running any Python code of its own
+        return _keep if pattern is None else functools.partial(pattern.sub, _replace)
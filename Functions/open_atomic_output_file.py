@@ -0,0 +1,141 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Opens an output file that only appears under its final name once it is complete.
+#  The data is written to a temporary file in the same folder, optionally compressed
+#  with gzip, bz2 or xz, and the temporary file is renamed into place when the file
+#  is closed without an error. Readers of the output path therefore never see a
+#  half written file.
+#  Output files that grow over time, like the one of the watch mode, are opened for appending instead.
+
+import bz2
+import contextlib
+import gzip
+import io
+import lzma
+import os
+import uuid
+from typing import Iterator
+
+# The size of the write buffers
+DEFAULT_BUFFER_SIZE = 8 * 1024 * 1024
+
+# The compressions that can be chosen, "auto" picks one from the file extension
+COMPRESSIONS = ("auto", "none", "gzip", "bz2", "xz")
+
+# The file extensions that turn on a compression
+_COMPRESSION_FILE_EXTENSIONS = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz"
+}
+
+
+def get_compression_from_file_extension(output_path: str) -> str:
+    """
+    This function gets the compression that matches the extension of a file
+    :param output_path: The output file path
+    :return: "gzip", "bz2", "xz" or "none"
+    """
+    return _COMPRESSION_FILE_EXTENSIONS.get(os.path.splitext(output_path)[1].lower(), "none")
+
+
+def _open_compressor(binary_file, compression: str, output_path: str):
+    """
+    This function wraps a binary file into a compressor
+    :param binary_file: The binary file to write the compressed data to
+    :param compression: "gzip", "bz2", "xz" or "none"
+    :param output_path: The output file path, stored in the gzip header
+    :return: A binary file object
+    """
+    if compression == "gzip":
+        # Level 6 is much faster than the default level 9 and barely any bigger
+        return gzip.GzipFile(filename=output_path, mode="wb", compresslevel=6, fileobj=binary_file)
+    if compression == "bz2":
+        return bz2.BZ2File(binary_file, mode="wb")
+    if compression == "xz":
+        return lzma.LZMAFile(binary_file, mode="wb")
+    if compression == "none":
+        return binary_file
+    raise ValueError("Unknown compression: " + compression + ", expected one of " + ", ".join(COMPRESSIONS))
+
+
+@contextlib.contextmanager
+def open_atomic_output_file(output_path: str, compression: str = "auto", buffer_size: int = DEFAULT_BUFFER_SIZE,
+                            text: bool = True) -> Iterator[io.IOBase]:
+    """
+    This function opens an output file that is renamed into place once it was written without an error
+    :param output_path: The output file path
+    :param compression: "auto", "none", "gzip", "bz2" or "xz", "auto" picks one from the file extension
+    :param buffer_size: The size of the write buffers in bytes
+    :param text: If True, then the file is opened in text mode with UTF-8, otherwise in binary mode
+    :return: A context manager over the opened file
+    """
+    if compression == "auto":
+        compression = get_compression_from_file_extension(output_path)
+    # Create the output folder if it does not exist
+    output_folder_path = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_folder_path, exist_ok=True)
+    # The temporary file lives in the same folder, so that the rename never crosses file systems
+    temporary_path = os.path.join(output_folder_path, "." + os.path.basename(output_path) + "." +
+                                  uuid.uuid4().hex[:8] + ".tmp")
+    binary_file = open(temporary_path, "xb", buffering=buffer_size)
+    try:
+        compressor = _open_compressor(binary_file, compression, output_path)
+        if compressor is not binary_file:
+            # Feed the compressor large blocks instead of every single write
+            compressor = io.BufferedWriter(compressor, buffer_size)
+        output_file = io.TextIOWrapper(compressor, encoding="utf-8") if text else compressor
+        try:
+            yield output_file
+        finally:
+            # Closing the outer layer flushes every layer above the file,
+            # the compressors leave the file itself open so it is closed on its own
+            output_file.close()
+            binary_file.close()
+    except BaseException:
+        binary_file.close()
+        os.remove(temporary_path)
+        raise
+    os.replace(temporary_path, output_path)
+
+
+@contextlib.contextmanager
+def open_appending_output_file(output_path: str, compression: str = "auto",
+                               buffer_size: int = DEFAULT_BUFFER_SIZE) -> Iterator[io.IOBase]:
+    """
+    This function opens an output file to add data to its end, the file is created if it does not exist.
+    A compressed file gets a new gzip member, bz2 stream or xz stream, which the decompressors read as one file.
+    Unlike open_atomic_output_file, readers can see the added data before it is complete
+    :param output_path: The output file path
+    :param compression: "auto", "none", "gzip", "bz2" or "xz", "auto" picks one from the file extension
+    :param buffer_size: The size of the write buffers in bytes
+    :return: A context manager over the opened file, in text mode with UTF-8
+    """
+    if compression == "auto":
+        compression = get_compression_from_file_extension(output_path)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "ab", buffering=buffer_size) as binary_file:
+        compressor = _open_compressor(binary_file, compression, output_path)
+        if compressor is not binary_file:
+            compressor = io.BufferedWriter(compressor, buffer_size)
+        output_file = io.TextIOWrapper(compressor, encoding="utf-8")
+        try:
+            yield output_file
+        finally:
+            output_file.close()
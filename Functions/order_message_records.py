@@ -0,0 +1,299 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Orders the message records of all the JSON files by timestamp or by id, without loading the whole corpus.
+#  Discord Chat Exporter writes the messages of a channel in the order they were sent, so the records
+#  of every JSON file are usually sorted already, and only the files have to be interleaved:
+#  the streams of the files are merged with a heap, holding a single record of every file at a time.
+#  When there are too many JSON files to keep them all open, groups of them are merged into run files first,
+#  the groups are smaller than MAXIMUM_MERGE_WIDTH when the limit on the open files of the process is lower.
+#  A stream that turns out not to be sorted stops the merge with an error instead of writing a wrong order.
+#  The records that are not sorted are ordered by an external merge sort: they are collected until
+#  the memory budget is used up, sorted and spilled to a run file in a temporary folder, and the runs
+#  are merged with a heap at the end. When there are too many runs to keep them all open, groups of runs
+#  are merged into bigger ones first. The spill files are batches of plain tuples written with marshal,
+#  so the author indices keep referring to the author table of the run.
+#  The inverted index spills and merges its posting lists with the same run files.
+#  Records with the same timestamp are ordered by id, and records with the same key keep their order.
+
+import heapq
+# The run files are only ever read back by the process that wrote them, from its own temporary folder,
+# so marshal never loads data from anywhere else, and it is the fastest way to spill tuples with the stdlib
+import marshal  # noqa: DUO120
+import os
+import sys
+import tempfile
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, Iterable, Iterator, Union
+
+try:
+    import resource
+except ImportError:
+    # Windows has no resource module
+    resource = None
+
+from Functions.author_table import AuthorTable
+from Functions.binary_message_store import iterate_data_from_binary_message_store
+from Functions.message_record import MessageColumns, MessageRecord
+
+# The keys the records can be ordered by
+ORDER_KEYS = ("timestamp", "id")
+# The number of bytes of records collected in memory before a sorted run is spilled
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+# The number of run files merged at the same time, so that the open files and their buffers stay few
+MAXIMUM_MERGE_WIDTH = 64
+# The files the rest of the run may have open while a merge reads its files,
+# the standard streams, the output file, the run being written, the store, the index and the reports
+_RESERVED_FILES = 10
+
+# The size of a record without its content, the named tuple, its ints and the slot of the list it is in
+_RECORD_SIZE = 288
+# The number of records marshalled at once in a run file
+_SPILL_BATCH_SIZE = 4096
+# The size of the read and write buffers of a run file
+_SPILL_BUFFER_SIZE = 1024 * 1024
+
+
+def get_order_key(order_by: str) -> Callable:
+    """
+    This function gets the sort key of the records
+    :param order_by: "timestamp" or "id"
+    :return: A function that gets the key of a record
+    """
+    if order_by == "timestamp":
+        # The timestamp, then the message id
+        return itemgetter(5, 2)
+    if order_by == "id":
+        # The message id
+        return itemgetter(2)
+    raise ValueError("Unknown order: " + str(order_by) + ", expected one of " + ", ".join(ORDER_KEYS))
+
+
+def get_merge_width() -> int:
+    """
+    This function gets the number of files merged at the same time,
+    fewer than MAXIMUM_MERGE_WIDTH when the process is not allowed to open that many files
+    :return: The number of files, at least 2
+    """
+    if resource is None:
+        return MAXIMUM_MERGE_WIDTH
+    soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    if soft_limit == resource.RLIM_INFINITY:
+        return MAXIMUM_MERGE_WIDTH
+    return max(2, min(MAXIMUM_MERGE_WIDTH, soft_limit - _RESERVED_FILES))
+
+
+def _iterate_sorted_records(name: str, records: Iterable, key: Callable, order_by: str) -> Iterator[MessageRecord]:
+    """
+    This function checks that a stream of records is sorted while it is merged
+    :param name: The name of the stream, e.g. the JSON file path
+    :param records: The records of the stream
+    :param key: The sort key of the records
+    :param order_by: "timestamp" or "id", for the error message
+    :return: An iterator over the same records
+    """
+    previous_key = None
+    for record in records:
+        record_key = key(record)
+        if previous_key is not None and record_key < previous_key:
+            raise ValueError("The messages of " + name + " are not sorted by " + order_by +
+                             ", order them with the external merge sort instead")
+        previous_key = record_key
+        yield record
+
+
+def iterate_merged_records(named_record_streams: Iterable, order_by: str,
+                           spill_folder_path: str = None) -> Iterator[MessageRecord]:
+    """
+    This function merges streams of records that are each sorted already, like the JSON files of the exports
+    :param named_record_streams: An iterable of (name, records) pairs, the name is only used in the errors,
+                                 up to get_merge_width() streams are pulled from at the same time,
+                                 so the streams that open a file should only open it once they are first pulled from
+    :param order_by: "timestamp" or "id"
+    :param spill_folder_path: The folder the temporary folder of the runs is created in when there are more streams
+                              than can be merged at the same time, the default temporary folder if None
+    :return: An iterator over the records of all the streams, in order
+    """
+    key = get_order_key(order_by)
+    sorted_streams = [_iterate_sorted_records(name, records, key, order_by) for name, records in named_record_streams]
+    if len(sorted_streams) <= get_merge_width():
+        return heapq.merge(*sorted_streams, key=key)
+    return _iterate_cascaded_records(sorted_streams, key, spill_folder_path)
+
+
+def _iterate_cascaded_records(sorted_streams: list, key: Callable, spill_folder_path: str) -> Iterator[MessageRecord]:
+    """
+    This function merges too many sorted streams to pull from at the same time,
+    groups of them are merged into run files first, see iterate_merged_runs
+    :param sorted_streams: The sorted streams of records
+    :param key: The sort key of the records
+    :param spill_folder_path: The folder the temporary folder of the runs is created in,
+                              the default temporary folder if None
+    :return: An iterator over the records of all the streams, in order
+    """
+    if spill_folder_path is not None:
+        os.makedirs(spill_folder_path, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="order-", dir=spill_folder_path) as run_folder_path:
+        # The runs come back as plain tuples
+        yield from map(MessageRecord._make, iterate_merged_runs(sorted_streams, key, run_folder_path))
+
+
+def write_run(items: Iterable, run_path: str) -> None:
+    """
+    This function writes sorted items to a run file
+    :param items: The sorted items, tuples of ints, strings and bytes, like the records
+    :param run_path: The run file path
+    :return: None
+    """
+    iterator = iter(items)
+    with open(run_path, "wb", buffering=_SPILL_BUFFER_SIZE) as f:
+        while True:
+            # marshal only takes plain tuples
+            batch = list(map(tuple, islice(iterator, _SPILL_BATCH_SIZE)))
+            if len(batch) == 0:
+                break
+            marshal.dump(batch, f)
+
+
+def iterate_run(run_path: str, is_removing: bool = False) -> Iterator[tuple]:
+    """
+    This function reads the items of a run file back, a batch at a time
+    :param run_path: The run file path
+    :param is_removing: If True, then the run file is removed once it was read to the end
+    :return: An iterator over the items, as plain tuples
+    """
+    with open(run_path, "rb", buffering=_SPILL_BUFFER_SIZE) as f:
+        while True:
+            try:
+                batch = marshal.load(f)
+            except EOFError:
+                break
+            yield from batch
+    if is_removing:
+        os.remove(run_path)
+
+
+def iterate_merged_runs(sorted_iterables: list, key: Callable, run_folder_path: str) -> Iterator[tuple]:
+    """
+    This function merges sorted iterables with a heap, like the run files of a sort. When there are too many
+    of them to read at the same time, groups of neighbouring ones are merged into bigger run files first,
+    which keeps the items with the same key in the order of the iterables
+    :param sorted_iterables: The sorted iterables, only get_merge_width() of them are read at the same time,
+                             so the ones that open a file should only open it once they are first pulled from
+    :param key: The sort key of the items
+    :param run_folder_path: The folder the bigger run files are written to, they are removed once they were read
+    :return: An iterator over the items of all the iterables, in order, the merged ones as plain tuples
+    """
+    merge_width = get_merge_width()
+    number_of_merges = 0
+    while len(sorted_iterables) > merge_width:
+        merged_iterables = []
+        for start in range(0, len(sorted_iterables), merge_width):
+            merged_run_path = os.path.join(run_folder_path, "merged-" + str(number_of_merges) + ".run")
+            number_of_merges += 1
+            write_run(heapq.merge(*sorted_iterables[start:start + merge_width], key=key), merged_run_path)
+            merged_iterables.append(iterate_run(merged_run_path, True))
+        sorted_iterables = merged_iterables
+    return heapq.merge(*sorted_iterables, key=key)
+
+
+def iterate_externally_sorted_records(records: Iterable, order_by: str, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                                      spill_folder_path: str = None,
+                                      verbose: bool = False) -> Iterator[MessageRecord]:
+    """
+    This function orders records in any order, spilling sorted runs to disk when they do not fit in the budget
+    :param records: An iterable of message records
+    :param order_by: "timestamp" or "id"
+    :param memory_budget: The number of bytes of records collected in memory before a sorted run is spilled
+    :param spill_folder_path: The folder the temporary folder of the runs is created in,
+                              the default temporary folder if None
+    :param verbose: If True, then show progress
+    :return: An iterator over the records, in order
+    """
+    key = get_order_key(order_by)
+    if memory_budget < 1:
+        raise ValueError("The memory budget must be at least 1 byte")
+    if spill_folder_path is not None:
+        os.makedirs(spill_folder_path, exist_ok=True)
+    getsizeof = sys.getsizeof
+    # The folder and the runs in it are removed once the records were all yielded
+    with tempfile.TemporaryDirectory(prefix="order-", dir=spill_folder_path) as run_folder_path:
+        run_paths = []
+        buffer = []
+        buffer_size = 0
+        for record in records:
+            buffer.append(record)
+            buffer_size += getsizeof(record[1]) + _RECORD_SIZE
+            if buffer_size < memory_budget:
+                continue
+            buffer.sort(key=key)
+            run_path = os.path.join(run_folder_path, str(len(run_paths)) + ".run")
+            if verbose:
+                print("Spilling a sorted run of " + str(len(buffer)) + " messages to " + run_path)
+            write_run(buffer, run_path)
+            run_paths.append(run_path)
+            buffer = []
+            buffer_size = 0
+        # The last run never leaves the memory
+        buffer.sort(key=key)
+        if len(run_paths) == 0:
+            yield from buffer
+            return
+        if verbose:
+            print("Merging " + str(len(run_paths)) + " sorted runs and the " + str(len(buffer)) +
+                  " messages in memory")
+        # The runs come back as plain tuples
+        yield from map(MessageRecord._make, iterate_merged_runs(
+            [iterate_run(run_path, True) for run_path in run_paths] + [buffer], key, run_folder_path))
+
+
+def order_records(records: Union[list, MessageColumns], order_by: str) -> None:
+    """
+    This function orders a list of records in place, when all the records are loaded anyway
+    :param records: The list or the columns of message records
+    :param order_by: "timestamp" or "id"
+    :return: None
+    """
+    records.sort(key=get_order_key(order_by))
+
+
+def main(store_path: str, order_by: str = "timestamp", memory_budget: int = DEFAULT_MEMORY_BUDGET) -> None:
+    """
+    This function prints the messages of a binary message store in order
+    :param store_path: The store folder path
+    :param order_by: "timestamp" or "id"
+    :param memory_budget: The number of bytes of records collected in memory before a sorted run is spilled
+    :return: None
+    """
+    author_table = AuthorTable()
+    for record in iterate_externally_sorted_records(iterate_data_from_binary_message_store(store_path, author_table),
+                                                    order_by, memory_budget):
+        print(str(record.timestamp) + " " + str(record.message_id) + " " +
+              author_table.get_label(record.author_index) + ": " + record.content.replace("\n", " "))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+
+    if len(args) < 1:
+        print("Usage: " + sys.argv[0] + " <store_folder_path> [timestamp|id] [<memory_budget>]")
+        sys.exit(1)
+
+    main(args[0], args[1] if len(args) > 1 else "timestamp",
+         int(args[2]) if len(args) > 2 else DEFAULT_MEMORY_BUDGET)
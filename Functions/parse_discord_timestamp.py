@@ -0,0 +1,47 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Parses the ISO 8601 timestamps written by Discord Chat Exporter,
+#  e.g. "2021-03-12T18:35:21.123+00:00", into milliseconds since the Unix epoch.
+
+import re
+from datetime import datetime, timedelta, timezone
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_MILLISECOND = timedelta(milliseconds=1)
+# Matches the fraction of a second
+_FRACTION_PATTERN = re.compile(r"\.(\d+)")
+
+
+def parse_discord_timestamp(timestamp: str) -> int:
+    """
+    This function parses a timestamp of a JSON file
+    :param timestamp: The ISO 8601 timestamp
+    :return: The number of milliseconds since the Unix epoch
+    """
+    try:
+        date_time = datetime.fromisoformat(timestamp)
+    except ValueError:
+        # Before Python 3.11, fromisoformat only takes fractions with 3 or 6 digits and no "Z"
+        normalized_timestamp = _FRACTION_PATTERN.sub(
+            lambda match: "." + (match.group(1) + "000000")[:6], timestamp.replace("Z", "+00:00"), count=1)
+        date_time = datetime.fromisoformat(normalized_timestamp)
+    # Timestamps without an offset are in UTC
+    if date_time.tzinfo is None:
+        date_time = date_time.replace(tzinfo=timezone.utc)
+    return (date_time - _EPOCH) // _ONE_MILLISECOND
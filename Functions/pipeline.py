@@ -0,0 +1,512 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  The steps of the program in one object, for the code that wants the converted data in-process
+#  instead of reading the output file back in: the JSON files are found, loaded and converted
+#  while the pipeline is iterated, and the lines (or the records) are handed over as they come.
+#  The pipeline can also write the lines to an output file, which is what main.run_program does,
+#  as text, as JSON records (see convert_data_to_required_format) or as binary arrays
+#  (see write_converted_data_to_binary_arrays), and index the text output while writing it (see inverted_index).
+#  The records can be ordered by timestamp or id across all the JSON files, see order_message_records.
+#  The statistics, the author table and the ids of the messages seen are kept by the pipeline,
+#  so iterating it again carries on from the earlier runs: duplicates stay dropped and counts add up.
+#
+#  Example:
+#  pipeline = Pipeline("/path/to/JSON Files")
+#  for line in pipeline:
+#      ...
+
+import os
+import sys
+from typing import Iterable, Iterator, Union
+
+from Functions.author_table import AuthorTable
+from Functions.binary_message_store import iterate_and_write_binary_message_store, \
+    iterate_data_from_binary_message_store, write_binary_message_store
+from Functions.build_conversation_windows import DEFAULT_CONTEXT_SIZE, DEFAULT_REPLY_LOOKBACK, \
+    format_conversation_window, iterate_conversation_windows
+from Functions.convert_data_to_required_format import convert_data_to_required_format, \
+    iterate_converted_data_as_json_records, iterate_converted_data_in_required_format, \
+    iterate_converted_data_with_records
+from Functions.get_data_from_discord_chat_exports_json_files import DEFAULT_MAXIMUM_READS, \
+    get_data_from_discord_chat_exports_json_files, iterate_data_from_discord_chat_exports_json_files
+from Functions.get_json_file_paths import DEFAULT_INCLUDE_PATTERNS, get_json_file_paths, iterate_json_file_paths
+from Functions.inverted_index import InvertedIndexBuilder, get_index_path, iterate_lines_and_build_index
+from Functions.iterate_converted_data_with_manifest_cache import iterate_converted_data_with_manifest_cache
+from Functions.json_backends import DEFAULT_JSON_BACKEND
+from Functions.message_filter import MessageFilter
+from Functions.message_id_index import MessageIdIndex
+from Functions.message_record import MessageColumns, MessageRecord
+from Functions.near_duplicate_filter import NearDuplicateFilter, iterate_records_without_near_duplicates
+from Functions.normalize_message_content import ContentNormalizer
+from Functions.open_atomic_output_file import DEFAULT_BUFFER_SIZE, get_compression_from_file_extension
+from Functions.order_message_records import DEFAULT_MEMORY_BUDGET, ORDER_KEYS, iterate_externally_sorted_records, \
+    iterate_merged_records, order_records
+from Functions.pipeline_instrumentation import StageTimer, iterate_timed
+from Functions.pipeline_statistics import PipelineStatistics
+from Functions.write_converted_data_to_binary_arrays import write_converted_data_to_binary_arrays
+from Functions.write_converted_data_to_sharded_text_files import write_converted_data_to_sharded_text_files
+from Functions.write_converted_data_to_text_file import write_converted_data_to_text_file
+
+# The defaults of the sharded output
+DEFAULT_NUMBER_OF_SHARDS = 8
+DEFAULT_SHARD_SIZE = 1000000
+
+# The formats of the output file
+OUTPUT_FORMATS = ("text", "jsonl", "binary")
+
+
+class Pipeline:
+    """
+    Finds, loads, converts and writes the messages of Discord Chat Exporter JSON files
+    """
+
+    def __init__(self, input_path: Union[str, Iterable] = None, is_verbose: bool = False, is_streaming: bool = True,
+                 workers: int = 1, chunksize: int = 1, cache_path: str = None, is_deduplicating: bool = False,
+                 store_path: str = None, from_store_path: str = None, is_recursive: bool = False,
+                 include_patterns: Iterable = DEFAULT_INCLUDE_PATTERNS, exclude_patterns: Iterable = (),
+                 sort_by: str = None, message_filter: MessageFilter = None, is_asynchronous: bool = False,
+                 maximum_reads: int = DEFAULT_MAXIMUM_READS, json_backend: str = DEFAULT_JSON_BACKEND,
+                 statistics: PipelineStatistics = None, is_timing_stages: bool = False,
+                 normalizer: ContentNormalizer = None, split_size: int = None,
+                 near_duplicate_filter: NearDuplicateFilter = None, near_duplicate_report_path: str = None,
+                 order_by: str = None, is_presorted: bool = False, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 spill_path: str = None):
+        """
+        :param input_path: The input folder path, or a list of them
+        :param is_verbose: If True, then show progress
+        :param is_streaming: If True, then every message flows through the steps one at a time,
+                             otherwise the data is collected into lists between the steps
+        :param workers: The number of worker processes parsing the JSON files
+        :param chunksize: The number of JSON files handed to a worker process at a time
+        :param cache_path: If given, the cache folder path, and only new or modified JSON files are converted
+        :param is_deduplicating: If True, then the messages whose id was already seen are dropped
+        :param store_path: If given, the parsed messages are also saved to a binary message store in this folder
+        :param from_store_path: If given, the messages are read from the binary message store in this folder
+                                instead of parsing the JSON files in the input folder
+        :param is_recursive: If True, then the JSON files are also searched for in the sub folders
+        :param include_patterns: The patterns of the JSON files to take
+        :param exclude_patterns: The patterns of the files and folders to skip
+        :param sort_by: If given, the JSON files are sorted by "name" or "size" before they are parsed
+        :param message_filter: If given, only the messages that match it are kept
+        :param is_asynchronous: If True, then the JSON files are read by an event loop with several reads in flight
+        :param maximum_reads: The number of JSON files read at the same time when asynchronous
+        :param json_backend: The backend that decodes whole JSON files, "auto" picks the fastest one that is installed
+        :param statistics: If given, everything is counted in it, otherwise a new one is used
+        :param is_timing_stages: If True, then the lazy steps are timed message by message
+        :param normalizer: If given, the message contents are normalized while they are converted
+        :param split_size: If given and there are more than 1 worker processes, then the JSON files at least
+                           this many bytes big are split into byte ranges of messages parsed by several workers
+        :param near_duplicate_filter: If given, the messages that are nearly the same as a recent message are dropped
+                                      between the loading and the conversion
+        :param near_duplicate_report_path: If given, the near duplicates dropped by the last run are written
+                                           to this file, one JSON object per line
+        :param order_by: If given, the records of all the JSON files are ordered by "timestamp" or "id"
+        :param is_presorted: If True, then the messages of every JSON file are sorted already, and the JSON files
+                             are streamed at the same time and merged, in this process whatever the workers,
+                             otherwise the records are ordered by an external merge sort,
+                             only with an order and while streaming
+        :param memory_budget: The number of bytes of records the external merge sort keeps in memory,
+                              and of posting lists the index keeps in memory
+        :param spill_path: The folder the external merge sort and the index spill their sorted runs to,
+                           the default temporary folder if None
+        """
+        if cache_path is not None and (is_deduplicating or store_path is not None or from_store_path is not None or
+                                       near_duplicate_filter is not None or order_by is not None):
+            raise ValueError("The cache cannot be combined with deduplication, near duplicate filtering, ordering "
+                             "or a binary message store, the cache only keeps the converted lines")
+        if order_by is not None and order_by not in ORDER_KEYS:
+            raise ValueError("Unknown order: " + order_by + ", expected one of " + ", ".join(ORDER_KEYS))
+        if memory_budget < 1:
+            raise ValueError("The memory budget must be at least 1 byte")
+        if is_presorted and order_by is None:
+            raise ValueError("The presorted JSON files are only merged when the messages are ordered")
+        if is_presorted and not (is_streaming or is_asynchronous or from_store_path is not None):
+            raise ValueError("The presorted JSON files are only merged while streaming, "
+                             "otherwise all the messages are loaded and sorted in memory")
+        if from_store_path is not None and message_filter is not None:
+            raise ValueError("The binary message store cannot be filtered, "
+                             "it does not keep the guilds, the channel names, the message types or the bots")
+        self.input_path = input_path
+        self.is_verbose = is_verbose
+        self.is_streaming = is_streaming
+        self.workers = workers
+        self.chunksize = chunksize
+        self.cache_path = cache_path
+        self.store_path = store_path
+        self.from_store_path = from_store_path
+        self.is_recursive = is_recursive
+        self.include_patterns = include_patterns
+        self.exclude_patterns = exclude_patterns
+        self.sort_by = sort_by
+        self.message_filter = message_filter
+        self.is_asynchronous = is_asynchronous
+        self.maximum_reads = maximum_reads
+        self.json_backend = json_backend
+        self.is_timing_stages = is_timing_stages
+        self.normalizer = normalizer
+        self.split_size = split_size
+        self.near_duplicate_filter = near_duplicate_filter
+        self.near_duplicate_report_path = near_duplicate_report_path
+        self.order_by = order_by
+        self.is_presorted = is_presorted
+        self.memory_budget = memory_budget
+        self.spill_path = spill_path
+        # Kept between the runs of the pipeline
+        self.statistics = PipelineStatistics() if statistics is None else statistics
+        # The ids of the messages seen so far, when deduplicating
+        self.message_id_index = MessageIdIndex() if is_deduplicating else None
+        # The message authors, the records only refer to them by index
+        self.author_table = AuthorTable()
+
+    @property
+    def is_lazy(self) -> bool:
+        """
+        :return: True if the lines are converted while they are iterated, instead of all at once
+        """
+        return self.is_streaming or self.is_asynchronous or self.cache_path is not None or \
+            self.from_store_path is not None
+
+    @property
+    def is_needing_record_details(self) -> bool:
+        """
+        :return: True if the steps of the pipeline need the channels, the timestamps or the replies of the messages
+        """
+        return self.order_by is not None or self.store_path is not None or self.near_duplicate_report_path is not None
+
+    def _timed(self, iterable: Iterable, stage_name: str) -> Iterable:
+        """
+        This function times a lazy step, if the stages are timed
+        :param iterable: The items of the step
+        :param stage_name: The name of the stage
+        :return: The items of the step
+        """
+        return iterate_timed(iterable, stage_name, self.statistics) if self.is_timing_stages else iterable
+
+    def get_json_file_paths(self) -> list:
+        """
+        This function gets the paths of all the JSON files at once
+        :return: A list of JSON file paths
+        """
+        if self.from_store_path is not None:
+            return []
+        return get_json_file_paths(self.input_path, self.is_verbose, self.is_recursive, self.include_patterns,
+                                   self.exclude_patterns, self.sort_by, self.statistics)
+
+    def iterate_json_file_paths(self) -> Iterator[str]:
+        """
+        This function yields the paths of the JSON files while the input folders are walked
+        :return: An iterator over the JSON file paths
+        """
+        if self.from_store_path is not None:
+            return iter(())
+        json_file_paths = iterate_json_file_paths(self.input_path, self.is_recursive, self.include_patterns,
+                                                  self.exclude_patterns, self.sort_by)
+        # The asynchronous loader walks the folders in its own thread, where the stages cannot be timed
+        if self.is_asynchronous:
+            return json_file_paths
+        return self._timed(json_file_paths, "discovery")
+
+    def iterate_records(self, json_file_paths: Iterable = None, details: bool = True) -> Iterator[MessageRecord]:
+        """
+        This function yields the records of the messages one at a time, in the order of the JSON files,
+        or of their timestamps or ids if the pipeline orders them
+        :param json_file_paths: If given, these JSON files are loaded instead of the ones in the input folders
+        :param details: If False and the steps of the pipeline do not need them, then (author index, content,
+                        message id) tuples are yielded instead of records, which are cheaper to load
+        :return: An iterator over message records, their author_index refers to the author table of the pipeline
+        """
+        if self.cache_path is not None:
+            raise ValueError("The cache only keeps the converted lines, not the records")
+        if json_file_paths is None and self.from_store_path is None:
+            json_file_paths = self.iterate_json_file_paths()
+        if self.from_store_path is not None:
+            records = self._timed(iterate_data_from_binary_message_store(self.from_store_path, self.author_table,
+                                                                         self.statistics, self.message_id_index),
+                                  "loading")
+            if self.order_by is not None and self.is_presorted:
+                # The store is a single stream, it is only checked to be sorted
+                records = iterate_merged_records([(self.from_store_path, records)], self.order_by)
+        elif self.order_by is not None and self.is_presorted:
+            # The JSON files are read at the same time, so every one of them is streamed instead of loaded whole
+            records = self._timed(iterate_merged_records(
+                [(json_file, self._timed(self._iterate_json_file_records(json_file), "loading"))
+                 for json_file in json_file_paths], self.order_by, self.spill_path), "ordering")
+        else:
+            records = self._timed(iterate_data_from_discord_chat_exports_json_files(
+                json_file_paths, self.is_verbose, streaming=self.is_streaming, workers=self.workers,
+                chunksize=self.chunksize, statistics=self.statistics, message_id_index=self.message_id_index,
+                author_table=self.author_table, message_filter=self.message_filter,
+                asynchronous=self.is_asynchronous, maximum_reads=self.maximum_reads, json_backend=self.json_backend,
+                split_size=self.split_size, details=details or self.is_needing_record_details), "loading")
+        if self.order_by is not None and not self.is_presorted:
+            records = self._timed(iterate_externally_sorted_records(
+                records, self.order_by, self.memory_budget, self.spill_path, self.is_verbose), "ordering")
+        if self.store_path is not None:
+            records = self._timed(
+                iterate_and_write_binary_message_store(records, self.store_path, self.author_table), "storing")
+        # The store keeps every message, so that the near duplicates can be looked for again with other settings
+        if self.near_duplicate_filter is not None:
+            records = self._timed(iterate_records_without_near_duplicates(
+                records, self.author_table, self.near_duplicate_filter, self.statistics,
+                self.near_duplicate_report_path), "near_duplicates")
+        return records
+
+    def _iterate_json_file_records(self, json_file: str) -> Iterator[MessageRecord]:
+        """
+        This function streams the records of a single JSON file, for the merge of the presorted JSON files
+        :param json_file: The JSON file path
+        :return: An iterator over message records
+        """
+        return iterate_data_from_discord_chat_exports_json_files(
+            [json_file], self.is_verbose, streaming=True, statistics=self.statistics,
+            message_id_index=self.message_id_index, author_table=self.author_table,
+            message_filter=self.message_filter, json_backend=self.json_backend)
+
+    def _iterate_cached_lines(self) -> Iterator[str]:
+        """
+        This function yields the converted lines, serving the JSON files that did not change from the cache
+        :return: An iterator over the converted lines
+        """
+        return self._timed(iterate_converted_data_with_manifest_cache(
+            self.iterate_json_file_paths(), self.cache_path, self.is_verbose, self.is_streaming,
+            statistics=self.statistics, message_filter=self.message_filter, json_backend=self.json_backend,
+            normalizer=self.normalizer), "cached_conversion")
+
+    def iterate_records_with_lines(self, json_file_paths: Iterable = None, details: bool = True) -> Iterator[tuple]:
+        """
+        This function yields every converted line with the record it came from, always one message at a time
+        :param json_file_paths: If given, these JSON files are loaded instead of the ones in the input folders
+        :param details: If False, then the records may be (author index, content, message id) tuples,
+                        see iterate_records
+        :return: An iterator over (message record, converted line) pairs, the record is None for cached lines
+        """
+        if self.cache_path is not None:
+            return ((None, line) for line in self._iterate_cached_lines())
+        return self._timed(iterate_converted_data_with_records(self.iterate_records(json_file_paths, details),
+                                                               self.author_table, self.statistics, self.normalizer),
+                           "conversion")
+
+    def iterate_json_records_with_records(self) -> Iterator[tuple]:
+        """
+        This function yields the JSON record of every message with the record it came from, one message at a time
+        :return: An iterator over (message record, JSON record without a line break) pairs
+        """
+        if self.cache_path is not None:
+            raise ValueError("The cache only keeps the converted lines, not the JSON records")
+        return self._timed(iterate_converted_data_as_json_records(self.iterate_records(), self.author_table,
+                                                                  self.statistics, self.normalizer,
+                                                                  self.json_backend), "conversion")
+
+    def iterate_json_records(self) -> Iterator[str]:
+        """
+        This function yields the JSON record of every message, see convert_data_to_required_format
+        :return: An iterator over the JSON records, without line breaks
+        """
+        return (json_record for _, json_record in self.iterate_json_records_with_records())
+
+    def get_lines(self) -> list:
+        """
+        This function gets all the converted lines at once, every step is done for all the messages before the next
+        :return: A list of converted lines
+        """
+        raw_data_list = get_data_from_discord_chat_exports_json_files(
+            self.get_json_file_paths(), self.is_verbose, workers=self.workers, chunksize=self.chunksize,
+            statistics=self.statistics, message_id_index=self.message_id_index, author_table=self.author_table,
+            message_filter=self.message_filter, asynchronous=self.is_asynchronous,
+            maximum_reads=self.maximum_reads, json_backend=self.json_backend, split_size=self.split_size,
+            details=self.is_needing_record_details)
+        if self.order_by is not None:
+            # Every record is in memory already
+            with StageTimer("ordering", self.statistics):
+                order_records(raw_data_list, self.order_by)
+        # Save the parsed messages for later runs
+        if self.store_path is not None:
+            with StageTimer("storing", self.statistics):
+                write_binary_message_store(raw_data_list, self.store_path, self.author_table)
+        if self.near_duplicate_filter is not None:
+            with StageTimer("near_duplicates", self.statistics):
+                records = iterate_records_without_near_duplicates(
+                    raw_data_list, self.author_table, self.near_duplicate_filter, self.statistics,
+                    self.near_duplicate_report_path)
+                raw_data_list = MessageColumns(raw_data_list.details)
+                raw_data_list.extend(records)
+            if self.is_verbose:
+                print("----------------------------------------")
+                print("Number of near duplicate messages dropped: " + str(self.statistics.near_duplicates_dropped))
+        return convert_data_to_required_format(raw_data_list, self.is_verbose, self.author_table, self.statistics,
+                                               self.normalizer)
+
+    def iterate_lines(self) -> Iterator[str]:
+        """
+        This function yields the converted lines, the output file has every one of them followed by a line break
+        :return: An iterator over the converted lines
+        """
+        if self.cache_path is not None:
+            return self._iterate_cached_lines()
+        if self.is_lazy:
+            return self._timed(iterate_converted_data_in_required_format(self.iterate_records(details=False),
+                                                                         self.author_table, self.statistics,
+                                                                         self.normalizer), "conversion")
+        return iter(self.get_lines())
+
+    def __iter__(self) -> Iterator[str]:
+        return self.iterate_lines()
+
+    def iterate_conversation_windows(self, context_size: int = DEFAULT_CONTEXT_SIZE,
+                                     reply_lookback: int = DEFAULT_REPLY_LOOKBACK) -> Iterator[dict]:
+        """
+        This function yields the context/response windows of the conversations, see build_conversation_windows
+        :param context_size: The number of turns before the response in a window
+        :param reply_lookback: The number of messages of every channel that replies can be followed to
+        :return: An iterator over the windows
+        """
+        if self.cache_path is not None:
+            raise ValueError("The cache cannot be combined with the conversation windows, "
+                             "the cache only keeps the converted lines")
+        return self._timed(iterate_conversation_windows(self.iterate_records(), self.author_table, context_size,
+                                                        reply_lookback, self.statistics, self.normalizer),
+                           "windowing")
+
+    def write_conversation_windows(self, output_path: str, context_size: int = DEFAULT_CONTEXT_SIZE,
+                                   reply_lookback: int = DEFAULT_REPLY_LOOKBACK, compression: str = "auto",
+                                   buffer_size: int = DEFAULT_BUFFER_SIZE) -> None:
+        """
+        This function writes the context/response windows of the conversations to an output file, one JSON per line
+        :param output_path: The output file path
+        :param context_size: The number of turns before the response in a window
+        :param reply_lookback: The number of messages of every channel that replies can be followed to
+        :param compression: The compression of the output file, "auto" picks it from the file extension
+        :param buffer_size: The size of the output write buffers in bytes
+        :return: None
+        """
+        write_converted_data_to_text_file(
+            (format_conversation_window(window, self.json_backend)
+             for window in self.iterate_conversation_windows(context_size, reply_lookback)),
+            output_path, self.is_verbose, self.statistics, compression, buffer_size)
+
+    def write(self, output_path: str, compression: str = "auto", buffer_size: int = DEFAULT_BUFFER_SIZE,
+              shard_by: str = None, number_of_shards: int = DEFAULT_NUMBER_OF_SHARDS,
+              shard_size: int = DEFAULT_SHARD_SIZE, output_format: str = "text", is_indexing: bool = False) -> None:
+        """
+        This function writes the converted lines to an output file, or to shard files
+        :param output_path: The output file path
+        :param compression: The compression of the output file, "auto" picks it from the file extension
+        :param buffer_size: The size of the output write buffers in bytes
+        :param shard_by: If given, the output is split into shard files by "lines", "size", "author" or "channel"
+        :param number_of_shards: The number of shard files when sharding by author or channel
+        :param shard_size: The number of lines, or bytes when sharding by size, after which a new shard is started
+        :param output_format: "text" for the converted lines, "jsonl" for a JSON record per message,
+                              or "binary" for the converted lines as a blob and an array of offsets
+        :param is_indexing: If True, then an inverted index of the terms and the authors of the lines
+                            is written next to the text output file, see inverted_index
+        :return: None
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError("Unknown output format: " + output_format + ", expected one of " +
+                             ", ".join(OUTPUT_FORMATS))
+        if is_indexing:
+            self._write_indexed(output_path, compression, buffer_size, shard_by, output_format)
+            return
+        if self.cache_path is not None and shard_by in ("author", "channel"):
+            raise ValueError("The cache cannot be combined with sharding by author or channel, "
+                             "the cache only keeps the converted lines")
+        if output_format == "binary":
+            if shard_by is not None:
+                raise ValueError("The binary output cannot be sharded")
+            if compression not in ("auto", "none"):
+                raise ValueError("The binary output cannot be compressed, it could not be memory mapped")
+            write_converted_data_to_binary_arrays(self.iterate_lines(), output_path, self.is_verbose,
+                                                  self.statistics, buffer_size)
+        elif output_format == "jsonl":
+            if shard_by is not None:
+                write_converted_data_to_sharded_text_files(
+                    self.iterate_json_records_with_records(), output_path, self.is_verbose, shard_by,
+                    number_of_shards, shard_size, self.statistics, compression, buffer_size)
+            else:
+                write_converted_data_to_text_file(self.iterate_json_records(), output_path, self.is_verbose,
+                                                  self.statistics, compression, buffer_size)
+        elif shard_by is not None:
+            # The shard writer needs the records to tell the author or the channel of a line
+            write_converted_data_to_sharded_text_files(
+                self.iterate_records_with_lines(details=shard_by in ("author", "channel")), output_path,
+                self.is_verbose, shard_by, number_of_shards, shard_size, self.statistics, compression, buffer_size)
+        else:
+            write_converted_data_to_text_file(self.iterate_lines(), output_path, self.is_verbose, self.statistics,
+                                              compression, buffer_size)
+
+    def _write_indexed(self, output_path: str, compression: str, buffer_size: int, shard_by: str,
+                       output_format: str) -> None:
+        """
+        This function writes the converted lines to a text file, and the inverted index of the lines next to it
+        :param output_path: The output file path
+        :param compression: The compression of the output file, only "auto" without a compressed extension or "none"
+        :param buffer_size: The size of the output write buffers in bytes
+        :param shard_by: Must be None, the shards are not indexed
+        :param output_format: Must be "text"
+        :return: None
+        """
+        if output_format != "text" or shard_by is not None:
+            raise ValueError("Only the text output can be indexed, and only when it is not sharded")
+        if (get_compression_from_file_extension(output_path) if compression == "auto" else compression) != "none":
+            raise ValueError("The indexed output cannot be compressed, the lines are found by seeking to them")
+        if self.cache_path is not None:
+            raise ValueError("The cache cannot be combined with the index, the cache does not keep the authors")
+        builder = InvertedIndexBuilder(self.author_table, self.memory_budget, self.spill_path)
+        index_path = get_index_path(output_path)
+        try:
+            write_converted_data_to_text_file(
+                self._timed(iterate_lines_and_build_index(self.iterate_records_with_lines(details=False), builder),
+                            "indexing"),
+                output_path, self.is_verbose, self.statistics, "none", buffer_size)
+            with StageTimer("indexing", self.statistics) as stage_timer:
+                number_of_keys = builder.write(index_path, buffer_size)
+        finally:
+            builder.close()
+        if self.is_verbose:
+            print("----------------------------------------")
+            print("Index file path: " + index_path)
+            print("Number of indexed lines: " + str(builder.number_of_lines))
+            print("Number of index keys: " + str(number_of_keys))
+            print("Index file size: " + str(os.path.getsize(index_path)) + " bytes")
+            print("Total time taken to write the index: {} seconds".format(stage_timer.seconds))
+
+
+def main(input_path: Union[str, list], verbose: bool = False) -> None:
+    """
+    This function prints the converted lines of the JSON files in a folder
+    :param input_path: The input folder path, or a list of them
+    :param verbose: If True, then show progress
+    :return: None
+    """
+    for line in Pipeline(input_path, verbose):
+        print(line)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    is_verbose = False
+
+    if '-v' in args or '--verbose' in args:
+        is_verbose = True
+        args = [arg for arg in args if arg not in ('-v', '--verbose')]
+    if len(args) < 1:
+        print("Usage: " + sys.argv[0] + " [-v] <input_folder_path> [<input_folder_path> ...]")
+        sys.exit(1)
+
+    main(args if len(args) > 1 else args[0], is_verbose)
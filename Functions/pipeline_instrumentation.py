@@ -0,0 +1,165 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Times the stages of the pipeline with perf_counter, and runs it under cProfile and tracemalloc on demand.
+#  When the steps are chained as generators, the writer pulls the lines from the converter, which pulls
+#  the records from the loader, so the time of a stage includes the stages it pulls from.
+#  Every running stage is kept on a stack in the statistics, and the time spent in a nested stage
+#  is taken off the stage around it, so the stage times add up to the time of the run.
+
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+from Functions.pipeline_statistics import PipelineStatistics
+
+# The number of functions and allocation sites printed in verbose mode
+NUMBER_OF_TOP_ENTRIES = 15
+
+
+class StageTimer:
+    """
+    Times a stage of the pipeline, used as a context manager
+    """
+
+    def __init__(self, stage_name: str, statistics: PipelineStatistics = None):
+        """
+        :param stage_name: The name of the stage, e.g. "loading"
+        :param statistics: If given, the time not spent in nested stages is added to it
+        """
+        self.stage_name = stage_name
+        self.statistics = statistics
+        self.start_time = 0.0
+        # The time of the stage, including the nested stages
+        self.seconds = 0.0
+
+    def __enter__(self) -> "StageTimer":
+        if self.statistics is not None:
+            self.statistics.stage_stack.append(0.0)
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.seconds = time.perf_counter() - self.start_time
+        if self.statistics is not None:
+            _pop_stage(self.statistics, self.stage_name, self.seconds)
+
+
+def _pop_stage(statistics: PipelineStatistics, stage_name: str, seconds: float) -> None:
+    """
+    This function ends a stage: its own time is recorded, and its whole time is taken off the stage around it
+    :param statistics: The statistics of the run
+    :param stage_name: The name of the stage
+    :param seconds: The time of the stage, including the nested stages
+    :return: None
+    """
+    stage_stack = statistics.stage_stack
+    nested_seconds = stage_stack.pop()
+    statistics.record_stage(stage_name, seconds - nested_seconds)
+    if stage_stack:
+        stage_stack[-1] += seconds
+
+
+def iterate_timed(iterable: Iterable, stage_name: str, statistics: PipelineStatistics) -> Iterator:
+    """
+    This function times the items of a lazy stage as they are pulled from it
+    :param iterable: The items of the stage, e.g. the generator of the converted lines
+    :param stage_name: The name of the stage
+    :param statistics: The statistics the time is added to
+    :return: An iterator of the same items
+    """
+    iterator = iter(iterable)
+    stage_stack = statistics.stage_stack
+    perf_counter = time.perf_counter
+    # The time is only added up here, and recorded once the stage is over
+    own_seconds = 0.0
+    try:
+        while True:
+            stage_stack.append(0.0)
+            start_time = perf_counter()
+            try:
+                item = next(iterator)
+            finally:
+                seconds = perf_counter() - start_time
+                own_seconds += seconds - stage_stack.pop()
+                if stage_stack:
+                    stage_stack[-1] += seconds
+            yield item
+    except StopIteration:
+        return
+    finally:
+        statistics.record_stage(stage_name, own_seconds)
+
+
+def format_average(seconds: float, count: int) -> str:
+    """
+    This function formats the average time per item, for the verbose reports
+    :param seconds: The total time in seconds
+    :param count: The number of items
+    :return: The average time, or "n/a" if there were no items
+    """
+    if count == 0:
+        return "n/a"
+    average = seconds / count
+    if average >= 0.01:
+        return str(round(average, 2)) + " seconds"
+    return str(round(average * 1000000, 2)) + " microseconds"
+
+
+@contextmanager
+def profile_pipeline(statistics: PipelineStatistics, profile_path: str = None, is_tracing_memory: bool = False,
+                     is_verbose: bool = False) -> Iterator:
+    """
+    This function runs a block under cProfile and/or tracemalloc, only the current process is profiled
+    :param statistics: The statistics the peak memory is recorded to
+    :param profile_path: If given, the cProfile statistics are dumped to this file, readable with pstats
+    :param is_tracing_memory: True to trace the memory allocations, and record the peak memory
+    :param is_verbose: True to print the slowest functions and the largest allocation sites
+    :return: A context manager
+    """
+    profiler = None
+    if is_tracing_memory:
+        tracemalloc.start()
+    if profile_path is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+            if is_verbose:
+                stream = io.StringIO()
+                pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(NUMBER_OF_TOP_ENTRIES)
+                print("----------------------------------------")
+                print("Profile saved to " + profile_path)
+                print(stream.getvalue().strip())
+        if is_tracing_memory:
+            _, statistics.peak_memory_bytes = tracemalloc.get_traced_memory()
+            if is_verbose:
+                print("----------------------------------------")
+                print("Peak memory: " + str(round(statistics.peak_memory_bytes / 1000000, 1)) + " MB")
+                print("Largest allocation sites still held:")
+                for line in tracemalloc.take_snapshot().statistics("lineno")[:NUMBER_OF_TOP_ENTRIES]:
+                    print("  " + str(line))
+            tracemalloc.stop()
@@ -0,0 +1,324 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Collects the statistics of a run while the records stream through the steps.
+#  Every counter is updated once per file, message or line, so the whole report
+#  costs O(n) no matter how many authors there are.
+#  The time spent in every stage is added up too, see pipeline_instrumentation.
+#  The summary can be written as JSON or in the Prometheus text format.
+
+import copy
+import json
+from collections import Counter
+
+# The prefix of the Prometheus metric names
+PROMETHEUS_PREFIX = "data_manager_"
+SUMMARY_FORMATS = ("auto", "json", "prometheus")
+# The counters of the loader, the converter and the writer, see save_counters
+_COUNTER_NAMES = ("files_loaded", "files_served_from_cache", "bytes_in", "messages_per_author", "duplicates_dropped",
+                  "near_duplicates_dropped", "lines_converted", "messages_split", "empty_lines_dropped",
+                  "empty_messages_dropped", "lines_written", "bytes_out")
+
+
+class PipelineStatistics:
+    """
+    The counters of a run, updated by the loader, the converter and the writer
+    """
+
+    def __init__(self):
+        # Loader
+        self.files_loaded = 0
+        self.files_served_from_cache = 0
+        self.bytes_in = 0
+        self.messages_per_author = Counter()
+        self.duplicates_dropped = 0
+        self.near_duplicates_dropped = 0
+        # Converter
+        self.lines_converted = 0
+        self.messages_split = 0
+        self.empty_lines_dropped = 0
+        self.empty_messages_dropped = 0
+        # Writer
+        self.lines_written = 0
+        self.bytes_out = 0
+        # Instrumentation
+        self.stage_seconds = {}
+        self.run_seconds = 0.0
+        self.peak_memory_bytes = None
+        # The time spent in the nested stages of every running stage, see pipeline_instrumentation
+        self.stage_stack = []
+
+    @property
+    def number_of_messages(self) -> int:
+        """
+        :return: The number of messages loaded
+        """
+        return sum(self.messages_per_author.values())
+
+    def record_file(self, size: int, is_cached: bool = False) -> None:
+        """
+        This function counts a JSON file
+        :param size: The size of the JSON file in bytes
+        :param is_cached: If True, then the converted lines of the file came from the cache
+        :return: None
+        """
+        self.files_loaded += 1
+        self.bytes_in += size
+        if is_cached:
+            self.files_served_from_cache += 1
+
+    def record_message(self, message_author: str) -> None:
+        """
+        This function counts a message
+        :param message_author: The message author
+        :return: None
+        """
+        self.messages_per_author[message_author] += 1
+
+    def record_duplicate(self) -> None:
+        """
+        This function counts a message that was dropped because its id was already seen
+        :return: None
+        """
+        self.duplicates_dropped += 1
+
+    def record_near_duplicate(self) -> None:
+        """
+        This function counts a message that was dropped because it was nearly the same as a recent message
+        :return: None
+        """
+        self.near_duplicates_dropped += 1
+
+    def record_conversion(self, number_of_lines: int, number_of_empty_lines: int) -> None:
+        """
+        This function counts the lines a message was converted into
+        :param number_of_lines: The number of lines that were kept
+        :param number_of_empty_lines: The number of empty lines that were dropped
+        :return: None
+        """
+        self.lines_converted += number_of_lines
+        self.empty_lines_dropped += number_of_empty_lines
+        if number_of_lines == 0:
+            self.empty_messages_dropped += 1
+        elif number_of_lines > 1:
+            self.messages_split += 1
+
+    def get_message_counts(self) -> dict:
+        """
+        This function gets the counters of the messages and of their lines, which the cache keeps for every JSON file
+        :return: The counters, as plain JSON values
+        """
+        return {
+            "messages_per_author": dict(self.messages_per_author),
+            "lines_converted": self.lines_converted,
+            "messages_split": self.messages_split,
+            "empty_lines_dropped": self.empty_lines_dropped,
+            "empty_messages_dropped": self.empty_messages_dropped
+        }
+
+    def add_message_counts(self, message_counts: dict) -> None:
+        """
+        This function adds the counters of the messages of a JSON file served from the cache
+        :param message_counts: The counters, from get_message_counts
+        :return: None
+        """
+        self.messages_per_author.update(message_counts["messages_per_author"])
+        self.lines_converted += message_counts["lines_converted"]
+        self.messages_split += message_counts["messages_split"]
+        self.empty_lines_dropped += message_counts["empty_lines_dropped"]
+        self.empty_messages_dropped += message_counts["empty_messages_dropped"]
+
+    def save_counters(self) -> dict:
+        """
+        This function saves the counters of the loader, the converter and the writer, the stage times are left out
+        :return: A copy of the counters, for restore_counters
+        """
+        return {name: copy.copy(getattr(self, name)) for name in _COUNTER_NAMES}
+
+    def restore_counters(self, counters: dict) -> None:
+        """
+        This function takes the counters back to the ones saved, when the files counted since then were not written
+        :param counters: The counters, from save_counters
+        :return: None
+        """
+        for name, value in counters.items():
+            setattr(self, name, value)
+
+    def record_output(self, number_of_lines: int, size: int) -> None:
+        """
+        This function counts the written output
+        :param number_of_lines: The number of lines written
+        :param size: The size of the output in bytes
+        :return: None
+        """
+        self.lines_written += number_of_lines
+        self.bytes_out += size
+
+    def record_stage(self, stage_name: str, seconds: float) -> None:
+        """
+        This function adds the time spent in a stage, not counting the stages it pulled its data from
+        :param stage_name: The name of the stage, e.g. "loading"
+        :param seconds: The time in seconds
+        :return: None
+        """
+        self.stage_seconds[stage_name] = self.stage_seconds.get(stage_name, 0.0) + seconds
+
+    def record_run(self, seconds: float) -> None:
+        """
+        This function sets the time the whole run took
+        :param seconds: The time in seconds
+        :return: None
+        """
+        self.run_seconds = seconds
+
+    def print_loading_report(self) -> None:
+        """
+        This function prints the statistics of the loaded messages
+        :return: None
+        """
+        number_of_messages = self.number_of_messages
+        number_of_authors = len(self.messages_per_author)
+        # print the number of authors
+        print("Number of authors: " + str(number_of_authors))
+        # print the number of messages
+        print("Number of messages: " + str(number_of_messages))
+        print("Number of duplicate messages dropped: " + str(self.duplicates_dropped))
+        print("Number of near duplicate messages dropped: " + str(self.near_duplicates_dropped))
+        # print the authors
+        authors_list = sorted(self.messages_per_author)
+        print("Authors: " + str(authors_list))
+        print("----------------------------------------")
+        # print the number of messages per author
+        for author in authors_list:
+            print("Number of messages from " + author + ": " + str(self.messages_per_author[author]))
+        print("----------------------------------------")
+        if number_of_authors > 0:
+            print("Average number of messages per author: " + str(number_of_messages / number_of_authors))
+
+    def print_conversion_report(self) -> None:
+        """
+        This function prints the statistics of the converted lines
+        :return: None
+        """
+        number_of_authors = len(self.messages_per_author)
+        # Print the number of lines removed
+        print("Number of lines removed: " + str(self.empty_lines_dropped))
+        print("Number of empty messages removed: " + str(self.empty_messages_dropped))
+        print("Number of messages split into multiple lines: " + str(self.messages_split))
+        # Print the number of lines removed per author
+        if number_of_authors > 0:
+            print("Number of lines removed per author: " + str(self.empty_lines_dropped / number_of_authors))
+
+    def print_stage_report(self) -> None:
+        """
+        This function prints the time spent in every stage, and its share of the run
+        :return: None
+        """
+        for stage_name, seconds in self.stage_seconds.items():
+            share = " ({}%)".format(round(seconds / self.run_seconds * 100, 1)) if self.run_seconds > 0 else ""
+            print("Time spent in {}: {} seconds{}".format(stage_name, round(seconds, 3), share))
+
+    def to_dict(self) -> dict:
+        """
+        This function gets the machine readable summary of the statistics
+        :return: The summary
+        """
+        return {
+            "files_loaded": self.files_loaded,
+            "files_served_from_cache": self.files_served_from_cache,
+            "bytes_in": self.bytes_in,
+            "messages": self.number_of_messages,
+            "authors": len(self.messages_per_author),
+            "messages_per_author": dict(sorted(self.messages_per_author.items())),
+            "duplicates_dropped": self.duplicates_dropped,
+            "near_duplicates_dropped": self.near_duplicates_dropped,
+            "lines_converted": self.lines_converted,
+            "messages_split": self.messages_split,
+            "empty_lines_dropped": self.empty_lines_dropped,
+            "empty_messages_dropped": self.empty_messages_dropped,
+            "lines_written": self.lines_written,
+            "bytes_out": self.bytes_out,
+            "stage_seconds": dict(self.stage_seconds),
+            "run_seconds": self.run_seconds,
+            "peak_memory_bytes": self.peak_memory_bytes
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        This function gets the summary of the statistics in the Prometheus text format,
+        the messages per author are left out so that the number of series stays small
+        :return: The summary
+        """
+        metrics = [
+            ("files_loaded_total", "counter", "JSON files loaded", self.files_loaded),
+            ("files_served_from_cache_total", "counter", "JSON files served from the cache",
+             self.files_served_from_cache),
+            ("input_bytes_total", "counter", "Bytes of JSON read", self.bytes_in),
+            ("messages_total", "counter", "Messages loaded", self.number_of_messages),
+            ("authors", "gauge", "Message authors", len(self.messages_per_author)),
+            ("duplicates_dropped_total", "counter", "Duplicate messages dropped", self.duplicates_dropped),
+            ("near_duplicates_dropped_total", "counter", "Near duplicate messages dropped",
+             self.near_duplicates_dropped),
+            ("lines_converted_total", "counter", "Lines converted", self.lines_converted),
+            ("messages_split_total", "counter", "Messages split into multiple lines", self.messages_split),
+            ("empty_lines_dropped_total", "counter", "Empty lines dropped", self.empty_lines_dropped),
+            ("empty_messages_dropped_total", "counter", "Empty messages dropped", self.empty_messages_dropped),
+            ("lines_written_total", "counter", "Lines written", self.lines_written),
+            ("output_bytes_total", "counter", "Bytes written", self.bytes_out),
+            ("run_seconds", "gauge", "Time the whole run took", self.run_seconds),
+        ]
+        if self.peak_memory_bytes is not None:
+            metrics.append(("peak_memory_bytes", "gauge", "Peak memory traced by tracemalloc",
+                            self.peak_memory_bytes))
+        lines = []
+        for name, metric_type, description, value in metrics:
+            lines.append("# HELP " + PROMETHEUS_PREFIX + name + " " + description)
+            lines.append("# TYPE " + PROMETHEUS_PREFIX + name + " " + metric_type)
+            lines.append(PROMETHEUS_PREFIX + name + " " + str(value))
+        lines.append("# HELP " + PROMETHEUS_PREFIX + "stage_seconds Time spent in a stage of the pipeline")
+        lines.append("# TYPE " + PROMETHEUS_PREFIX + "stage_seconds gauge")
+        for stage_name, seconds in self.stage_seconds.items():
+            lines.append(PROMETHEUS_PREFIX + 'stage_seconds{stage="' + stage_name + '"} ' + str(seconds))
+        return "\n".join(lines) + "\n"
+
+    def write_json_summary(self, summary_path: str) -> None:
+        """
+        This function writes the machine readable summary of the statistics to a JSON file
+        :param summary_path: The JSON file path
+        :return: None
+        """
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+    def write_summary(self, summary_path: str, summary_format: str = "auto") -> None:
+        """
+        This function writes the machine readable summary of the statistics to a file
+        :param summary_path: The file path
+        :param summary_format: "json", "prometheus", or "auto" for prometheus if the file ends with .prom
+        :return: None
+        """
+        if summary_format not in SUMMARY_FORMATS:
+            raise ValueError("Unknown summary format: " + summary_format + ", expected one of " +
+                             ", ".join(SUMMARY_FORMATS))
+        if summary_format == "auto":
+            summary_format = "prometheus" if summary_path.endswith(".prom") else "json"
+        if summary_format == "json":
+            self.write_json_summary(summary_path)
+        else:
+            with open(summary_path, "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
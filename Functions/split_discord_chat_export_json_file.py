@@ -0,0 +1,132 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Splits the "messages" array of a big JSON file exported via Discord Chat Exporter into byte ranges
+#  of whole messages, so that the ranges of a single file can be decoded by several worker processes.
+#  Discord Chat Exporter indents its JSON files, and JSON strings cannot hold a raw line break,
+#  so every line break of the file is between two tokens. The messages are the only objects
+#  that start a line at the indentation of the first message, so the start of a message is found
+#  with a plain search of the memory mapped file for a line break, that indentation and "{".
+#  The file is only searched from every multiple of the split size to the next message, never parsed,
+#  so splitting a file of a few gigabytes takes milliseconds.
+#  A range goes from the "{" of its first message to the "}" of its last one, without the comma after it,
+#  and is decoded as a JSON array by wrapping it in "[" and "]".
+#  The files that are not indented like this, e.g. written on a single line, cannot be split,
+#  and are left to the loaders that decode whole files.
+
+import mmap
+import os
+import re
+import sys
+
+from Functions.json_backends import DEFAULT_JSON_BACKEND, loads_json
+
+# The number of bytes of messages in a range, the files at least this big are split
+DEFAULT_SPLIT_SIZE = 64 * 1024 * 1024
+# The number of bytes at the start of a file the "messages" key is searched in, the header is never bigger
+_HEADER_SEARCH_SIZE = 1024 * 1024
+
+# The "messages" key at the start of a line, followed by the line of the first message,
+# captures the indentation of the key and of the messages
+_MESSAGES_START_PATTERN = re.compile(rb'\n([ \t]*)"messages"[ \t]*:[ \t]*\[[ \t]*\r?\n([ \t]*)\{')
+
+
+def find_message_ranges(json_file_path: str, split_size: int = DEFAULT_SPLIT_SIZE) -> list:
+    """
+    This function splits the messages of a JSON file into byte ranges of whole messages
+    :param json_file_path: The JSON file path
+    :param split_size: The number of bytes of messages in a range, the last range can be smaller
+    :return: A list of (start, stop) byte offsets in the order of the messages,
+             or None if the file is not indented like Discord Chat Exporter does or has no messages
+    """
+    if split_size < 1:
+        raise ValueError("The split size must be at least 1 byte")
+    with open(json_file_path, "rb") as f:
+        # Empty files cannot be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            match = _MESSAGES_START_PATTERN.search(mapped_file, 0, _HEADER_SEARCH_SIZE)
+            if match is None:
+                return None
+            key_indentation, message_indentation = match.group(1), match.group(2)
+            # The messages are indented deeper than the key, otherwise the objects inside them could match too
+            if len(message_indentation) <= len(key_indentation) or \
+                    not message_indentation.startswith(key_indentation):
+                return None
+            first_message_start = match.end() - 1
+            # The "]" of the messages is the last one at the indentation of the key, only values follow it
+            messages_stop = mapped_file.rfind(b"\n" + key_indentation + b"]", first_message_start)
+            if messages_stop == -1:
+                return None
+            message_separator = b"\n" + message_indentation + b"{"
+            ranges = []
+            start = first_message_start
+            while True:
+                # The first message that starts after the split size, the line break is not part of it
+                next_start = mapped_file.find(message_separator, start + split_size, messages_stop)
+                if next_start == -1:
+                    break
+                next_start += 1
+                # The range stops before the comma between the two messages
+                ranges.append((start, mapped_file.rfind(b",", start, next_start)))
+                start = next_start
+            ranges.append((start, mapped_file.rfind(b"}", start, messages_stop) + 1))
+            return ranges
+
+
+def decode_message_range(json_file_path: str, start: int, stop: int,
+                         json_backend: str = DEFAULT_JSON_BACKEND) -> list:
+    """
+    This function decodes the messages of a byte range found by find_message_ranges
+    :param json_file_path: The JSON file path
+    :param start: The offset of the "{" of the first message
+    :param stop: The offset after the "}" of the last message
+    :param json_backend: "auto", "orjson", "simdjson" or "json"
+    :return: The list of message objects
+    """
+    with open(json_file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            # Only the pages of the range are read, the brackets make it a JSON array
+            return loads_json(b"[" + mapped_file[start:stop] + b"]", json_backend)
+
+
+def main(json_file_path: str, split_size: int = DEFAULT_SPLIT_SIZE) -> None:
+    """
+    This function prints the byte ranges of the messages of a JSON file and the number of messages in them
+    :param json_file_path: The JSON file path
+    :param split_size: The number of bytes of messages in a range
+    :return: None
+    """
+    ranges = find_message_ranges(json_file_path, split_size)
+    if ranges is None:
+        print("The JSON file cannot be split: " + json_file_path)
+        return
+    for start, stop in ranges:
+        print(str(start) + "-" + str(stop) + ": " + str(len(decode_message_range(json_file_path, start, stop))) +
+              " messages")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+
+    if len(args) < 1:
+        print("Usage: " + sys.argv[0] + " <json_file_path> [<split_size>]")
+        sys.exit(1)
+
+    main(args[0], int(args[1]) if len(args) > 1 else DEFAULT_SPLIT_SIZE)
@@ -0,0 +1,215 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Streams the messages out of a JSON file exported via Discord Chat Exporter
+#  one message at a time, without loading the whole document into memory.
+#  The file is read in fixed size chunks and only the top level object is walked
+#  by hand. Every value (the guild, the channel, each message, ...) is decoded
+#  on its own with json.JSONDecoder.raw_decode, so at any time only the current
+#  chunk and the current message are held in memory.
+
+import json
+import os
+import re
+import sys
+from typing import Callable, Iterator
+
+# The number of characters read from the file at a time
+DEFAULT_READ_SIZE = 1024 * 1024
+# The number of characters of a single value (a message, the guild, ...) after which the file is taken as malformed
+# instead of reading on, a message with all its embeds and attachments is a few kilobytes
+MAXIMUM_VALUE_SIZE = 64 * 1024 * 1024
+
+# A decoding error this close to the end of the buffer can be a token cut off by the chunk, like a \uXXXX escape
+_CUT_OFF_SIZE = 16
+
+# Matches the whitespace allowed between JSON tokens
+_WHITESPACE_PATTERN = re.compile(r"[ \t\n\r]*")
+
+
+class _JsonStream:
+    """
+    A chunked reader over a JSON text file that can decode one value at a time
+    """
+
+    def __init__(self, file, read_size: int):
+        """
+        :param file: A file opened in text mode
+        :param read_size: The number of characters read from the file at a time
+        """
+        self.file = file
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.is_exhausted = False
+
+    def _read_more(self) -> bool:
+        """
+        This function reads the next chunk of the file into the buffer
+        :return: False if the end of the file was reached, otherwise True
+        """
+        chunk = self.file.read(self.read_size)
+        if chunk == "":
+            self.is_exhausted = True
+            return False
+        # Drop the part of the buffer that was already consumed,
+        # so that the buffer never grows with the size of the file
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        This function skips the whitespace and returns the next character
+        :return: The next character, or an empty string at the end of the file
+        """
+        while True:
+            self.position = _WHITESPACE_PATTERN.match(
+                self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._read_more():
+                return ""
+
+    def expect(self, character: str) -> None:
+        """
+        This function consumes the next character and checks that it is the expected one
+        :param character: The expected character
+        :return: None
+        """
+        found = self.peek()
+        if found != character:
+            raise ValueError("Expected '" + character + "' but found '" + found + "' in " + str(self.file.name))
+        self.position += 1
+
+    def decode_value(self):
+        """
+        This function decodes the next JSON value, reading more of the file until it is complete
+        :return: The decoded value
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError as error:
+                # The value is most likely cut off at the end of the buffer, read on unless the error is
+                # somewhere before it or the value got too big to be anything but a malformed file
+                is_cut_off = error.pos >= len(self.buffer) - _CUT_OFF_SIZE or \
+                    error.msg.startswith("Unterminated string")
+                if not is_cut_off or not self._read_more():
+                    raise
+                if len(self.buffer) - self.position > MAXIMUM_VALUE_SIZE:
+                    raise ValueError("A value of " + str(self.file.name) + " is longer than " +
+                                     str(MAXIMUM_VALUE_SIZE) + " characters, the file is most likely malformed")
+                continue
+            # A number at the very end of the buffer might continue in the next chunk
+            if end == len(self.buffer) and not self.is_exhausted and self._read_more():
+                continue
+            self.position = end
+            return value
+
+
+def stream_messages_from_discord_chat_export_json_file(json_file_path: str, header: dict = None,
+                                                       read_size: int = DEFAULT_READ_SIZE,
+                                                       accept_header: Callable = None) -> Iterator[dict]:
+    """
+    This function streams the messages from a JSON file one message at a time
+    :param json_file_path: The JSON file path
+    :param header: If given, it is filled with the other top level values (guild, channel, dateRange, ...)
+    :param read_size: The number of characters read from the file at a time
+    :param accept_header: If given, it is called with the top level values that come before the messages,
+                          and if it returns False, then the file is closed without decoding any message
+    :return: An iterator over the message objects
+    """
+    if header is None and accept_header is not None:
+        header = {}
+    # Open the JSON file
+    with open(json_file_path, "r", encoding="utf-8") as f:
+        stream = _JsonStream(f, read_size)
+        # The export is a single object
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        # Loop through the top level keys
+        while True:
+            key = stream.decode_value()
+            stream.expect(":")
+            if key == "messages":
+                if accept_header is not None and not accept_header(header):
+                    return
+                # Walk the messages array one message at a time
+                stream.expect("[")
+                if stream.peek() == "]":
+                    stream.position += 1
+                else:
+                    while True:
+                        yield stream.decode_value()
+                        if stream.peek() == ",":
+                            stream.position += 1
+                            continue
+                        stream.expect("]")
+                        break
+            else:
+                # Any other top level value is small, so it is decoded in one go
+                value = stream.decode_value()
+                if header is not None:
+                    header[key] = value
+            if stream.peek() == ",":
+                stream.position += 1
+                continue
+            stream.expect("}")
+            break
+
+
+def read_discord_chat_export_header(json_file_path: str, read_size: int = DEFAULT_READ_SIZE) -> dict:
+    """
+    This function reads the top level values that come before the messages (guild, channel, dateRange),
+    without reading the rest of the JSON file
+    :param json_file_path: The JSON file path
+    :param read_size: The number of characters read from the file at a time
+    :return: The top level values
+    """
+    header = {}
+    for _ in stream_messages_from_discord_chat_export_json_file(json_file_path, header, read_size, lambda _: False):
+        pass
+    return header
+
+
+def main(json_file_path: str) -> None:
+    """
+    This function prints the messages from a JSON file one at a time
+    :param json_file_path: The JSON file path
+    :return: None
+    """
+
+    for message in stream_messages_from_discord_chat_export_json_file(json_file_path):
+        print(message)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+
+    if len(args) != 1:
+        print("Usage: " + sys.argv[0] + " <json_file_path>")
+        sys.exit(1)
+    if not os.path.isfile(args[0]):
+        print("ERROR: The JSON file path is invalid: " + args[0])
+        sys.exit(1)
+
+    main(args[0])
@@ -0,0 +1,325 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Watches the input folders and converts the new JSON files as they land, instead of running the whole batch again.
+#  The folders are polled with os.scandir, which works on every file system without any extra library.
+#  A JSON file is only converted once its size and modification time did not change between two polls,
+#  so the files that are still being exported are left for the next poll.
+#  The converted lines of every batch of new JSON files are appended to the output file, or written to a new shard.
+#  The same pipeline converts every batch, so its author table and the ids of the messages seen stay in memory.
+#  A JSON file that changes after it was converted, e.g. an export that was run again, is converted again,
+#  but only its messages that were not written yet are appended. The ids of the messages written by the
+#  watch are kept for that, they are not in the state file, so it only holds until the watch is restarted.
+#  The converted JSON files are recorded in a state file next to the output, so a restarted watch skips them.
+#  Format of the state file:
+#  {
+#    "version": WatchStateVersion,
+#    "files": {
+#      AbsoluteJsonFilePath: {"size": Size, "mtime_ns": ModificationTime}
+#    }
+#  }
+
+import json
+import os
+import sys
+import time
+
+from Functions.message_id_index import MessageIdIndex
+from Functions.open_atomic_output_file import DEFAULT_BUFFER_SIZE, open_appending_output_file, \
+    open_atomic_output_file
+from Functions.pipeline import Pipeline
+from Functions.pipeline_instrumentation import StageTimer
+from Functions.write_converted_data_to_sharded_text_files import get_shard_index_path, get_shard_path
+from Functions.write_converted_data_to_text_file import write_converted_data_to_text_file
+
+# Bump this whenever the format of the state file changes, so that old state files are thrown away
+WATCH_STATE_VERSION = 1
+# The number of seconds between two polls of the input folders
+DEFAULT_POLL_INTERVAL = 2.0
+
+
+def get_watch_state_path(output_path: str) -> str:
+    """
+    This function gets the path of the state file of the watch, e.g. output.watch.json for output.txt
+    :param output_path: The output file path
+    :return: The state file path
+    """
+    output_folder_path, file_name = os.path.split(output_path)
+    return os.path.join(output_folder_path, os.path.splitext(file_name)[0] + ".watch.json")
+
+
+def _load_watch_state(state_path: str) -> dict:
+    """
+    This function loads the JSON files converted by an earlier watch
+    :param state_path: The state file path
+    :return: The (size, modification time) of every converted JSON file, by absolute path
+    """
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if state.get("version") != WATCH_STATE_VERSION:
+        return {}
+    return {path: (entry["size"], entry["mtime_ns"]) for path, entry in state["files"].items()}
+
+
+def _save_watch_state(state_path: str, converted_files: dict) -> None:
+    """
+    This function saves the converted JSON files for the next watch
+    :param state_path: The state file path
+    :param converted_files: The (size, modification time) of every converted JSON file, by absolute path
+    :return: None
+    """
+    with open_atomic_output_file(state_path, "none") as f:
+        json.dump({
+            "version": WATCH_STATE_VERSION,
+            "files": {path: {"size": size, "mtime_ns": mtime_ns}
+                      for path, (size, mtime_ns) in converted_files.items()}
+        }, f, indent=2)
+
+
+class InputFolderWatcher:
+    """
+    Tells which JSON files of the input folders are new or changed, and finished
+    """
+
+    def __init__(self, pipeline: Pipeline, converted_files: dict = None):
+        """
+        :param pipeline: The pipeline, its input folders and file patterns are watched
+        :param converted_files: The (size, modification time) of the JSON files converted already, by absolute path
+        """
+        self.pipeline = pipeline
+        self.converted_files = {} if converted_files is None else converted_files
+        # The JSON files that could not be converted, they are tried again once they change
+        self.failed_files = {}
+        # The (size, modification time) of the JSON files at the last poll, by absolute path
+        self._polled_files = {}
+
+    def poll(self) -> list:
+        """
+        This function walks the input folders once
+        :return: The paths of the JSON files that did not change since the last poll and are not converted yet
+        """
+        try:
+            json_file_paths = list(self.pipeline.iterate_json_file_paths())
+        except FileNotFoundError:
+            # No JSON files yet, or a file or folder went away during the walk, the next poll will tell
+            json_file_paths = []
+        polled_files = {}
+        ready_json_file_paths = []
+        for json_file_path in json_file_paths:
+            absolute_path = os.path.abspath(json_file_path)
+            try:
+                stat = os.stat(json_file_path)
+            except FileNotFoundError:
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self.converted_files.get(absolute_path) == signature or \
+                    self.failed_files.get(absolute_path) == signature:
+                continue
+            if self._polled_files.get(absolute_path) == signature:
+                ready_json_file_paths.append(json_file_path)
+            polled_files[absolute_path] = signature
+        self._polled_files = polled_files
+        return ready_json_file_paths
+
+    def mark_converted(self, json_file_path: str) -> None:
+        """
+        This function records a JSON file returned by the last poll as converted
+        :param json_file_path: The JSON file path
+        :return: None
+        """
+        absolute_path = os.path.abspath(json_file_path)
+        self.converted_files[absolute_path] = self._polled_files[absolute_path]
+        self.failed_files.pop(absolute_path, None)
+
+    def mark_failed(self, json_file_path: str) -> None:
+        """
+        This function records a JSON file returned by the last poll as not convertible, until it changes
+        :param json_file_path: The JSON file path
+        :return: None
+        """
+        absolute_path = os.path.abspath(json_file_path)
+        self.failed_files[absolute_path] = self._polled_files[absolute_path]
+
+
+def _convert_json_file(pipeline: Pipeline, json_file_path: str, written_message_ids: MessageIdIndex,
+                       is_changed: bool) -> list:
+    """
+    This function converts a whole JSON file before any of its lines are written. If the file turns out to be
+    broken, the ids of its messages and its counters are taken back, so that the file leaves nothing behind
+    :param pipeline: The pipeline
+    :param json_file_path: The JSON file path
+    :param written_message_ids: The ids of the messages written by the watch, None if the pipeline deduplicates
+                                all the messages anyway
+    :param is_changed: If True, then the JSON file was converted before and changed since, so only the messages
+                       that were not written yet are converted
+    :return: The converted lines of the JSON file
+    """
+    message_id_index = pipeline.message_id_index if written_message_ids is None else written_message_ids
+    counters = pipeline.statistics.save_counters()
+    message_id_index.start_journal()
+    try:
+        if is_changed and written_message_ids is not None:
+            # The loader drops the messages written already, and counts them as duplicates
+            pipeline.message_id_index = written_message_ids
+        lines = []
+        for record, line in pipeline.iterate_records_with_lines([json_file_path], False):
+            if written_message_ids is not None:
+                written_message_ids.add(record[2])
+            lines.append(line)
+    except ValueError:
+        message_id_index.stop_journal(is_rolling_back=True)
+        pipeline.statistics.restore_counters(counters)
+        raise
+    finally:
+        if written_message_ids is not None:
+            pipeline.message_id_index = None
+    message_id_index.stop_journal()
+    return lines
+
+
+def _write_batch_shard(lines: list, output_path: str, pipeline: Pipeline, compression: str,
+                       buffer_size: int) -> str:
+    """
+    This function writes the lines of a batch to a new shard, and adds it to the index of the shards
+    :param lines: The converted lines
+    :param output_path: The output file path, the shards are named after it
+    :param pipeline: The pipeline, the written lines are counted in its statistics
+    :param compression: The compression of the shard, "auto" picks it from the file extension
+    :param buffer_size: The size of the write buffers in bytes
+    :return: The shard file path
+    """
+    index_path = get_shard_index_path(output_path)
+    shards = []
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            shards = json.load(f)["shards"]
+    shard_path = get_shard_path(output_path, len(shards))
+    write_converted_data_to_text_file(lines, shard_path, False, pipeline.statistics, compression, buffer_size)
+    shards.append({"path": os.path.basename(shard_path), "lines": len(lines), "bytes": os.path.getsize(shard_path)})
+    with open_atomic_output_file(index_path, "none") as f:
+        json.dump({
+            "shard_by": "batch",
+            "lines": sum(shard["lines"] for shard in shards),
+            "bytes": sum(shard["bytes"] for shard in shards),
+            "shards": shards
+        }, f, indent=2)
+    return shard_path
+
+
+def _append_batch(lines: list, output_path: str, pipeline: Pipeline, compression: str, buffer_size: int) -> None:
+    """
+    This function appends the lines of a batch to the output file
+    :param lines: The converted lines
+    :param output_path: The output file path
+    :param pipeline: The pipeline, the written lines are counted in its statistics
+    :param compression: The compression of the output file, "auto" picks it from the file extension
+    :param buffer_size: The size of the write buffers in bytes
+    :return: None
+    """
+    size_before = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+    with open_appending_output_file(output_path, compression, buffer_size) as f:
+        # Every line followed by "\n", like write_converted_data_to_text_file does
+        f.write("\n".join(lines))
+        f.write("\n")
+    pipeline.statistics.record_output(len(lines), os.path.getsize(output_path) - size_before)
+
+
+def watch_input_folders(pipeline: Pipeline, output_path: str, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                        is_sharding_batches: bool = False, compression: str = "auto",
+                        buffer_size: int = DEFAULT_BUFFER_SIZE, statistics_path: str = None,
+                        statistics_format: str = "auto", maximum_polls: int = None) -> None:
+    """
+    This function converts the new JSON files of the input folders as they land, until it is interrupted.
+    The JSON files converted by an earlier watch of the same output are skipped, the others are converted first
+    :param pipeline: The pipeline that converts the JSON files, kept for the whole watch
+    :param output_path: The output file path
+    :param poll_interval: The number of seconds between two polls of the input folders
+    :param is_sharding_batches: If True, then every batch is written to a new shard next to the output file,
+                                otherwise it is appended to the output file
+    :param compression: The compression of the output, "auto" picks it from the file extension
+    :param buffer_size: The size of the write buffers in bytes
+    :param statistics_path: If given, the statistics of the watch are written to this file after every batch
+    :param statistics_format: "json", "prometheus", or "auto" for prometheus if the statistics file ends with .prom
+    :param maximum_polls: If given, the watch stops after this many polls
+    :return: None
+    """
+    if pipeline.cache_path is not None or pipeline.from_store_path is not None or pipeline.store_path is not None:
+        raise ValueError("The watch mode cannot be used with a cache or a binary message store")
+    if pipeline.is_asynchronous:
+        raise ValueError("The watch mode cannot be used with asynchronous reads")
+    start_time = time.perf_counter()
+    state_path = get_watch_state_path(output_path)
+    watcher = InputFolderWatcher(pipeline, _load_watch_state(state_path))
+    # A pipeline that deduplicates the messages keeps the ids of all of them already
+    written_message_ids = MessageIdIndex() if pipeline.message_id_index is None else None
+    if pipeline.is_verbose:
+        print("----------------------------------------")
+        print("Watching for new JSON files every " + str(poll_interval) + " seconds...")
+    number_of_polls = 0
+    while maximum_polls is None or number_of_polls < maximum_polls:
+        if number_of_polls > 0:
+            time.sleep(poll_interval)
+        number_of_polls += 1
+        json_file_paths = watcher.poll()
+        if len(json_file_paths) == 0:
+            continue
+        with StageTimer("batch") as stage_timer:
+            lines = []
+            converted_json_file_paths = []
+            for json_file_path in json_file_paths:
+                is_changed = os.path.abspath(json_file_path) in watcher.converted_files
+                try:
+                    lines.extend(_convert_json_file(pipeline, json_file_path, written_message_ids, is_changed))
+                except ValueError as error:
+                    print("ERROR: Could not convert " + json_file_path + ": " + str(error))
+                    watcher.mark_failed(json_file_path)
+                    continue
+                converted_json_file_paths.append(json_file_path)
+            if len(lines) > 0:
+                with StageTimer("writing", pipeline.statistics):
+                    if is_sharding_batches:
+                        _write_batch_shard(lines, output_path, pipeline, compression, buffer_size)
+                    else:
+                        _append_batch(lines, output_path, pipeline, compression, buffer_size)
+            if len(converted_json_file_paths) > 0:
+                for json_file_path in converted_json_file_paths:
+                    watcher.mark_converted(json_file_path)
+                _save_watch_state(state_path, watcher.converted_files)
+        pipeline.statistics.record_run(time.perf_counter() - start_time)
+        if statistics_path is not None:
+            pipeline.statistics.write_summary(statistics_path, statistics_format)
+        if pipeline.is_verbose:
+            print("Converted " + str(len(converted_json_file_paths)) + " new JSON files into " + str(len(lines)) +
+                  " lines in {} seconds".format(stage_timer.seconds))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+
+    if len(args) < 2:
+        print("Usage: " + sys.argv[0] + " <input_folder_path> <output_file_path> [<poll_interval>]")
+        sys.exit(1)
+
+    try:
+        watch_input_folders(Pipeline(args[0], True, is_streaming=False), args[1],
+                            float(args[2]) if len(args) > 2 else DEFAULT_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,149 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Writes the converted data to two flat binary files that a trainer can memory map and slice without parsing:
+#  - the output file is a blob of the UTF-8 encoded lines, one after another without any separator
+#  - the offsets file next to it, e.g. output.offsets.bin for output.bin, is an array of little endian uint32
+#    with one more item than there are lines: line i is blob[offsets[i]:offsets[i + 1]]
+#  With numpy:
+#    offsets = numpy.memmap("output.offsets.bin", dtype="<u4", mode="r")
+#    blob = numpy.memmap("output.bin", dtype=numpy.uint8, mode="r")
+#    line = bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8")
+#  The line breaks at the end of the converted lines are not written. The files are never compressed,
+#  compressed files cannot be memory mapped, and the offsets limit the blob to 4 GiB, so shard the output
+#  or filter the messages for more than that.
+
+import os
+import sys
+from array import array
+from typing import Iterable, Iterator
+
+from Functions.open_atomic_output_file import DEFAULT_BUFFER_SIZE, open_atomic_output_file
+from Functions.pipeline_instrumentation import StageTimer, format_average
+from Functions.pipeline_statistics import PipelineStatistics
+from Functions.write_converted_data_to_text_file import DEFAULT_BATCH_SIZE
+
+# The biggest offset a uint32 can hold
+MAXIMUM_OFFSET = 2 ** 32 - 1
+
+# The array type code of a uint32, "I" is only guaranteed to have at least 2 bytes
+_OFFSET_TYPE_CODE = "I" if array("I").itemsize == 4 else "L"
+
+
+def get_offsets_path(output_path: str) -> str:
+    """
+    This function gets the path of the offsets file of a blob, e.g. output.offsets.bin for output.bin
+    :param output_path: The output file path
+    :return: The offsets file path
+    """
+    # Only the last extension is replaced, so that output.v1.txt and output.v2.txt do not share a file
+    return os.path.splitext(output_path)[0] + ".offsets.bin"
+
+
+def _write_offsets(offsets_file, offsets: array) -> None:
+    """
+    This function writes a batch of offsets as little endian uint32
+    :param offsets_file: The offsets file, opened in binary mode
+    :param offsets: The offsets
+    :return: None
+    """
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    offsets_file.write(offsets.tobytes())
+
+
+def write_converted_data_to_binary_arrays(converted_data_list: Iterable, output_path: str, verbose: bool,
+                                          statistics: PipelineStatistics = None,
+                                          buffer_size: int = DEFAULT_BUFFER_SIZE,
+                                          batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+    """
+    This function writes the data to a blob of UTF-8 lines and an array of uint32 offsets
+    :param converted_data_list: A list (or any iterable, which is consumed lazily) of converted data
+    :param output_path: The output file path of the blob, the offsets file is written next to it
+    :param verbose: If True, then show progress
+    :param statistics: If given, the written lines and bytes are counted in it
+    :param buffer_size: The size of the write buffers in bytes
+    :param batch_size: The number of lines encoded into a single write
+    :return: None
+    """
+    offsets_path = get_offsets_path(output_path)
+    if verbose:
+        print("----------------------------------------")
+        print("Writing the data to binary arrays...")
+        print("Output file path: " + output_path)
+        print("Offsets file path: " + offsets_path)
+    length_of_data = 0
+    with StageTimer("writing", statistics) as stage_timer:
+        # Neither file is moved into place if the other one fails
+        with open_atomic_output_file(output_path, "none", buffer_size, text=False) as blob_file, \
+                open_atomic_output_file(offsets_path, "none", buffer_size, text=False) as offsets_file:
+            offset = 0
+            offsets = array(_OFFSET_TYPE_CODE, [0])
+            batch = []
+            for converted_data in converted_data_list:
+                encoded_data = converted_data.rstrip("\n").encode("utf-8")
+                offset += len(encoded_data)
+                if offset > MAXIMUM_OFFSET:
+                    raise ValueError("The binary arrays cannot hold more than 4 GiB of lines, "
+                                     "shard the output or filter the messages")
+                batch.append(encoded_data)
+                offsets.append(offset)
+                if len(batch) < batch_size:
+                    continue
+                blob_file.write(b"".join(batch))
+                _write_offsets(offsets_file, offsets)
+                length_of_data += len(batch)
+                batch = []
+                offsets = array(_OFFSET_TYPE_CODE)
+            blob_file.write(b"".join(batch))
+            _write_offsets(offsets_file, offsets)
+            length_of_data += len(batch)
+    if statistics is not None:
+        statistics.record_output(length_of_data, os.path.getsize(output_path) + os.path.getsize(offsets_path))
+    if verbose:
+        print("----------------------------------------")
+        print("Total data written: " + str(length_of_data))
+        print("Total time taken to write the data: {} seconds".format(stage_timer.seconds))
+        print("Average time taken to write a line: " + format_average(stage_timer.seconds, length_of_data))
+
+
+def iterate_binary_arrays(output_path: str) -> Iterator[str]:
+    """
+    This function reads the lines back from the binary arrays, without numpy
+    :param output_path: The output file path of the blob
+    :return: An iterator over the lines
+    """
+    with open(get_offsets_path(output_path), "rb") as f:
+        offsets = array(_OFFSET_TYPE_CODE, f.read())
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    with open(output_path, "rb") as f:
+        blob = f.read()
+    for index in range(len(offsets) - 1):
+        yield str(blob[offsets[index]:offsets[index + 1]], "utf-8")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+
+    if len(args) < 1:
+        print("Usage: " + sys.argv[0] + " <binary_output_file_path>")
+        sys.exit(1)
+
+    for line in iterate_binary_arrays(args[0]):
+        print(line)
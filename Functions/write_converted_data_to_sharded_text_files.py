@@ -0,0 +1,276 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Writes the converted data to several shard files instead of a single output file.
+#  The lines are split by line count, by size, by author or by channel, and every shard
+#  is written by its own thread so the writes (and the compression) of the shards overlap.
+#  An index file next to the shards lists every shard with its line and byte count.
+#  Format of the index file:
+#  {
+#    "shard_by": "lines" | "size" | "author" | "channel",
+#    "lines": TotalNumberOfLines,
+#    "bytes": TotalNumberOfBytes,
+#    "shards": [
+#      {
+#        "path": ShardFileName,
+#        "lines": ShardNumberOfLines,
+#        "bytes": ShardNumberOfBytes
+#      }
+#    ]
+#  }
+
+import json
+import os
+import queue
+import threading
+import zlib
+from typing import Iterable
+
+from Functions.open_atomic_output_file import DEFAULT_BUFFER_SIZE, open_atomic_output_file
+from Functions.pipeline_instrumentation import StageTimer
+from Functions.pipeline_statistics import PipelineStatistics
+from Functions.write_converted_data_to_text_file import DEFAULT_BATCH_SIZE
+
+# The ways the lines can be split into shards
+SHARD_BY = ("lines", "size", "author", "channel")
+
+# The number of batches waiting for a shard writer before the producer blocks
+_QUEUE_SIZE = 16
+# Tells a shard writer to throw its shard away
+_ABORT = object()
+
+
+class _ShardAborted(Exception):
+    pass
+
+
+class _ShardWriter(threading.Thread):
+    """
+    A thread that writes the batches of lines it receives to a single shard file
+    """
+
+    def __init__(self, shard_path: str, compression: str, buffer_size: int):
+        """
+        :param shard_path: The shard file path
+        :param compression: The compression of the shard file
+        :param buffer_size: The size of the write buffers in bytes
+        """
+        super().__init__(daemon=True)
+        self.shard_path = shard_path
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.batches = queue.Queue(maxsize=_QUEUE_SIZE)
+        self.number_of_lines = 0
+        self.error = None
+        # Set once the shard file was moved into place
+        self.is_written = False
+
+    def write(self, batch: list) -> None:
+        """
+        This function hands a batch of lines to the thread
+        :param batch: A list of converted data
+        :return: None
+        """
+        self.number_of_lines += len(batch)
+        self.batches.put(batch)
+
+    def finish(self) -> None:
+        """
+        This function tells the thread that there are no more batches
+        :return: None
+        """
+        self.batches.put(None)
+
+    def abort(self) -> None:
+        """
+        This function tells the thread to throw the shard away instead of moving it into place
+        :return: None
+        """
+        self.batches.put(_ABORT)
+
+    def run(self) -> None:
+        try:
+            with open_atomic_output_file(self.shard_path, self.compression, self.buffer_size) as f:
+                for batch in iter(self.batches.get, None):
+                    if batch is _ABORT:
+                        raise _ShardAborted()
+                    f.write("\n".join(batch))
+                    f.write("\n")
+            self.is_written = True
+        except _ShardAborted:
+            pass
+        except BaseException as error:
+            self.error = error
+            # Keep taking the batches, so that the producer never blocks on a dead thread
+            for batch in iter(self.batches.get, None):
+                if batch is _ABORT:
+                    break
+
+
+def get_shard_path(output_path: str, shard_number: int) -> str:
+    """
+    This function gets the path of a shard, e.g. output-00003.txt for output.txt
+    :param output_path: The output file path
+    :param shard_number: The number of the shard
+    :return: The shard file path
+    """
+    output_folder_path, file_name = os.path.split(output_path)
+    # Keep every extension, so that output.txt.gz becomes output-00003.txt.gz
+    stem, dot, extensions = file_name.partition(".")
+    return os.path.join(output_folder_path, stem + "-" + str(shard_number).zfill(5) + dot + extensions)
+
+
+def get_shard_index_path(output_path: str) -> str:
+    """
+    This function gets the path of the index file of the shards, e.g. output.index.json for output.txt
+    :param output_path: The output file path
+    :return: The index file path
+    """
+    output_folder_path, file_name = os.path.split(output_path)
+    return os.path.join(output_folder_path, os.path.splitext(file_name)[0] + ".index.json")
+
+
+def _remove_written_shards(shard_writers: list) -> None:
+    """
+    This function removes the shards that were already moved into place, when the writing fails
+    :param shard_writers: The shard writers, which are all done
+    :return: None
+    """
+    for shard_writer in shard_writers:
+        if shard_writer.is_written:
+            os.remove(shard_writer.shard_path)
+
+
+def write_converted_data_to_sharded_text_files(keyed_converted_data: Iterable, output_path: str, verbose: bool,
+                                               shard_by: str = "lines", number_of_shards: int = 8,
+                                               shard_size: int = 1000000, statistics: PipelineStatistics = None,
+                                               compression: str = "auto", buffer_size: int = DEFAULT_BUFFER_SIZE,
+                                               batch_size: int = DEFAULT_BATCH_SIZE) -> list:
+    """
+    This function writes the data to shard files
+    :param keyed_converted_data: An iterable of (message record, converted data) pairs
+    :param output_path: The output file path, the shards are named after it
+    :param verbose: If True, then show progress
+    :param shard_by: "lines" or "size" to start a new shard when the current one is full,
+                     "author" or "channel" to spread the lines over a fixed number of shards by their key
+    :param number_of_shards: The number of shards when sharding by author or channel
+    :param shard_size: The number of lines, or bytes when sharding by size, after which a new shard is started
+    :param statistics: If given, the written lines and bytes are counted in it
+    :param compression: "auto", "none", "gzip", "bz2" or "xz", "auto" picks one from the file extension
+    :param buffer_size: The size of the write buffers in bytes
+    :param batch_size: The number of lines handed to a shard writer at a time
+    :return: The list of the shards in the index file
+    """
+    if shard_by not in SHARD_BY:
+        raise ValueError("Unknown shard key: " + shard_by + ", expected one of " + ", ".join(SHARD_BY))
+    if verbose:
+        print("----------------------------------------")
+        print("Writing the data to shard files by " + shard_by + "...")
+    shard_writers = []
+    batches = []
+
+    def _start_shard_writer() -> None:
+        shard_writer = _ShardWriter(get_shard_path(output_path, len(shard_writers)), compression, buffer_size)
+        shard_writer.start()
+        shard_writers.append(shard_writer)
+        batches.append([])
+
+    # Time the writing, the stages the lines are pulled from are taken off
+    with StageTimer("writing", statistics) as stage_timer:
+        try:
+            if shard_by in ("author", "channel"):
+                # Every key always lands in the same shard, crc32 is stable across runs unlike hash()
+                for _ in range(number_of_shards):
+                    _start_shard_writer()
+                for record, converted_data in keyed_converted_data:
+                    key = str(record.author_id) if shard_by == "author" else str(record.channel_id)
+                    shard_number = zlib.crc32(key.encode("utf-8")) % number_of_shards
+                    batch = batches[shard_number]
+                    batch.append(converted_data)
+                    if len(batch) >= batch_size:
+                        shard_writers[shard_number].write(batch)
+                        batches[shard_number] = []
+            else:
+                _start_shard_writer()
+                current_shard_size = 0
+                for _, converted_data in keyed_converted_data:
+                    if shard_by == "lines":
+                        current_shard_size += 1
+                    else:
+                        # Every line is followed by "\n" in the file
+                        current_shard_size += (len(converted_data) if converted_data.isascii()
+                                               else len(converted_data.encode("utf-8"))) + 1
+                    batches[-1].append(converted_data)
+                    if len(batches[-1]) >= batch_size:
+                        shard_writers[-1].write(batches[-1])
+                        batches[-1] = []
+                    if current_shard_size >= shard_size:
+                        # The full shard keeps writing in its thread while the next one fills up
+                        if len(batches[-1]) > 0:
+                            shard_writers[-1].write(batches[-1])
+                            batches[-1] = []
+                        shard_writers[-1].finish()
+                        _start_shard_writer()
+                        current_shard_size = 0
+        except BaseException:
+            # Throw the shards away, like a single output file would be
+            for shard_writer in shard_writers:
+                shard_writer.abort()
+            for shard_writer in shard_writers:
+                shard_writer.join()
+            # The full shards were finished while the rest was still being written, they are thrown away too
+            _remove_written_shards(shard_writers)
+            raise
+        # Hand over what is left and wait for every shard to be written
+        for shard_writer, batch in zip(shard_writers, batches):
+            if len(batch) > 0:
+                shard_writer.write(batch)
+            shard_writer.finish()
+        for shard_writer in shard_writers:
+            shard_writer.join()
+        for shard_writer in shard_writers:
+            if shard_writer.error is not None:
+                _remove_written_shards(shard_writers)
+                raise shard_writer.error
+    # The shard that was started last can be empty when the lines ran out right at the end of a shard
+    if shard_by in ("lines", "size") and len(shard_writers) > 1 and shard_writers[-1].number_of_lines == 0:
+        os.remove(shard_writers.pop().shard_path)
+    # Write the index of the shards
+    shards = [{
+        "path": os.path.basename(shard_writer.shard_path),
+        "lines": shard_writer.number_of_lines,
+        "bytes": os.path.getsize(shard_writer.shard_path)
+    } for shard_writer in shard_writers]
+    total_number_of_lines = sum(shard["lines"] for shard in shards)
+    total_number_of_bytes = sum(shard["bytes"] for shard in shards)
+    with open_atomic_output_file(get_shard_index_path(output_path), "none") as f:
+        json.dump({
+            "shard_by": shard_by,
+            "lines": total_number_of_lines,
+            "bytes": total_number_of_bytes,
+            "shards": shards
+        }, f, indent=2)
+    if statistics is not None:
+        statistics.record_output(total_number_of_lines, total_number_of_bytes)
+    # Print the message
+    if verbose:
+        print("----------------------------------------")
+        print("Total shards written: " + str(len(shards)))
+        print("Total data written: " + str(total_number_of_lines))
+        print("Total time taken to write the data: {} seconds".format(stage_timer.seconds))
+    return shards
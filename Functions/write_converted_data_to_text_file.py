@@ -16,47 +16,72 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 #  Description:
+#  Writes the converted data to a text file.
+#  The lines are written in large batches through big buffers, optionally compressed,
+#  and the file only appears under the output path once it was written completely.
 import os
 import sys
-import time
+from typing import Iterable
 
+from Functions.open_atomic_output_file import DEFAULT_BUFFER_SIZE, open_atomic_output_file
+from Functions.pipeline_instrumentation import StageTimer, format_average
+from Functions.pipeline_statistics import PipelineStatistics
 
-def write_converted_data_to_text_file(converted_data_list: list, output_path: str, verbose: bool) -> None:
+# The number of lines joined into a single write
+DEFAULT_BATCH_SIZE = 4096
+
+
+def write_converted_data_to_text_file(converted_data_list: Iterable, output_path: str, verbose: bool,
+                                      statistics: PipelineStatistics = None, compression: str = "auto",
+                                      buffer_size: int = DEFAULT_BUFFER_SIZE,
+                                      batch_size: int = DEFAULT_BATCH_SIZE) -> None:
     """
     This function writes the data to a text file
-    :param converted_data_list: A list of converted data
+    :param converted_data_list: A list (or any iterable, which is consumed lazily) of converted data
     :param output_path: The output file path
     :param verbose: If True, then show progress
+    :param statistics: If given, the written lines and bytes are counted in it
+    :param compression: "auto", "none", "gzip", "bz2" or "xz", "auto" picks one from the file extension
+    :param buffer_size: The size of the write buffers in bytes
+    :param batch_size: The number of lines joined into a single write
     :return: None
     """
     if verbose:
         print("----------------------------------------")
         print("Writing the data to a text file...")
-    # Start the timer
-    start_time = time.time()
-    # Get the total number of JSON files
-    length_of_data = len(converted_data_list)
+    # Count the lines while writing, so that iterators are never collected into a list
+    length_of_data = 0
     # Print the message
     if verbose:
         print("Writing the data to a text file...")
         print("Output file path: " + output_path)
-    # Open the output file
-    with open(output_path, "w", encoding="utf-8") as f:
-        # Loop through the list of converted data
-        for converted_data in converted_data_list:
-            # Write the converted data to the output file
-            f.write(converted_data + "\n")
-    # Stop the timer
-    end_time = time.time()
-    # Calculate the total time taken
-    total_time_taken = end_time - start_time
+    # Time the writing, when the lines are pulled from a generator the stages it pulls from are taken off
+    with StageTimer("writing", statistics) as stage_timer:
+        # Open the output file
+        with open_atomic_output_file(output_path, compression, buffer_size) as f:
+            batch = []
+            # Loop through the list of converted data
+            for converted_data in converted_data_list:
+                batch.append(converted_data)
+                if len(batch) < batch_size:
+                    continue
+                # Write the whole batch at once, every line followed by "\n"
+                f.write("\n".join(batch))
+                f.write("\n")
+                length_of_data += len(batch)
+                batch = []
+            if len(batch) > 0:
+                f.write("\n".join(batch))
+                f.write("\n")
+                length_of_data += len(batch)
+    if statistics is not None:
+        statistics.record_output(length_of_data, os.path.getsize(output_path))
     # Print the message
     if verbose:
         print("----------------------------------------")
-        print("Total data written: " + str(len(converted_data_list)))
-        print("Total time taken to write the data: {} seconds".format(total_time_taken))
-        print("Average time taken to write a line: {} seconds".format(
-            round((total_time_taken / length_of_data), 2)))
+        print("Total data written: " + str(length_of_data))
+        print("Total time taken to write the data: {} seconds".format(stage_timer.seconds))
+        print("Average time taken to write a line: " + format_average(stage_timer.seconds, length_of_data))
 
 
 def main(converted_data_list: list, output_path: str, verbose: bool):
@@ -0,0 +1,57 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Tests the turns of the conversation windows.
+
+import unittest
+
+from Functions.author_table import AuthorTable
+from Functions.build_conversation_windows import iterate_conversation_windows
+from Functions.message_record import MessageRecord
+
+
+class TestIterateConversationWindows(unittest.TestCase):
+
+    def setUp(self):
+        self.author_table = AuthorTable()
+        self.first_author_index = self.author_table.add(1, "first", "0001")
+        self.second_author_index = self.author_table.add(2, "second", "0002")
+
+    def _get_records(self, author_indexes: list) -> list:
+        return [MessageRecord(author_index, "message " + str(message_id), message_id, author_index + 1, 7,
+                              message_id, 0) for message_id, author_index in enumerate(author_indexes, 1)]
+
+    def test_messages_of_an_author_are_one_turn(self):
+        records = self._get_records([self.first_author_index] * 3 + [self.second_author_index])
+        windows = list(iterate_conversation_windows(records, self.author_table))
+        self.assertEqual(1, len(windows))
+        self.assertEqual(["first___0001: message 1\nmessage 2\nmessage 3"], windows[0]["context"])
+        self.assertEqual("second___0002: message 4", windows[0]["response"])
+
+    def test_turn_is_complete_at_the_maximum_turn_size(self):
+        records = self._get_records([self.first_author_index] * 7)
+        windows = list(iterate_conversation_windows(records, self.author_table, maximum_turn_size=3))
+        self.assertEqual(["4", "7"], [window["message_id"] for window in windows])
+        self.assertEqual("first___0001: message 4\nmessage 5\nmessage 6", windows[0]["response"])
+        self.assertEqual("first___0001: message 7", windows[1]["response"])
+        self.assertEqual(["first___0001: message 1\nmessage 2\nmessage 3",
+                          "first___0001: message 4\nmessage 5\nmessage 6"], windows[1]["context"])
+
+
+if __name__ == '__main__':
+    unittest.main()
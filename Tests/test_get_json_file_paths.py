@@ -0,0 +1,85 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Tests the walk of the input folders for the JSON files.
+
+import os
+import tempfile
+import unittest
+
+from Functions.get_json_file_paths import iterate_json_file_paths
+
+
+class TestIterateJsonFilePaths(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.input_folder_path = self.temporary_directory.name
+        os.makedirs(os.path.join(self.input_folder_path, "guild", "channel"))
+        for relative_path in ("a.json", os.path.join("guild", "b.json"), os.path.join("guild", "channel", "c.json"),
+                              "notes.txt"):
+            with open(os.path.join(self.input_folder_path, relative_path), "w") as f:
+                f.write("{}")
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def _get_relative_paths(self, recursive: bool) -> list:
+        return sorted(os.path.relpath(path, self.input_folder_path)
+                      for path in iterate_json_file_paths(self.input_folder_path, recursive))
+
+    def test_walks_the_sub_folders_when_recursive(self):
+        self.assertEqual(["a.json"], self._get_relative_paths(False))
+        self.assertEqual(["a.json", os.path.join("guild", "b.json"), os.path.join("guild", "channel", "c.json")],
+                         self._get_relative_paths(True))
+
+    def test_hidden_files_and_folders_are_skipped(self):
+        os.makedirs(os.path.join(self.input_folder_path, ".trash"))
+        for relative_path in (".a.json", os.path.join("guild", ".b.json"), os.path.join(".trash", "d.json")):
+            with open(os.path.join(self.input_folder_path, relative_path), "w") as f:
+                f.write("{}")
+        self.assertEqual(["a.json"], self._get_relative_paths(False))
+        self.assertEqual(["a.json", os.path.join("guild", "b.json"), os.path.join("guild", "channel", "c.json")],
+                         self._get_relative_paths(True))
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "symbolic links are not supported")
+    def test_symbolic_link_cycle_is_walked_once(self):
+        # A link from the deepest folder back to the input folder, and one to a sibling folder
+        try:
+            os.symlink(self.input_folder_path, os.path.join(self.input_folder_path, "guild", "channel", "loop"))
+            os.symlink(os.path.join(self.input_folder_path, "guild"),
+                       os.path.join(self.input_folder_path, "guild", "channel", "up"))
+        except OSError:
+            self.skipTest("symbolic links cannot be created")
+        self.assertEqual(["a.json", os.path.join("guild", "b.json"), os.path.join("guild", "channel", "c.json")],
+                         self._get_relative_paths(True))
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "symbolic links are not supported")
+    def test_symbolic_link_to_an_outside_folder_is_walked(self):
+        with tempfile.TemporaryDirectory() as outside_folder_path:
+            with open(os.path.join(outside_folder_path, "d.json"), "w") as f:
+                f.write("{}")
+            try:
+                os.symlink(outside_folder_path, os.path.join(self.input_folder_path, "linked"))
+            except OSError:
+                self.skipTest("symbolic links cannot be created")
+            self.assertIn(os.path.join("linked", "d.json"), self._get_relative_paths(True))
+
+
+if __name__ == '__main__':
+    unittest.main()
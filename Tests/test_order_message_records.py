@@ -0,0 +1,62 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Tests the merge of the JSON files whose messages are sorted already.
+
+import unittest
+from unittest import mock
+
+from Functions.message_record import MessageRecord
+from Functions.order_message_records import iterate_merged_records
+
+
+class TestIterateMergedRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.number_of_open_streams = 0
+        self.maximum_number_of_open_streams = 0
+
+    def _iterate_stream(self, stream_index: int, number_of_records: int):
+        # Counts the streams that were started and not finished, like the JSON files that are open
+        self.number_of_open_streams += 1
+        self.maximum_number_of_open_streams = max(self.maximum_number_of_open_streams, self.number_of_open_streams)
+        for record_index in range(number_of_records):
+            # Every timestamp is shared by several streams, so the order of the equal keys is checked too
+            yield MessageRecord(0, str(stream_index), stream_index * 1000 + record_index, 0, 0, record_index // 2, 0)
+        self.number_of_open_streams -= 1
+
+    def _get_named_record_streams(self, number_of_streams: int) -> list:
+        return [(str(stream_index), self._iterate_stream(stream_index, 5)) for stream_index in range(number_of_streams)]
+
+    def test_merges_in_groups_when_there_are_too_many_streams(self):
+        expected_records = sorted((record for _, records in self._get_named_record_streams(20) for record in records),
+                                  key=lambda record: (record.timestamp, record.message_id))
+        with mock.patch("Functions.order_message_records.get_merge_width", return_value=3):
+            records = list(iterate_merged_records(self._get_named_record_streams(20), "timestamp"))
+        self.assertEqual(expected_records, records)
+        self.assertTrue(all(isinstance(record, MessageRecord) for record in records))
+        self.assertLessEqual(self.maximum_number_of_open_streams, 3)
+
+    def test_unsorted_stream_is_an_error(self):
+        records = [MessageRecord(0, "", 2, 0, 0, 0, 0), MessageRecord(0, "", 1, 0, 0, 0, 0)]
+        with self.assertRaises(ValueError):
+            list(iterate_merged_records([("unsorted.json", records)], "id"))
+
+
+if __name__ == '__main__':
+    unittest.main()
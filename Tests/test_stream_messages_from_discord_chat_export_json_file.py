@@ -0,0 +1,64 @@
+#  Copyright (c) 2022
+#  - Katheryn Sakura (pseudonym)
+#  - https://github.com/SakuraKat
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#  Description:
+#  Tests the streaming of the messages out of malformed JSON files.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from Functions.stream_messages_from_discord_chat_export_json_file import _JsonStream, \
+    stream_messages_from_discord_chat_export_json_file
+
+
+class TestStreamMessagesFromMalformedJsonFile(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.json_file_path = os.path.join(self.temporary_directory.name, "export.json")
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def _stream(self, text: str, read_size: int = 16) -> list:
+        with open(self.json_file_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return list(stream_messages_from_discord_chat_export_json_file(self.json_file_path, read_size=read_size))
+
+    def test_error_before_the_end_of_the_buffer_stops_the_reads(self):
+        # The broken message comes first, the rest of the file must not be read before the error
+        text = '{"messages": [{"id": #}, ' + ", ".join('{"id": "' + str(i) + '"}' for i in range(10000)) + "]}"
+        read_more = mock.Mock(wraps=_JsonStream._read_more)
+        with mock.patch.object(_JsonStream, "_read_more", lambda stream: read_more(stream)):
+            with self.assertRaises(ValueError):
+                self._stream(text)
+        self.assertLess(read_more.call_count, 10)
+
+    def test_unterminated_string_is_bounded(self):
+        with mock.patch("Functions.stream_messages_from_discord_chat_export_json_file.MAXIMUM_VALUE_SIZE", 1000):
+            with self.assertRaisesRegex(ValueError, "most likely malformed"):
+                self._stream('{"messages": [{"content": "' + "a" * 100000, 256)
+
+    def test_value_cut_by_the_chunks_is_decoded(self):
+        self.assertEqual([{"content": "é\U0001F600 " * 20}],
+                         self._stream('{"messages": [{"content": "' + "\\u00e9\\ud83d\\ude00 " * 20 + '"}]}', 7))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -39,10 +39,26 @@ import os
 import sys
 import time
 
-from Functions.convert_data_to_required_format import convert_data_to_required_format
-from Functions.get_data_from_discord_chat_exports_json_files import get_data_from_discord_chat_exports_json_files
-from Functions.get_json_file_paths import get_json_file_paths
-from Functions.write_converted_data_to_text_file import write_converted_data_to_text_file
+from Functions.build_conversation_windows import DEFAULT_REPLY_LOOKBACK
+from Functions.get_data_from_discord_chat_exports_json_files import DEFAULT_MAXIMUM_READS
+from Functions.get_json_file_paths import DEFAULT_INCLUDE_PATTERNS
+from Functions.json_backends import DEFAULT_JSON_BACKEND, JSON_BACKENDS
+from Functions.message_filter import MessageFilter
+from Functions.near_duplicate_filter import DEFAULT_LOOKBACK, DEFAULT_MINIMUM_LENGTH, DEFAULT_NUMBER_OF_BANDS, \
+    DEFAULT_ROWS_PER_BAND, DEFAULT_SHINGLE_SIZE, DEFAULT_THRESHOLD, NearDuplicateFilter
+from Functions.normalize_message_content import NORMALIZATIONS, ContentNormalizer
+from Functions.open_atomic_output_file import DEFAULT_BUFFER_SIZE
+from Functions.order_message_records import DEFAULT_MEMORY_BUDGET, ORDER_KEYS
+from Functions.parse_discord_timestamp import parse_discord_timestamp
+from Functions.pipeline import DEFAULT_NUMBER_OF_SHARDS, DEFAULT_SHARD_SIZE, OUTPUT_FORMATS, Pipeline
+from Functions.pipeline_instrumentation import profile_pipeline
+from Functions.pipeline_statistics import SUMMARY_FORMATS, PipelineStatistics
+from Functions.split_discord_chat_export_json_file import DEFAULT_SPLIT_SIZE
+from Functions.watch_input_folders import DEFAULT_POLL_INTERVAL, watch_input_folders
+
+# The input folder and the output file used when they are not passed
+DEFAULT_INPUT_FOLDER_PATH = os.getcwd() + "/JSON Files"
+DEFAULT_OUTPUT_FILE_PATH = os.getcwd() + "/Output/output.txt"
 
 
 def _print_help() -> None:
@@ -59,9 +75,119 @@ def _print_help() -> None:
           "-i <input_folder_path> -o <output_file_path> -v <true/false>")
     print("=" * 80)
     print("Options:")
-    print("\033[1m\033[4m\033[94m-i\033[0m, \033[1m\033[4m\033[94m--input\033[0m: Input folder path")
+    print("\033[1m\033[4m\033[94m-i\033[0m, \033[1m\033[4m\033[94m--input\033[0m: "
+          "Input folder path, can be passed more than once")
     print("\033[1m\033[4m\033[94m-o\033[0m, \033[1m\033[4m\033[94m--output\033[0m: Output file path")
     print("\033[1m\033[4m\033[94m-v\033[0m, \033[1m\033[4m\033[94m--verbose\033[0m: Verbose (True or False)")
+    print("\033[1m\033[4m\033[94m-r\033[0m, \033[1m\033[4m\033[94m--recursive\033[0m: "
+          "Also search the sub folders of the input folders for JSON files")
+    print("\033[1m\033[4m\033[94m--include\033[0m: "
+          "Pattern of the JSON files to take, e.g. \"*/general/*.json\", can be passed more than once")
+    print("\033[1m\033[4m\033[94m--exclude\033[0m: "
+          "Pattern of the files and folders to skip, can be passed more than once")
+    print("\033[1m\033[4m\033[94m--sort-by\033[0m: "
+          "Sort the JSON files by name or size (largest first) before parsing them")
+    print("\033[1m\033[4m\033[94m--channel-id\033[0m, \033[1m\033[4m\033[94m--channel-name\033[0m, "
+          "\033[1m\033[4m\033[94m--guild-id\033[0m, \033[1m\033[4m\033[94m--guild-name\033[0m: "
+          "Only keep the exports of this channel or guild, can be passed more than once")
+    print("\033[1m\033[4m\033[94m--after\033[0m, \033[1m\033[4m\033[94m--before\033[0m: "
+          "Only keep the messages sent at or after, or before, this date, e.g. 2021-03-12 or 2021-03-12T18:35:21")
+    print("\033[1m\033[4m\033[94m--author-id\033[0m: "
+          "Only keep the messages of this author, can be passed more than once")
+    print("\033[1m\033[4m\033[94m--bots\033[0m: "
+          "True to only keep the messages of bots, False to drop them")
+    print("\033[1m\033[4m\033[94m--type\033[0m: "
+          "Only keep the messages of this type, e.g. Default or Reply, can be passed more than once")
+    print("\033[1m\033[4m\033[94m--min-length\033[0m: "
+          "Only keep the messages with at least this many characters")
+    print("\033[1m\033[4m\033[94m--normalize\033[0m: "
+          "Rewrite the message contents while converting them (" + ", ".join(NORMALIZATIONS) + " or all), "
+          "can be passed more than once")
+    print("\033[1m\033[4m\033[94m-s\033[0m, \033[1m\033[4m\033[94m--streaming\033[0m: "
+          "Stream every message from the JSON files to the output file one at a time to keep the memory usage low")
+    print("\033[1m\033[4m\033[94m-a\033[0m, \033[1m\033[4m\033[94m--async\033[0m: "
+          "Read the JSON files in an event loop with several reads in flight while converting and writing, "
+          "for network or spinning storage")
+    print("\033[1m\033[4m\033[94m--reads\033[0m: Number of JSON files read at the same time with --async")
+    print("\033[1m\033[4m\033[94m-w\033[0m, \033[1m\033[4m\033[94m--workers\033[0m: "
+          "Number of worker processes parsing the JSON files (0 uses one per CPU)")
+    print("\033[1m\033[4m\033[94m--chunksize\033[0m: Number of JSON files handed to a worker process at a time")
+    print("\033[1m\033[4m\033[94m--split\033[0m: "
+          "Split the big JSON files into ranges of messages that are parsed by several worker processes (with -w)")
+    print("\033[1m\033[4m\033[94m--split-size\033[0m: "
+          "Number of bytes of messages in a range with --split, the JSON files at least this big are split")
+    print("\033[1m\033[4m\033[94m-c\033[0m, \033[1m\033[4m\033[94m--cache\033[0m: "
+          "Cache folder path, only new or modified JSON files are converted again")
+    print("\033[1m\033[4m\033[94m--dedup\033[0m: "
+          "Drop the messages whose id was already seen in another export (cannot be used with --cache)")
+    print("\033[1m\033[4m\033[94m--near-dup\033[0m: "
+          "Drop the messages that are nearly the same as a recent message, like spam and copypasta, "
+          "found with MinHash signatures of their shingles (cannot be used with --cache)")
+    print("\033[1m\033[4m\033[94m--near-dup-threshold\033[0m: "
+          "Estimated similarity of the shingles from 0 to 1 at which a message is dropped with --near-dup")
+    print("\033[1m\033[4m\033[94m--near-dup-bands\033[0m, \033[1m\033[4m\033[94m--near-dup-rows\033[0m: "
+          "Number of LSH bands, and of bins per band, their product must be a power of two")
+    print("\033[1m\033[4m\033[94m--near-dup-shingle\033[0m: Number of bytes of a shingle with --near-dup")
+    print("\033[1m\033[4m\033[94m--near-dup-min-length\033[0m: "
+          "Number of characters a message needs to be dropped with --near-dup")
+    print("\033[1m\033[4m\033[94m--near-dup-lookback\033[0m: "
+          "Number of recent messages the near duplicates are looked for in with --near-dup")
+    print("\033[1m\033[4m\033[94m--near-dup-report\033[0m: "
+          "Path of a file to write the dropped near duplicates to, one JSON object per line")
+    print("\033[1m\033[4m\033[94m--order-by\033[0m: "
+          "Order the messages of all the JSON files by " + " or ".join(ORDER_KEYS) + ", without loading them all")
+    print("\033[1m\033[4m\033[94m--presorted\033[0m: "
+          "The messages of every JSON file are in order already, like Discord Chat Exporter writes them, "
+          "so the JSON files are streamed at the same time and merged with --order-by and -s, "
+          "otherwise the messages are sorted in runs spilled to disk")
+    print("\033[1m\033[4m\033[94m--memory-budget\033[0m: "
+          "Number of bytes of messages kept in memory before a sorted run is spilled to disk with --order-by, "
+          "and of index posting lists with --index")
+    print("\033[1m\033[4m\033[94m--spill\033[0m: "
+          "Folder path the sorted runs are spilled to with --order-by or --index, the temporary folder by default")
+    print("\033[1m\033[4m\033[94m--store\033[0m: "
+          "Folder path to also save the parsed messages to as a binary message store")
+    print("\033[1m\033[4m\033[94m--from-store\033[0m: "
+          "Folder path of a binary message store to read the messages from instead of the JSON files")
+    print("\033[1m\033[4m\033[94m--shard-by\033[0m: "
+          "Split the output into shard files by lines, size, author or channel, with an index file")
+    print("\033[1m\033[4m\033[94m--shards\033[0m: Number of shard files when sharding by author or channel")
+    print("\033[1m\033[4m\033[94m--shard-size\033[0m: "
+          "Number of lines (or bytes when sharding by size) after which a new shard file is started")
+    print("\033[1m\033[4m\033[94m--stats\033[0m: "
+          "Path of a file to write the statistics of the run and the time spent in every stage to")
+    print("\033[1m\033[4m\033[94m--stats-format\033[0m: "
+          "Format of the statistics file: json or prometheus (default: prometheus for .prom files, otherwise json)")
+    print("\033[1m\033[4m\033[94m--profile\033[0m: "
+          "Path of a file to save a cProfile profile of the run to, readable with pstats")
+    print("\033[1m\033[4m\033[94m--trace-memory\033[0m: "
+          "Trace the memory allocations with tracemalloc and record the peak memory in the statistics")
+    print("\033[1m\033[4m\033[94m--json-backend\033[0m: "
+          "JSON library that decodes whole JSON files (" + ", ".join(JSON_BACKENDS) + "), "
+          "auto picks the fastest one that is installed")
+    print("\033[1m\033[4m\033[94m--windows\033[0m: "
+          "Write context/response windows of the conversations as JSON lines instead of the converted lines, "
+          "with this many turns of context, following the replies when the replied message is known")
+    print("\033[1m\033[4m\033[94m--reply-lookback\033[0m: "
+          "Number of recent messages of every channel that replies can be followed to with --windows")
+    print("\033[1m\033[4m\033[94m--watch\033[0m: "
+          "Keep running and convert the new JSON files as they land in the input folders, "
+          "appending their lines to the output file")
+    print("\033[1m\033[4m\033[94m--poll-interval\033[0m: Number of seconds between two looks at the input folders "
+          "with --watch")
+    print("\033[1m\033[4m\033[94m--watch-shards\033[0m: "
+          "Write every batch of new JSON files to a new shard file instead of appending it, with --watch")
+    print("\033[1m\033[4m\033[94m--format\033[0m: "
+          "Format of the output file (" + ", ".join(OUTPUT_FORMATS) + "): the converted lines, a JSON record per "
+          "message with the author, channel, timestamp and content, or the converted lines as a UTF-8 blob "
+          "with an array of uint32 offsets in a .offsets.bin file next to it, for numpy.memmap")
+    print("\033[1m\033[4m\033[94m--index\033[0m: "
+          "Also write an inverted index of the terms and the authors of the lines to a .index.bin file next to "
+          "the text output file, queried with python3 -m Functions.inverted_index <output_file_path> "
+          "[--author <author_label>] <term> ...")
+    print("\033[1m\033[4m\033[94m--compression\033[0m: Compression of the output file "
+          "(auto, none, gzip, bz2 or xz), auto picks it from the file extension")
+    print("\033[1m\033[4m\033[94m--buffer-size\033[0m: Size of the output write buffers in bytes")
     print("\033[1m\033[4m\033[94m-h\033[0m, \033[1m\033[4m\033[94m--help\033[0m: Print this help text")
     print("All the parameters are\033[1m\033[4m\033[94m optional\033[0m")
     print("If the parameters are not passed, then the program will use the"
@@ -69,6 +195,25 @@ def _print_help() -> None:
     print("=" * 80)
     print("The default values are:")
     print("Verbose:\033[1m\033[4m\033[94m false\033[0m")
+    print("Include:\033[1m\033[4m\033[94m " + ", ".join(DEFAULT_INCLUDE_PATTERNS) + "\033[0m")
+    print("Workers:\033[1m\033[4m\033[94m 1\033[0m")
+    print("Chunksize:\033[1m\033[4m\033[94m 1\033[0m")
+    print("Split size:\033[1m\033[4m\033[94m " + str(DEFAULT_SPLIT_SIZE) + "\033[0m")
+    print("Reads:\033[1m\033[4m\033[94m " + str(DEFAULT_MAXIMUM_READS) + "\033[0m")
+    print("Format:\033[1m\033[4m\033[94m text\033[0m")
+    print("Compression:\033[1m\033[4m\033[94m auto\033[0m")
+    print("Buffer size:\033[1m\033[4m\033[94m " + str(DEFAULT_BUFFER_SIZE) + "\033[0m")
+    print("Shards:\033[1m\033[4m\033[94m " + str(DEFAULT_NUMBER_OF_SHARDS) + "\033[0m")
+    print("Shard size:\033[1m\033[4m\033[94m " + str(DEFAULT_SHARD_SIZE) + "\033[0m")
+    print("Poll interval:\033[1m\033[4m\033[94m " + str(DEFAULT_POLL_INTERVAL) + "\033[0m")
+    print("Reply lookback:\033[1m\033[4m\033[94m " + str(DEFAULT_REPLY_LOOKBACK) + "\033[0m")
+    print("Near duplicate threshold:\033[1m\033[4m\033[94m " + str(DEFAULT_THRESHOLD) + "\033[0m")
+    print("Near duplicate bands:\033[1m\033[4m\033[94m " + str(DEFAULT_NUMBER_OF_BANDS) + " x " +
+          str(DEFAULT_ROWS_PER_BAND) + "\033[0m")
+    print("Near duplicate shingle:\033[1m\033[4m\033[94m " + str(DEFAULT_SHINGLE_SIZE) + "\033[0m")
+    print("Near duplicate minimum length:\033[1m\033[4m\033[94m " + str(DEFAULT_MINIMUM_LENGTH) + "\033[0m")
+    print("Near duplicate lookback:\033[1m\033[4m\033[94m " + str(DEFAULT_LOOKBACK) + "\033[0m")
+    print("Memory budget:\033[1m\033[4m\033[94m " + str(DEFAULT_MEMORY_BUDGET) + "\033[0m")
     print("Input folder path: \033[1m\033[4m\033[94m" +
           str(DEFAULT_INPUT_FOLDER_PATH) + "\033[0m")
     print("Output file path: \033[1m\033[4m\033[94m" +
@@ -86,43 +231,171 @@ def _print_help() -> None:
     print("python3 " + file_name + " -h")
     print("python3 " + file_name + " --help")
     print("python3 " + file_name + " -o /home/user/Downloads/output.txt")
+    print("python3 " + file_name + " -i /home/user/Downloads --streaming")
+    print("python3 " + file_name + " -i /home/user/Downloads -w 8 --chunksize 4")
+    print("python3 " + file_name + " -i /home/user/Downloads -w 8 --split --split-size 33554432")
+    print("python3 " + file_name + " -i /mnt/share/exports --async --reads 32 -w 4")
+    print("python3 " + file_name + " -i /home/user/Downloads -c /home/user/Downloads/cache")
+    print("python3 " + file_name + " -i /home/user/Downloads -o /home/user/Downloads/output.txt.gz")
+    print("python3 " + file_name + " -i /home/user/Downloads --format jsonl -o /home/user/Downloads/output.jsonl")
+    print("python3 " + file_name + " -i /home/user/Downloads --format binary -o /home/user/Downloads/output.bin")
+    print("python3 " + file_name + " -i /home/user/Downloads -s --index -o /home/user/Downloads/output.txt")
+    print("python3 " + file_name + " -i /home/user/Downloads --store /home/user/Downloads/store")
+    print("python3 " + file_name + " --from-store /home/user/Downloads/store -o /home/user/Downloads/output.txt")
+    print("python3 " + file_name + " -i /home/user/Downloads --shard-by author --shards 16")
+    print("python3 " + file_name + " -i /home/user/exports -i /home/user/old_exports -r --exclude \"*/bots/*\" "
+          "--sort-by size -w 8")
+    print("python3 " + file_name + " -i /home/user/Downloads -s --channel-name general --after 2021-01-01 "
+          "--bots false --min-length 2")
+    print("python3 " + file_name + " -i /home/user/Downloads -s --windows 4 -o /home/user/Downloads/windows.jsonl")
+    print("python3 " + file_name + " -i /home/user/Downloads --normalize mentions --normalize emoji --normalize urls")
+    print("python3 " + file_name + " -i /home/user/Downloads --watch --poll-interval 10 --dedup -v True")
+    print("python3 " + file_name + " -i /home/user/Downloads -s --dedup --near-dup --near-dup-threshold 0.7 "
+          "--near-dup-report /home/user/Downloads/near_duplicates.jsonl")
+    print("python3 " + file_name + " -i /home/user/Downloads -s --order-by timestamp --presorted")
+    print("python3 " + file_name + " -i /home/user/Downloads -s --order-by id --memory-budget 1073741824 "
+          "--spill /mnt/scratch")
 
 
 # Function to run the program, time the process and show progress
-def run_program(input_path: str, output_path: str, is_verbose: bool) -> None:
+def run_program(input_path: str, output_path: str, is_verbose: bool, is_streaming: bool = False,
+                workers: int = 1, chunksize: int = 1, cache_path: str = None, statistics_path: str = None,
+                compression: str = "auto", buffer_size: int = DEFAULT_BUFFER_SIZE,
+                is_deduplicating: bool = False, store_path: str = None, from_store_path: str = None,
+                shard_by: str = None, number_of_shards: int = DEFAULT_NUMBER_OF_SHARDS,
+                shard_size: int = DEFAULT_SHARD_SIZE,
+                is_recursive: bool = False, include_patterns: list = DEFAULT_INCLUDE_PATTERNS,
+                exclude_patterns: list = (), sort_by: str = None, message_filter: MessageFilter = None,
+                is_asynchronous: bool = False, maximum_reads: int = DEFAULT_MAXIMUM_READS,
+                statistics_format: str = "auto", profile_path: str = None, is_tracing_memory: bool = False,
+                json_backend: str = DEFAULT_JSON_BACKEND, is_watching: bool = False,
+                poll_interval: float = DEFAULT_POLL_INTERVAL, is_sharding_batches: bool = False,
+                normalizer: ContentNormalizer = None, context_size: int = None,
+                reply_lookback: int = DEFAULT_REPLY_LOOKBACK, split_size: int = None,
+                output_format: str = "text", near_duplicate_filter: NearDuplicateFilter = None,
+                near_duplicate_report_path: str = None, is_indexing: bool = False, order_by: str = None,
+                is_presorted: bool = False, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                spill_path: str = None) -> None:
     """
     This function runs the program
-    :param input_path: The input folder path
+    :param input_path: The input folder path, or a list of them
     :param output_path: The output file path
     :param is_verbose: If True, then show progress
+    :param is_streaming: If True, then every message flows from the JSON files to the output file
+                         one at a time instead of being collected into lists between the steps
+    :param workers: The number of worker processes parsing the JSON files
+    :param chunksize: The number of JSON files handed to a worker process at a time
+    :param cache_path: If given, the cache folder path, and only new or modified JSON files are converted
+    :param statistics_path: If given, the statistics of the run and the time spent in every stage
+                            are written to this file
+    :param compression: The compression of the output file, "auto" picks it from the file extension
+    :param buffer_size: The size of the output write buffers in bytes
+    :param is_deduplicating: If True, then the messages whose id was already seen are dropped
+    :param store_path: If given, the parsed messages are also saved to a binary message store in this folder
+    :param from_store_path: If given, the messages are read from the binary message store in this folder
+                            instead of parsing the JSON files in the input folder
+    :param shard_by: If given, the output is split into shard files by "lines", "size", "author" or "channel"
+    :param number_of_shards: The number of shard files when sharding by author or channel
+    :param shard_size: The number of lines, or bytes when sharding by size, after which a new shard file is started
+    :param is_recursive: If True, then the JSON files are also searched for in the sub folders of the input folders
+    :param include_patterns: The patterns of the JSON files to take
+    :param exclude_patterns: The patterns of the files and folders to skip
+    :param sort_by: If given, the JSON files are sorted by "name" or "size" before they are parsed
+    :param message_filter: If given, only the messages that match it are kept,
+                           the JSON files whose header cannot match are skipped without reading their messages
+    :param is_asynchronous: If True, then the JSON files are read by an event loop with several reads in flight,
+                            while the messages read so far are converted and written
+    :param maximum_reads: The number of JSON files read at the same time when asynchronous
+    :param statistics_format: "json", "prometheus", or "auto" for prometheus if the statistics file ends with .prom
+    :param profile_path: If given, the run is profiled with cProfile and the profile is saved to this file,
+                         the worker processes are not profiled
+    :param is_tracing_memory: If True, then the memory allocations are traced and the peak memory is recorded
+    :param json_backend: The backend that decodes whole JSON files: "auto" for the fastest one that is installed,
+                         "orjson", "simdjson" or "json", streaming always decodes with the json module
+    :param is_watching: If True, then the program keeps running and converts the new JSON files as they land
+                        in the input folders, until it is interrupted
+    :param poll_interval: The number of seconds between two polls of the input folders when watching
+    :param is_sharding_batches: If True, then every batch of new JSON files is written to a new shard file
+                                instead of being appended to the output file when watching
+    :param normalizer: If given, the message contents are normalized while they are converted
+    :param context_size: If given, context/response windows with this many turns of context are written
+                         instead of the converted lines
+    :param reply_lookback: The number of recent messages of every channel that replies can be followed to
+    :param split_size: If given and there are more than 1 worker processes, then the JSON files at least
+                       this many bytes big are split into byte ranges of messages parsed by several workers
+    :param output_format: "text" for the converted lines, "jsonl" for a JSON record per message,
+                          or "binary" for the converted lines as a blob and an array of offsets
+    :param near_duplicate_filter: If given, the messages that are nearly the same as a recent message are dropped
+    :param near_duplicate_report_path: If given, the dropped near duplicates are written to this file
+    :param is_indexing: If True, then an inverted index of the lines is written next to the text output file
+    :param order_by: If given, the messages of all the JSON files are ordered by "timestamp" or "id"
+    :param is_presorted: If True, then the messages of every JSON file are sorted already and the files are merged
+    :param memory_budget: The number of bytes of messages kept in memory before a sorted run is spilled
+    :param spill_path: The folder the sorted runs are spilled to, the temporary folder if None
     :return: None
     """
+    if is_watching and shard_by is not None:
+        raise ValueError("The watch mode cannot be used with --shard-by, use --watch-shards instead")
+    if context_size is not None and (is_watching or shard_by is not None):
+        raise ValueError("The conversation windows cannot be combined with the watch mode or sharding")
+    if output_format != "text" and (is_watching or context_size is not None):
+        raise ValueError("The watch mode and the conversation windows only write text, the windows as JSON lines")
+    if is_indexing and (is_watching or context_size is not None):
+        raise ValueError("The index cannot be combined with the watch mode or the conversation windows")
+    if statistics_format not in SUMMARY_FORMATS:
+        raise ValueError("Unknown statistics format: " + statistics_format + ", expected one of " +
+                         ", ".join(SUMMARY_FORMATS))
+    # Count everything once, while the data flows through the steps
+    statistics = PipelineStatistics()
+    # Time the lazy steps message by message only when the stage times are reported, it is not free
+    is_timing_stages = is_verbose or statistics_path is not None
+    # The steps are done by the pipeline, this function only adds the reports around them
+    pipeline = Pipeline(input_path, is_verbose, is_streaming, workers, chunksize, cache_path, is_deduplicating,
+                        store_path, from_store_path, is_recursive, include_patterns, exclude_patterns, sort_by,
+                        message_filter, is_asynchronous, maximum_reads, json_backend, statistics, is_timing_stages,
+                        normalizer, split_size, near_duplicate_filter, near_duplicate_report_path, order_by,
+                        is_presorted, memory_budget, spill_path)
     # Start the timer
-    start_time = time.time()
+    start_time = time.perf_counter()
+    with profile_pipeline(statistics, profile_path, is_tracing_memory, is_verbose):
+        # Print the message
+        if is_verbose:
+            print("----------------------------------------")
+            print("Running the program...")
+        if is_watching:
+            # Convert the new JSON files as they land, until the program is interrupted
+            try:
+                watch_input_folders(pipeline, output_path, poll_interval, is_sharding_batches, compression,
+                                    buffer_size, statistics_path, statistics_format)
+            except KeyboardInterrupt:
+                if is_verbose:
+                    print("----------------------------------------")
+                    print("Stopped watching")
+        elif context_size is not None:
+            # Write the conversation windows instead of the lines
+            pipeline.write_conversation_windows(output_path, context_size, reply_lookback, compression, buffer_size)
+        else:
+            # Write the data to a text file, or to shard files
+            pipeline.write(output_path, compression, buffer_size, shard_by, number_of_shards, shard_size,
+                           output_format, is_indexing)
+        # Stop the timer
+        statistics.record_run(time.perf_counter() - start_time)
+    # Write the statistics
+    if statistics_path is not None:
+        statistics.write_summary(statistics_path, statistics_format)
     # Print the message
     if is_verbose:
+        if pipeline.is_lazy or shard_by is not None or is_watching or context_size is not None:
+            # The steps did not print their reports, because they never saw all the data at once
+            print("----------------------------------------")
+            statistics.print_loading_report()
+            print("----------------------------------------")
+            statistics.print_conversion_report()
         print("----------------------------------------")
-        print("Running the program...")
-    # Load the JSON file paths
-    json_file_paths = get_json_file_paths(input_path, is_verbose)
-    # Load the JSON files
-    raw_data_list = get_data_from_discord_chat_exports_json_files(
-        json_file_paths, is_verbose)
-    # Convert the data to the required format
-    converted_data_list = convert_data_to_required_format(
-        raw_data_list, is_verbose)
-    # Write the data to a text file
-    write_converted_data_to_text_file(
-        converted_data_list, output_path, is_verbose)
-    # Stop the timer
-    end_time = time.time()
-    # Calculate the total time taken
-    total_time_taken = end_time - start_time
-    # Print the message
-    if is_verbose:
+        statistics.print_stage_report()
         print("----------------------------------------")
         print("Total time taken to run the program: {} seconds".format(
-            total_time_taken))
+            statistics.run_seconds))
         print("----------------------------------------")
         print("Program finished successfully!")
         print("----------------------------------------")
@@ -137,9 +410,28 @@ if __name__ == "__main__":
     # 3. Output file path
     # All the parameters are optional
 
-    DEFAULT_INPUT_FOLDER_PATH = os.getcwd() + "/JSON Files"
-    DEFAULT_OUTPUT_FILE_PATH = os.getcwd() + "/Output/output.txt"
     input_folder_path, output_file_path, verbose = None, None, None
+    streaming = False
+    number_of_workers, files_per_chunk = 1, 1
+    cache_folder_path, statistics_file_path = None, None
+    output_compression, output_buffer_size = "auto", DEFAULT_BUFFER_SIZE
+    output_file_format, output_index = "text", False
+    deduplicate = False
+    binary_message_store_path, from_binary_message_store_path = None, None
+    output_shard_by, output_number_of_shards, output_shard_size = None, DEFAULT_NUMBER_OF_SHARDS, DEFAULT_SHARD_SIZE
+    recursive, include_file_patterns, exclude_file_patterns = False, DEFAULT_INCLUDE_PATTERNS, []
+    json_files_sort_by = None
+    message_filter_conditions = None
+    asynchronous, number_of_reads = False, DEFAULT_MAXIMUM_READS
+    statistics_file_format, profile_file_path, trace_memory = "auto", None, False
+    json_decoder_backend = DEFAULT_JSON_BACKEND
+    watch, watch_poll_interval, watch_shards = False, DEFAULT_POLL_INTERVAL, False
+    content_normalizer = None
+    window_context_size, window_reply_lookback = None, DEFAULT_REPLY_LOOKBACK
+    json_files_split_size = None
+    near_duplicates, near_duplicate_report_file_path = None, None
+    records_order_by, records_presorted, records_memory_budget, spill_folder_path = \
+        None, False, DEFAULT_MEMORY_BUDGET, None
 
     # Get the parameters passed to the program
     parameters = sys.argv[1:]
@@ -151,11 +443,13 @@ if __name__ == "__main__":
             _print_help()
             # Exit the program
             sys.exit()
-        # Check if the input folder path is passed
+        # Check if the input folder paths are passed
         if "-i" in parameters or "--input" in parameters:
-            # Get the input folder path
-            input_folder_path = parameters[parameters.index("-i") + 1] \
-                if "-i" in parameters else parameters[parameters.index("--input") + 1]
+            # Get every input folder path
+            input_folder_path = [parameters[i + 1] for i, parameter in enumerate(parameters[:-1])
+                                 if parameter == "-i" or parameter == "--input"]
+            if len(input_folder_path) == 1:
+                input_folder_path = input_folder_path[0]
         else:
             # Set the default input folder path
             input_folder_path = DEFAULT_INPUT_FOLDER_PATH
@@ -177,6 +471,133 @@ if __name__ == "__main__":
                 verbose = True
         else:
             verbose = False
+        # Check if the input discovery parameters are passed
+        recursive = "-r" in parameters or "--recursive" in parameters
+        if "--include" in parameters:
+            include_file_patterns = [parameters[i + 1] for i, parameter in enumerate(parameters[:-1])
+                                     if parameter == "--include"]
+        exclude_file_patterns = [parameters[i + 1] for i, parameter in enumerate(parameters[:-1])
+                                 if parameter == "--exclude"]
+        if "--sort-by" in parameters:
+            json_files_sort_by = parameters[parameters.index("--sort-by") + 1]
+        # Check if the message filter parameters are passed
+        filter_values = {}
+        for i, parameter in enumerate(parameters[:-1]):
+            if parameter in ("--channel-id", "--channel-name", "--guild-id", "--guild-name", "--author-id",
+                             "--type"):
+                filter_values.setdefault(parameter, []).append(parameters[i + 1])
+            elif parameter in ("--after", "--before", "--bots", "--min-length"):
+                filter_values[parameter] = parameters[i + 1]
+        if len(filter_values) > 0:
+            message_filter_conditions = MessageFilter(
+                channel_ids=filter_values.get("--channel-id"),
+                channel_names=filter_values.get("--channel-name"),
+                guild_ids=filter_values.get("--guild-id"),
+                guild_names=filter_values.get("--guild-name"),
+                after=parse_discord_timestamp(filter_values["--after"]) if "--after" in filter_values else None,
+                before=parse_discord_timestamp(filter_values["--before"]) if "--before" in filter_values else None,
+                author_ids=filter_values.get("--author-id"),
+                is_bot=filter_values["--bots"].lower() in ("true", "t") if "--bots" in filter_values else None,
+                message_types=filter_values.get("--type"),
+                minimum_length=int(filter_values.get("--min-length", 0)))
+        # Check if the normalization parameters are passed
+        normalizations = [parameters[i + 1] for i, parameter in enumerate(parameters[:-1])
+                          if parameter == "--normalize"]
+        if len(normalizations) > 0:
+            content_normalizer = ContentNormalizer(NORMALIZATIONS if "all" in normalizations else normalizations)
+        # Check if the streaming parameter is passed
+        streaming = "-s" in parameters or "--streaming" in parameters
+        # Check if the asynchronous parameters are passed
+        asynchronous = "-a" in parameters or "--async" in parameters
+        if "--reads" in parameters:
+            number_of_reads = int(parameters[parameters.index("--reads") + 1])
+        # Check if the number of worker processes is passed
+        if "-w" in parameters or "--workers" in parameters:
+            number_of_workers = int(parameters[parameters.index("-w") + 1]
+                                    if "-w" in parameters else parameters[parameters.index("--workers") + 1])
+        # Check if the chunksize is passed
+        if "--chunksize" in parameters:
+            files_per_chunk = int(parameters[parameters.index("--chunksize") + 1])
+        # Check if the split parameters are passed
+        if "--split" in parameters or "--split-size" in parameters:
+            json_files_split_size = int(parameters[parameters.index("--split-size") + 1]) \
+                if "--split-size" in parameters else DEFAULT_SPLIT_SIZE
+        # Check if the cache folder path is passed
+        if "-c" in parameters or "--cache" in parameters:
+            cache_folder_path = parameters[parameters.index("-c") + 1] \
+                if "-c" in parameters else parameters[parameters.index("--cache") + 1]
+        # Check if the statistics file path is passed
+        if "--stats" in parameters:
+            statistics_file_path = parameters[parameters.index("--stats") + 1]
+        if "--stats-format" in parameters:
+            statistics_file_format = parameters[parameters.index("--stats-format") + 1]
+            # Check the format before anything is converted, the summary is only written at the end of the run
+            if statistics_file_format not in SUMMARY_FORMATS:
+                print("ERROR: Unknown statistics format: " + statistics_file_format + ", expected one of " +
+                      ", ".join(SUMMARY_FORMATS))
+                sys.exit(1)
+        # Check if the profiling parameters are passed
+        if "--profile" in parameters:
+            profile_file_path = parameters[parameters.index("--profile") + 1]
+        trace_memory = "--trace-memory" in parameters
+        # Check if the JSON backend is passed
+        if "--json-backend" in parameters:
+            json_decoder_backend = parameters[parameters.index("--json-backend") + 1]
+        # Check if the deduplication parameter is passed
+        deduplicate = "--dedup" in parameters
+        # Check if the near duplicate parameters are passed
+        near_duplicate_values = {parameter: parameters[i + 1] for i, parameter in enumerate(parameters[:-1])
+                                 if parameter.startswith("--near-dup-")}
+        if "--near-dup" in parameters or len(near_duplicate_values) > 0:
+            near_duplicates = NearDuplicateFilter(
+                float(near_duplicate_values.get("--near-dup-threshold", DEFAULT_THRESHOLD)),
+                int(near_duplicate_values.get("--near-dup-bands", DEFAULT_NUMBER_OF_BANDS)),
+                int(near_duplicate_values.get("--near-dup-rows", DEFAULT_ROWS_PER_BAND)),
+                int(near_duplicate_values.get("--near-dup-shingle", DEFAULT_SHINGLE_SIZE)),
+                int(near_duplicate_values.get("--near-dup-min-length", DEFAULT_MINIMUM_LENGTH)),
+                int(near_duplicate_values.get("--near-dup-lookback", DEFAULT_LOOKBACK)))
+            near_duplicate_report_file_path = near_duplicate_values.get("--near-dup-report")
+        # Check if the order parameters are passed
+        if "--order-by" in parameters:
+            records_order_by = parameters[parameters.index("--order-by") + 1]
+        records_presorted = "--presorted" in parameters
+        if "--memory-budget" in parameters:
+            records_memory_budget = int(parameters[parameters.index("--memory-budget") + 1])
+        if "--spill" in parameters:
+            spill_folder_path = parameters[parameters.index("--spill") + 1]
+        # Check if the binary message store paths are passed
+        if "--store" in parameters:
+            binary_message_store_path = parameters[parameters.index("--store") + 1]
+        if "--from-store" in parameters:
+            from_binary_message_store_path = parameters[parameters.index("--from-store") + 1]
+        # Check if the sharding parameters are passed
+        if "--shard-by" in parameters:
+            output_shard_by = parameters[parameters.index("--shard-by") + 1]
+        if "--shards" in parameters:
+            output_number_of_shards = int(parameters[parameters.index("--shards") + 1])
+        if "--shard-size" in parameters:
+            output_shard_size = int(parameters[parameters.index("--shard-size") + 1])
+        # Check if the conversation window parameters are passed
+        if "--windows" in parameters:
+            window_context_size = int(parameters[parameters.index("--windows") + 1])
+        if "--reply-lookback" in parameters:
+            window_reply_lookback = int(parameters[parameters.index("--reply-lookback") + 1])
+        # Check if the watch parameters are passed
+        watch = "--watch" in parameters
+        if "--poll-interval" in parameters:
+            watch_poll_interval = float(parameters[parameters.index("--poll-interval") + 1])
+        watch_shards = "--watch-shards" in parameters
+        # Check if the output format is passed
+        if "--format" in parameters:
+            output_file_format = parameters[parameters.index("--format") + 1]
+        # Check if the output is indexed
+        output_index = "--index" in parameters
+        # Check if the compression is passed
+        if "--compression" in parameters:
+            output_compression = parameters[parameters.index("--compression") + 1]
+        # Check if the buffer size is passed
+        if "--buffer-size" in parameters:
+            output_buffer_size = int(parameters[parameters.index("--buffer-size") + 1])
     else:
         # Set the default values
         input_folder_path = DEFAULT_INPUT_FOLDER_PATH
@@ -192,4 +613,17 @@ if __name__ == "__main__":
         os.makedirs(os.path.dirname(output_folder_path))
 
     # Run the program
-    run_program(input_folder_path, output_file_path, verbose)
+    try:
+        run_program(input_folder_path, output_file_path, verbose, streaming, number_of_workers, files_per_chunk,
+                    cache_folder_path, statistics_file_path, output_compression, output_buffer_size, deduplicate,
+                    binary_message_store_path, from_binary_message_store_path, output_shard_by,
+                    output_number_of_shards, output_shard_size, recursive, include_file_patterns,
+                    exclude_file_patterns, json_files_sort_by, message_filter_conditions, asynchronous,
+                    number_of_reads, statistics_file_format, profile_file_path, trace_memory, json_decoder_backend,
+                    watch, watch_poll_interval, watch_shards, content_normalizer, window_context_size,
+                    window_reply_lookback, json_files_split_size, output_file_format, near_duplicates,
+                    near_duplicate_report_file_path, output_index, records_order_by, records_presorted,
+                    records_memory_budget, spill_folder_path)
+    except FileNotFoundError as error:
+        print("ERROR: " + str(error))
+        sys.exit(1)